@@ -1,4 +1,5 @@
-from algorithm import write_xml, traffic_timing,traffic_timing_mobj, traffic_flow
+from algorithm import write_xml, traffic_timing,traffic_timing_mobj, traffic_flow, batch_timing
+from algorithm.signal_config import SignalConfig
 
 ##示例文件
 data_file = "./data/过车数据CSV.csv"
@@ -37,14 +38,21 @@ plan_para = {
     'step': 3,
     'phase_plan': phase_plan}
 
-def generate_traffic_time(data_file,traffic_light_file,inter_id,plan_para):
+def generate_traffic_time(data_file,traffic_light_file,inter_id,plan_para,flow_cache=None,signal_config=None):
     """
         生成配时方案的函数.
         参数：
             data_file：过车数据文件文件名，包含路径信息。
             traffic_light_file：优化前信控文件名，包含路径信息。
-            plan_para：方案信息，包含最大周期、最小周期以及方案信息（相位编号、最小绿灯、黄灯时长、全红时长、行人时长）等。
+            plan_para：方案信息，包含最大周期、最小周期以及方案信息（相位编号、最小绿灯、黄灯时长、全红时长、行人时长）等；
+                       可选peak_max_plans（各时段内划分的配时时段数上限，默认1；大于1时只体现在time_out中）和peak_min_interval（配时时段的最短时长，默认30分钟）；
+                       排队长度最小的算法可选exact_search（精确搜索）、processes（各时刻点并行优化的进程数，None为CPU核数）、
+                       flow_tolerance（流量容差，启用时刻点方案缓存）、warm_start（分支定界的热启动方案，'webster'或'previous'）
+                       和cycle_search（周期搜索方式，'bisect'二分搜索或'sweep'扫描全部周期）；
+                       可选start_time、end_time（过车数据的读取范围[start_time, end_time)，如'2022-03-07 07:00:00'，缺省时不限制）。
             inter_id：交叉口的编号。
+            flow_cache：可选，聚合流量的磁盘缓存（flow_cache.FlowCache），相同的过车数据和信控文件只调整方案参数时，跳过流量统计。
+            signal_config：可选，信控文件的解析模型（signal_config.SignalConfig），传入时不再解析traffic_light_file。
         返回值：
             元组，包含三个参数。
             plan_no：优化前信控文件里对应时段的方案编号。
@@ -52,14 +60,17 @@ def generate_traffic_time(data_file,traffic_light_file,inter_id,plan_para):
             plan_para：方案信息，包含最大周期、最小周期以及方案信息（相位编号、最小绿灯、黄灯时长、全红时长、行人时长、阶段（相位）时长）等。
     """
 
-    vehicle_flow = traffic_flow.Traffic_Flow(data_file, traffic_light_file, inter_id, plan_para)
+    vehicle_flow = traffic_flow.Traffic_Flow(data_file, traffic_light_file, inter_id, plan_para, flow_cache=flow_cache,
+                                             start_time=plan_para.get('start_time'), end_time=plan_para.get('end_time'),
+                                             signal_config=signal_config)
     vehicle_flow.generate_flow()
 
     #优化目标的选择
     ## 当优化目标为0时，表示空放最小的算法；
     ## 当优化目标为1时，表示排队长度最小的算法。
     if plan_para['goal'] == 0:
-        traffic_time = traffic_timing.TrafficTiming(vehicle_flow.flows, traffic_light_file, inter_id, plan_para)
+        traffic_time = traffic_timing.TrafficTiming(vehicle_flow.flows, traffic_light_file, inter_id, plan_para,
+                                                    signal_config=vehicle_flow.signal_config)
         traffic_time.auto_timing()
         return traffic_time.return_phase_plan()  # 包含相位编号，周期时长，阶段信息
     elif plan_para['goal'] == 1:
@@ -68,7 +79,24 @@ def generate_traffic_time(data_file,traffic_light_file,inter_id,plan_para):
         traffic_time.auto_timing()
         return traffic_time.return_phase_plan()  # 包含相位编号，周期时长，阶段信息
 
-def read_stage_from_XML(data_file, traffic_light_file, inter_id):
+def generate_traffic_time_batch(data_file,traffic_light_file,plan_para,inter_ids=None,processes=None):
+    """
+        多交叉口批量生成配时方案的函数，过车数据只读取一次，各交叉口在进程池中并行配时.
+        参数：
+            data_file：过车数据文件文件名，包含路径信息。
+            traffic_light_file：优化前信控文件名，包含路径信息。
+            plan_para：方案信息，所有交叉口相同时为单个方案字典，否则为{inter_id:方案信息}；方案信息同generate_traffic_time，
+                       过车数据只读取一次，按交叉口的方案信息中start_time、end_time须相同。
+            inter_ids：交叉口编号列表，为None时对信控文件中的全部交叉口配时。
+            processes：进程数，为None时取CPU核数。
+        返回值：
+            {inter_id:(plan_no, cycle, plan_para)}，配时失败的交叉口为None。
+    """
+    start_time, end_time = batch_timing.read_window(plan_para)
+    return batch_timing.batch_timing(data_file, traffic_light_file, plan_para, inter_ids, processes,
+                                     start_time=start_time, end_time=end_time)
+
+def read_stage_from_XML(data_file, traffic_light_file, inter_id, signal_config=None):
     """
         读取优化前的信控文件，输出优化前的相位信息.
         参数：
@@ -76,20 +104,25 @@ def read_stage_from_XML(data_file, traffic_light_file, inter_id):
             traffic_light_file：优化前信控文件名，包含路径信息。
             inter_id：交叉口的编号。
             plan_para：为空。
+            signal_config：可选，信控文件的解析模型（signal_config.SignalConfig），传入时不再解析traffic_light_file。
         返回值：
             phase_plan：优化前的现有方案信息，包含相位编号、最小绿灯、黄灯时长、全红时长、行人时长（默认值15秒）、阶段（相位）时长等
     """
-    stages = traffic_flow.Traffic_Flow(data_file, traffic_light_file,inter_id)
+    stages = traffic_flow.Traffic_Flow(data_file, traffic_light_file,inter_id, signal_config=signal_config)
     phase_plan = stages.read_stage()
     return phase_plan
 
 if __name__ == '__main__':
+    #信控文件只解析一次，读取现有方案、配时和写回方案共用
+    signal_config = SignalConfig(traffic_light_file)
+
     #读取现有方案信息
-    phase_plan_info = read_stage_from_XML(data_file, traffic_light_file,inter_id)
+    phase_plan_info = read_stage_from_XML(data_file, traffic_light_file,inter_id, signal_config=signal_config)
 
     #生成新的方案
-    plan_no,cycle,plan_para = generate_traffic_time(data_file,traffic_light_file,inter_id,plan_para)
+    plan_no,cycle,plan_para = generate_traffic_time(data_file,traffic_light_file,inter_id,plan_para,
+                                                    signal_config=signal_config)
     print(plan_para)
 
-    write_xml.write_plan_xml(plan_no, str(cycle), plan_para, traffic_light_file, inter_id)
+    write_xml.write_plan_xml(plan_no, str(cycle), plan_para, traffic_light_file, inter_id, signal_config)
 
@@ -0,0 +1,115 @@
+import copy
+import traceback
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from algorithm import traffic_flow, traffic_timing, traffic_timing_mobj
+from algorithm.signal_config import SignalConfig
+
+worker_signal_config = None  # 工作进程共用的信控文件模型，进程池初始化时传入一次
+
+
+def init_worker(signal_config):
+    global worker_signal_config
+    worker_signal_config = signal_config
+
+
+def generate_timing(vehicle_flow, traffic_light_file, inter_id, plan_para):
+    """
+    根据已处理的流量生成配时方案，按优化目标选择算法.
+    返回值：
+        pd.Series([plan_no, cycle, plan_para])
+    """
+    ## 当优化目标为0时，表示空放最小的算法；
+    ## 当优化目标为1时，表示排队长度最小的算法。
+    if plan_para['goal'] == 0:
+        traffic_time = traffic_timing.TrafficTiming(vehicle_flow.flows, traffic_light_file, inter_id, plan_para,
+                                                    signal_config=vehicle_flow.signal_config)
+    elif plan_para['goal'] == 1:
+        traffic_time = traffic_timing_mobj.TrafficTimingMultiObject(vehicle_flow.flows, traffic_light_file, inter_id,
+                                                                    plan_para, vehicle_flow.phase_lane)
+    else:
+        raise ValueError('不支持的优化目标：%s' % plan_para['goal'])
+    traffic_time.auto_timing()
+    return traffic_time.return_phase_plan()  # 包含相位编号，周期时长，阶段信息
+
+
+def time_intersection(data_file, traffic_light_file, inter_id, plan_para, flow_interval, bin_counts):
+    """
+    单个交叉口的流量处理和配时流程，在进程池的工作进程中执行.
+    返回值：
+        (inter_id, 配时方案, 错误信息)，失败时配时方案为None。
+    """
+    try:
+        vehicle_flow = traffic_flow.Traffic_Flow(data_file, traffic_light_file, inter_id, plan_para,
+                                                 flow_interval=flow_interval, bin_counts=bin_counts,
+                                                 signal_config=worker_signal_config)
+        vehicle_flow.generate_flow()
+        return inter_id, generate_timing(vehicle_flow, traffic_light_file, inter_id, plan_para), None
+    except Exception:
+        return inter_id, None, traceback.format_exc()
+
+
+def read_window(plan_para):
+    """
+    方案参数中过车数据的读取范围(start_time, end_time)，缺省为None（不限制）.
+        - plan_para为单个方案字典时取其start_time、end_time；按交叉口的方案字典时各交叉口须相同（过车数据只读取一次），
+          否则抛出ValueError
+    """
+    paras = [plan_para] if 'goal' in plan_para else list(plan_para.values())
+    windows = set((para.get('start_time'), para.get('end_time')) for para in paras)
+    if len(windows) > 1:
+        raise ValueError('各交叉口的过车数据读取范围须相同：%s' % sorted(windows, key=str))
+    return windows.pop() if windows else (None, None)
+
+
+def batch_timing(data_file, traffic_light_file, plan_para, inter_ids=None, processes=None, flow_interval=6,
+                 start_time=None, end_time=None):
+    """
+    多交叉口批量配时：过车数据只读取一次并按摄像头划分到各交叉口，各交叉口的配时在进程池中并行计算.
+    参数：
+        data_file：过车数据文件文件名，包含路径信息。
+        traffic_light_file：优化前信控文件名，包含路径信息。
+        plan_para：方案信息；所有交叉口相同时为单个方案字典，否则为{inter_id:方案字典}。
+        inter_ids：交叉口编号列表，为None时对信控文件中的全部交叉口配时。
+        processes：进程数，为None时取CPU核数；为1时在当前进程中依次计算。
+        flow_interval、start_time、end_time：流量统计间隔和过车数据的读取范围，同Traffic_Flow；
+            读取范围不从plan_para中获取，由调用方传入（见read_window）。
+    返回值：
+        {inter_id:(plan_no, cycle, plan_para)}，按inter_ids的顺序；配时失败的交叉口为None，并输出错误信息。
+    """
+    signal_config = SignalConfig(traffic_light_file)  # 信控文件只解析一次，各交叉口共用
+    reader = traffic_flow.Traffic_Flow(data_file, traffic_light_file, None, flow_interval=flow_interval,
+                                       start_time=start_time, end_time=end_time, signal_config=signal_config)
+    light_cameras = {inter_id: light.cameras() for inter_id, light in signal_config.lights.items()}
+    if inter_ids is None:
+        inter_ids = list(light_cameras.keys())
+
+    camera_ids = []
+    for inter_id in inter_ids:
+        camera_ids.extend(light_cameras.get(inter_id, []))
+    bin_counts = reader.read_bin_counts(list(set(camera_ids)))
+    print('批量配时：%d个交叉口，过车数据读取完成' % len(inter_ids))
+
+    camera_counts = {camera: counts for camera, counts in bin_counts.groupby('camera_id')}  # 按摄像头划分过车数
+    tasks = []
+    for inter_id in inter_ids:
+        inter_para = plan_para[inter_id] if 'goal' not in plan_para else plan_para
+        inter_counts = [camera_counts[camera] for camera in light_cameras.get(inter_id, []) if camera in camera_counts]
+        inter_counts = pd.concat(inter_counts, ignore_index=True) if inter_counts else bin_counts.iloc[:0]
+        tasks.append((data_file, traffic_light_file, inter_id, copy.deepcopy(inter_para), flow_interval, inter_counts))
+
+    if processes == 1 or len(tasks) == 0:
+        init_worker(signal_config)
+        outcomes = [time_intersection(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(signal_config,)) as executor:
+            outcomes = list(executor.map(time_intersection, *zip(*tasks)))
+
+    results = {}
+    for inter_id, result, error in outcomes:
+        if error is not None:
+            print('交叉口%s配时失败：\n%s' % (inter_id, error))
+            results[inter_id] = None
+        else:
+            results[inter_id] = tuple(result)
+    return results
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import pandas as pd
+
+
+class FlowCache:
+    """
+    聚合流量的磁盘缓存：
+        - 以过车数据文件内容、信控文件内容、交叉口编号、统计间隔和读取时间窗的哈希作为键
+        - 缓存与方案参数无关的流量（已添加日计划、时段、方案、相位信息），保存为parquet列式文件
+        - 缓存目录超过max_size字节时，按最近使用时间淘汰（LRU）
+    """
+
+    def __init__(self, cache_dir, max_size=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def file_digest(self, file_name, digest):
+        with open(file_name, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+
+    def key(self, data_file, traffic_light_file, inter_id, flow_interval, start_time=None, end_time=None):
+        """
+        计算缓存键.
+        返回值：
+            文件内容及参数的sha256十六进制字符串。
+        """
+        digest = hashlib.sha256()
+        self.file_digest(data_file, digest)
+        self.file_digest(traffic_light_file, digest)
+        digest.update(('%s|%s|%s|%s' % (inter_id, flow_interval, start_time, end_time)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.parquet')
+
+    def get(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # 更新最近使用时间
+        return pd.read_parquet(path)
+
+    def put(self, key, flows):
+        path = self.path(key)
+        tmp_path = path + '.tmp'
+        flows.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.parquet'):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                entries.append((stat.st_mtime, stat.st_size, file_name))
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, file_name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, file_name))
+            total_size -= size
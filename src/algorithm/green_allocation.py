@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def water_fill(weights, loss_times, min_times, cycles):
+    """
+    按阶段流量比例分配周期（注水法）：阶段时长 = max(最小阶段时长, λ * 权重 + 损失时间)，λ使各阶段时长之和等于周期.
+    各阶段时长之和是λ的分段线性增函数，分段点为各阶段恰好达到最小阶段时长的λ：计算全部分段点处的周期，
+    确定λ所在的分段后直接求解，运算次数只与阶段数有关，不需要迭代.
+    参数：
+        weights：阶段流量与饱和车头时距的乘积，(阶段数,)或(方案数, 阶段数)的数组，小于0时按0处理。
+        loss_times：各阶段的启动损失与全红时长之和。
+        min_times：各阶段的最小阶段时长（最小绿灯与行人时长的较大值、黄灯和全红之和）。
+        cycles：周期时长，标量或长度为方案数的数组。
+    返回值：
+        (阶段时长, 是否可行)，分别为(方案数, 阶段数)和(方案数,)的数组。
+        周期小于各阶段最小时长之和，或各阶段权重均为0、多余的时长无法分配时不可行，各阶段取最小时长。
+    """
+    weights = np.maximum(np.atleast_2d(np.asarray(weights, dtype=float)), 0.0)
+    cycles = np.atleast_1d(np.asarray(cycles, dtype=float))
+    batch_num = max(len(weights), len(cycles))
+    weights = np.broadcast_to(weights, (batch_num, weights.shape[1]))
+    cycles = np.broadcast_to(cycles, (batch_num,))
+    loss_times = np.asarray(loss_times, dtype=float)
+    floor_times = np.maximum(np.asarray(min_times, dtype=float), loss_times)  # λ为0时的阶段时长
+
+    # 各阶段达到最小时长的λ，权重为0的阶段始终为最小时长
+    positive = weights > 0
+    breakpoints = np.divide(floor_times - loss_times, weights, out=np.zeros(weights.shape), where=positive)
+    candidates = np.concatenate([np.zeros((batch_num, 1)), breakpoints], axis=1)
+    candidate_cycles = np.maximum(floor_times, candidates[:, :, None] * weights[:, None, :] + loss_times).sum(axis=2)
+
+    # λ所在分段的起点：周期不超过给定周期的最大分段点
+    feasible = candidate_cycles[:, 0] <= cycles + 1e-9
+    start = np.where(candidate_cycles <= cycles[:, None] + 1e-9, candidates, -1.0).max(axis=1)
+    free = positive & (breakpoints <= start[:, None])  # 按比例分配的阶段
+    free_weight = np.where(free, weights, 0.0).sum(axis=1)
+    rest_time = cycles - np.where(free, loss_times, floor_times).sum(axis=1)
+    feasible &= (free_weight > 0) | (np.abs(rest_time) <= 1e-9)
+
+    level = np.divide(rest_time, free_weight, out=np.zeros(batch_num), where=feasible & (free_weight > 0))
+    stage_times = np.where(positive, np.maximum(floor_times, level[:, None] * weights + loss_times), floor_times)
+    stage_times[~feasible] = np.broadcast_to(floor_times, stage_times.shape)[~feasible]
+    return stage_times, feasible
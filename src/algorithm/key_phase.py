@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+
+def sat_flow_values(flows):
+    """饱和流率转为浮点数，空字符串（无相位的车道）为0.0"""
+    return flows['sat_flow'].where(flows['sat_flow'] != '', 0.0).astype(float).values
+
+
+def grouped_quantile(codes, values, quantiles):
+    """
+    按分组一次排序，计算各组的线性插值分位数（与Series.quantile的计算方式一致）.
+    参数：
+        codes：各值所属分组的编号（0~n-1）。
+        values：浮点数组。
+        quantiles：分位数列表。
+    返回值：
+        (分组数, 分位数个数)的数组。
+    """
+    group_num = codes.max() + 1 if len(codes) > 0 else 0
+    sorted_values = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength=group_num)[:, None]
+    starts = np.cumsum(counts) - counts.ravel()
+    quantiles = np.asarray(quantiles, dtype=float)[None, :] * 100 / 100  # 与pandas换算为百分位数后的精度一致
+
+    virtual_index = (counts - 1) * quantiles
+    previous_index = np.minimum(np.floor(virtual_index), counts - 1)  # 超出末位时取组内最大值
+    next_index = np.minimum(previous_index + 1, counts - 1)
+    gamma = virtual_index - np.floor(virtual_index)
+
+    previous_value = sorted_values[starts[:, None] + previous_index.astype(np.intp)]
+    next_value = sorted_values[starts[:, None] + next_index.astype(np.intp)]
+    diff = next_value - previous_value
+    return np.where(gamma >= 0.5, next_value - diff * (1 - gamma), previous_value + diff * gamma)
+
+
+def scene_mask(flows, slot_keys, scene_quantile):
+    """
+    选取各时段内交叉口总流率比Yr不低于分位数的场景.
+    参数：
+        flows：包含Yr列的DataFrame。
+        slot_keys：时段的分组列。
+        scene_quantile：分位数，或分位数列表。
+    返回值：
+        (行数, 分位数个数)的布尔数组。
+    """
+    quantiles = scene_quantile if isinstance(scene_quantile, (list, tuple)) else [scene_quantile]
+    codes = flows.groupby(slot_keys, sort=False).ngroup().values
+    Yr = flows['Yr'].values.astype(float)
+    return Yr[:, None] >= grouped_quantile(codes, Yr, quantiles)[codes]
+
+
+def stack_scenes(flows, mask, scene_quantile):
+    """按分位数取出选中的场景，分位数为列表时增加scene_quantile列"""
+    if not isinstance(scene_quantile, (list, tuple)):
+        return flows[mask[:, 0]]
+    return pd.concat([flows[mask[:, i]].assign(scene_quantile=scene_quantile[i]) for i in range(0, len(scene_quantile))],
+                     ignore_index=True)
+
+
+def webster_key_phase(flows, scene_quantile=0.9):
+    """
+    获取关键相位车流率（webster配时）:区分路口、工作日和周末、分时段统计关键相位车流量.
+    参数：
+        flows：Traffic_Flow生成的流量。
+        scene_quantile：场景覆盖率，可为分位数列表（结果增加scene_quantile列）。
+    返回值：
+        (key_phase_flow, flow_phase_para, phase_stage_infos)
+        key_phase_flow：各时段、阶段选中场景的流率比均值yi及总流率比均值Yr；
+        flow_phase_para：各时段、阶段的全红、黄灯和最小绿；
+        phase_stage_infos：ring-phase与stage-phase在各day_no,period_no下的对应关系。
+    """
+    flows = flows.assign(sat_flow=sat_flow_values(flows))
+    flows = flows[flows['sat_flow'] != 0.0]
+    phase_stage_infos = flows.groupby(['day_no', 'period_no', 'phase', 'stage_no']).agg(
+        {'links_no': 'count'}).reset_index()
+    flows = flows.assign(yi=flows['flow_rate'] / flows['sat_flow'])  # 流率比
+    # 阶段的全红、黄灯和最小绿转为数值列，分组取最大值时无需逐组调用Python比较（无阶段的空字符串为NaN）
+    flows = flows.assign(**{column: pd.to_numeric(flows[column], errors='coerce')
+                            for column in ['all_red', 'yellow', 'min_green']})
+
+    slot_keys = ['day_no', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle']
+    scene_keys = ['day_no', 'date', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle']
+    stage_flow = flows.groupby(
+        ['day_no', 'date', 'period_no', 'plan_no', 'time', 'stage_no', 'min_cycle', 'max_cycle']).agg(
+        {'all_red': 'max', 'yellow': 'max', 'min_green': 'max', 'yi': 'max'}).reset_index()  # 取同一时段，同一相位的最大yi值
+    flow_phase_para = stage_flow.groupby(['day_no', 'period_no', 'plan_no', 'time', 'stage_no']).agg(
+        {'all_red': 'max', 'yellow': 'max', 'min_green': 'max'}).reset_index()
+    flow_phase_para['all_red'] = flow_phase_para['all_red'].astype('int')
+
+    # 每个日期的场景：关键相位流率比之和Yr
+    scenes = stage_flow.groupby(scene_keys)['yi'].sum().rename('Yr').reset_index()
+    scenes = stack_scenes(scenes, scene_mask(scenes, slot_keys, scene_quantile), scene_quantile)
+    if isinstance(scene_quantile, (list, tuple)):
+        slot_keys = ['scene_quantile'] + slot_keys
+    stage_flow = pd.merge(stage_flow, scenes.drop(columns='Yr'), on=scene_keys)
+
+    # 选择某一饱和度区间对应的相位流率均值作为算法输入
+    key_phase_flow = pd.merge(scenes.groupby(slot_keys)['Yr'].mean().reset_index(),
+                              stage_flow.groupby(slot_keys + ['stage_no'])['yi'].mean().reset_index(), on=slot_keys)
+    return key_phase_flow, flow_phase_para, phase_stage_infos
+
+
+def queue_key_phase(flows, scene_quantile=0.9):
+    """
+    获取关键相位车流率（排队长度最小配时）:选取场景流量，以进口道、相位和车道作为分组依据，
+    取同一进口道、相同相位的车道流量最大，作为相位的关键输入.
+    参数：
+        flows：Traffic_Flow生成的流量。
+        scene_quantile：场景覆盖率，可为分位数列表（结果增加scene_quantile列）。
+    返回值：
+        各时段、进口道、相位的关键流量flow_rate和进口道平均流量road_flow_rate。
+    """
+    flows = flows.assign(sat_flow=sat_flow_values(flows))
+    flows = flows[flows['sat_flow'] != 0.0]
+    flows = flows.assign(yi=flows['flow_rate'] / flows['sat_flow'])  # 流率比
+    flows = flows.assign(Yr=flows.groupby(['day_no', 'date', 'period_no', 'plan_no', 'time'])['yi'].transform('sum'))
+
+    slot_keys = ['day_no', 'period_no', 'plan_no', 'time']
+    flows = stack_scenes(flows, scene_mask(flows, slot_keys, scene_quantile), scene_quantile)
+    if isinstance(scene_quantile, (list, tuple)):
+        slot_keys = ['scene_quantile'] + slot_keys
+
+    lane_flow = flows.groupby(slot_keys + ['road', 'phase', 'lane']).agg(
+        {'flow_rate': 'mean'}).reset_index()  # 选择某一饱和度区间对应的相位流率均值作为算法输入
+    key_phase_flow = lane_flow.groupby(slot_keys + ['road', 'phase']).agg(
+        {'flow_rate': 'max'}).reset_index()  # 取同一时段，同一相位的最大yi值
+    key_phase_flow['road_flow_rate'] = key_phase_flow.groupby(slot_keys + ['road'])['flow_rate'].transform('mean')
+    return key_phase_flow.query('phase != ""')
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+
+class PlanCache:
+    """
+    时刻点配时方案的内存缓存：
+        - 以按容差量化的各进口道、相位流量，阶段方案结构、周期范围和渠化信息作为键，不包含日期和时刻，
+          相邻时刻点、不同日期的相同时刻点流量相近时复用同一方案
+        - 缓存最优周期和各阶段时长，阶段流量由使用方按当前时刻点的流量重新计算
+        - 超过max_size条时按最近使用淘汰（LRU），统计命中率
+    """
+
+    def __init__(self, tolerance=0.0, max_size=4096):
+        self.tolerance = tolerance  # 流量量化的容差（辆/小时），为0时只复用流量完全相同的时刻点
+        self.max_size = max_size
+        self.plans = OrderedDict()  # {key:(cycle, stage_times)}
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, value):
+        return int(round(value / self.tolerance)) if self.tolerance > 0 else float(value)
+
+    def key(self, flow, plan_para, phase_lane):
+        """
+        计算时刻点的缓存键.
+        参数：
+            flow：时刻点的关键相位流量（day_no、period_no、plan_no、road、phase、flow_rate、road_flow_rate列）。
+            plan_para：方案参数，取阶段方案结构、周期范围、搜索步长、搜索方式、热启动方式和周期搜索方式。
+            phase_lane：渠化信息（相位的饱和流率）。
+        返回值：
+            可哈希的元组。流量行按原顺序排列，日计划、时段、方案只保留分组关系。
+        """
+        stages = tuple((tuple(stage['id']) if isinstance(stage['id'], list) else stage['id'], stage['min_green'],
+                        stage['yellow'], stage['all_red'], stage['pedestrian_time'])
+                       for stage in plan_para['phase_plan'])
+        groups = flow.groupby(['day_no', 'period_no', 'plan_no'], sort=False).ngroup().values
+        rows = tuple((groups[r], flow['road'].iloc[r], flow['phase'].iloc[r], self.quantize(flow['flow_rate'].iloc[r]),
+                      self.quantize(flow['road_flow_rate'].iloc[r])) for r in range(0, len(flow)))
+        return (stages, plan_para['min_cycle'], plan_para['max_cycle'], plan_para['step'],
+                plan_para.get('exact_search', False), plan_para.get('warm_start'), plan_para.get('cycle_search', 'bisect'),
+                repr(phase_lane), rows)
+
+    def get(self, key):
+        """返回(cycle, stage_times)，未命中时返回None"""
+        if key not in self.plans:
+            self.misses += 1
+            return None
+        self.plans.move_to_end(key)
+        self.hits += 1
+        return self.plans[key]
+
+    def put(self, key, cycle, stage_times):
+        self.plans[key] = (cycle, list(stage_times))
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.max_size:
+            self.plans.popitem(last=False)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
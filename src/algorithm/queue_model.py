@@ -0,0 +1,296 @@
+import math
+import numpy as np
+
+
+class QueueModel:
+    """
+    交叉口排队长度模型的数组形式（交通波模型：按红灯阶段的排队形成波和绿灯阶段的排队消散波计算各相位的排队长度）：
+        - 环结构只与阶段的相位组成有关：将单位向量作为阶段时长输入stage_to_ring，得到各环相位的起止时刻
+          由哪些阶段时长依次累加而成
+        - 各流量行匹配的环相位、流量、两种交通状态下的上游速度、基础通行能力，各环相位的饱和流率一次打包为数组
+        - junction_queue_length对一批阶段时长向量一次计算交叉口排队长度，lower_bound计算部分方案的排队长度下界
+    """
+
+    def __init__(self, optimizer, phase_plan, flow):
+        """
+        参数：
+            optimizer：TrafficTimingMultiObject对象，提供stage_to_ring和模型参数。
+            phase_plan：阶段方案，只使用阶段的相位组成、黄灯和全红时间。
+            flow：一个时刻点的关键相位流量（phase、road、flow_rate、road_flow_rate列）。
+        """
+        self.start_loss = optimizer.start_loss
+        self.stop_density = optimizer.stop_density
+        self.stage_num = len(phase_plan)
+
+        # 环结构：各环相位的起止时刻为阶段时长按阶段顺序的累加，记录参与累加的阶段编号
+        unit_plan = [{'id': phase_plan[k]['id'], 'stage_time': np.eye(self.stage_num)[k],
+                      'yellow': phase_plan[k]['yellow'], 'all_red': phase_plan[k]['all_red']}
+                     for k in range(0, self.stage_num)]
+        ring_list = optimizer.stage_to_ring(unit_plan)
+        self.ring_phases = []  # [(ring, id, overlap, start_stages, end_stages, yellow, all_red, sat_flow)]
+        for i in range(0, len(ring_list)):
+            for ring_phase in ring_list[i]:
+                self.ring_phases.append((i, ring_phase['id'], ring_phase['overlap'],
+                                         np.flatnonzero(ring_phase['start']), np.flatnonzero(ring_phase['end']),
+                                         ring_phase['yellow'], ring_phase['all_red'], ring_phase.get('sat_flow')))
+
+        # 流量行匹配的环相位（相位编号在"主相位,搭接相位"字符串中，取最后一个匹配），未匹配时通行能力为1200
+        flow = flow.reset_index(drop=True)
+        self.row_phase = np.full(len(flow), -1)
+        for r in range(0, len(flow)):
+            for e in range(0, len(self.ring_phases)):
+                if flow['phase'].iloc[r] in (self.ring_phases[e][1] + ',' + self.ring_phases[e][2]):
+                    self.row_phase[r] = e
+        self.base_capacity = np.array([self.ring_phases[e][7] if e >= 0 else 1200.0 for e in self.row_phase])
+
+        road_groups = flow.assign(base_capacity=self.base_capacity).groupby(
+            ['day_no', 'period_no', 'plan_no', 'time', 'road'])
+        self.row_road = road_groups.ngroup().values
+        self.road_num = road_groups.ngroups
+        self.down_flows = road_groups['flow_rate'].transform('sum').values
+        road_ave_capacity = road_groups['base_capacity'].transform('mean').values
+
+        # 上游速度：饱和状态按指数模型，不饱和状态按线性模型（参数见calculate_speed_from_flow）
+        b0, max_speed_sat, max_speed_unsat, min_speed_unsat = 6.9671, 35, 60, 40
+        self.up_speed_sat = np.array([b0 * math.exp(math.log(max_speed_sat / b0) / road_ave_capacity[r] *
+                                                    flow['road_flow_rate'].iloc[r]) for r in range(0, len(flow))])
+        self.up_speed_unsat = np.array([60 + (min_speed_unsat - max_speed_unsat) / road_ave_capacity[r] *
+                                        flow['road_flow_rate'].iloc[r] for r in range(0, len(flow))])
+        self.sat_ratio_threshold = optimizer.sat_ratio_threshold
+        self.flow_rate = flow['flow_rate'].values.astype(float)
+
+        # 各环相位计算排队长度的流量行：主相位和搭接相位中流量（首行）最大的相位，无流量时不计入
+        first_row = {}
+        for r in range(0, len(flow)):
+            first_row.setdefault(flow['phase'].iloc[r], r)
+        self.queue_row = []
+        self.previous_phase = []  # 同一环中前一个相同编号的相位，用于计算前一红灯时长
+        for e in range(0, len(self.ring_phases)):
+            ring, phase_id, overlap = self.ring_phases[e][0:3]
+            queue_phase = phase_id
+            max_flow = self.flow_rate[first_row[phase_id]] if phase_id in first_row else 0.0
+            if overlap != '':
+                for ring_p in overlap.split(','):
+                    if ring_p in first_row and self.flow_rate[first_row[ring_p]] > max_flow:
+                        queue_phase = ring_p
+                        max_flow = self.flow_rate[first_row[ring_p]]
+            self.queue_row.append(first_row.get(queue_phase, -1))
+
+            ring_elements = [k for k in range(0, len(self.ring_phases)) if self.ring_phases[k][0] == ring]
+            j = ring_elements.index(e)
+            previous = -1
+            for k in ring_elements[j - 1::-1] + ring_elements[:j:-1] if j > 0 else ring_elements[:j:-1]:
+                if self.ring_phases[k][1] == phase_id:
+                    previous = k
+                    break
+            self.previous_phase.append(previous)
+
+        # 下界计算：环相位时长包含的阶段（起止时刻的阶段之差），以及确定排队长度所需的最后一个阶段
+        self.phase_stages = []
+        self.phase_last_stage = []
+        for e in range(0, len(self.ring_phases)):
+            start_stages, end_stages = set(self.ring_phases[e][3]), set(self.ring_phases[e][4])
+            self.phase_stages.append(sorted(end_stages - start_stages) if start_stages <= end_stages else None)
+            stages = start_stages | end_stages
+            if self.previous_phase[e] >= 0:
+                stages |= set(self.ring_phases[self.previous_phase[e]][3]) | set(self.ring_phases[self.previous_phase[e]][4])
+            self.phase_last_stage.append(max(stages) if stages else -1)
+
+    def fold_stage_time(self, stage_times, stages):
+        """按阶段顺序依次累加阶段时长"""
+        if len(stages) == 0:
+            return np.zeros(stage_times.shape[0])
+        value = stage_times[:, stages[0]]
+        for k in stages[1:]:
+            value = value + stage_times[:, k]
+        return value
+
+    def junction_queue_length(self, stage_times, cycle):
+        """
+        计算一批阶段时长方案的交叉口排队长度.
+        参数：
+            stage_times：(方案数, 阶段数)的阶段时长数组。
+            cycle：周期时长，标量或长度为方案数的数组。
+        返回值：
+            长度为方案数的交叉口排队长度数组。
+        """
+        stage_times = np.asarray(stage_times, dtype=float).reshape(-1, self.stage_num)
+        batch_num = stage_times.shape[0]
+        cycle = np.broadcast_to(np.asarray(cycle, dtype=float), (batch_num,))
+        start = [self.fold_stage_time(stage_times, ring_phase[3]) for ring_phase in self.ring_phases]
+        end = [self.fold_stage_time(stage_times, ring_phase[4]) for ring_phase in self.ring_phases]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            saturated = self.saturated_rows(start, end, cycle)
+            junction_queue_length = np.zeros(batch_num)
+            for e in range(0, len(self.ring_phases)):
+                r = self.queue_row[e]
+                if r < 0:
+                    continue
+                red_time_before_phase = self.red_time_before_phase(e, start, end, cycle)
+                phase_green_time = end[e] - start[e] - self.ring_phases[e][6]
+                up_speed = np.where(saturated[r], self.up_speed_sat[r], self.up_speed_unsat[r])
+                junction_queue_length = junction_queue_length + self.phase_queue_length(
+                    e, red_time_before_phase, phase_green_time, cycle, up_speed)[0]
+        return junction_queue_length
+
+    def lower_bound(self, stage_times, fixed_num, cycle, min_stage_times=None):
+        """
+        部分方案的排队长度下界：前fixed_num个阶段时长已确定，其余阶段时长不小于min_stage_times，
+        完整方案的总时长与周期之差不超过0.5秒.
+            - 由各环相位时长的取值范围得到进口道通行能力的范围，能确定交通状态时按该状态计算，否则取两种状态的较小值
+            - 起止时刻均已确定的环相位：按已确定的时长计算排队长度
+            - 其余环相位：排队长度不小于绿灯期间未消散时的排队长度与最大排队长度的一半中的较小值，
+              最大排队长度随前一红灯时长增加，红灯时长取可达到的最小值（存在同编号的前一相位时取0）
+        参数：
+            stage_times：(方案数, 阶段数)的阶段时长数组，未确定的阶段可为任意值。
+            fixed_num：已确定的阶段数。
+            cycle：周期时长，标量或长度为方案数的数组。
+            min_stage_times：各阶段时长的下限，为None时取0。
+        返回值：
+            长度为方案数的排队长度下界数组。
+        """
+        stage_times = np.asarray(stage_times, dtype=float).reshape(-1, self.stage_num)
+        batch_num = stage_times.shape[0]
+        cycle = np.broadcast_to(np.asarray(cycle, dtype=float), (batch_num,))
+        start = [self.fold_stage_time(stage_times, ring_phase[3]) for ring_phase in self.ring_phases]
+        end = [self.fold_stage_time(stage_times, ring_phase[4]) for ring_phase in self.ring_phases]
+        if min_stage_times is None:
+            min_stage_times = np.zeros(self.stage_num)
+        lower_times = np.where(np.arange(0, self.stage_num) < fixed_num, stage_times,
+                               np.asarray(min_stage_times, dtype=float))
+        lower_total = lower_times.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 环相位时长的取值范围，以及前一红灯时长的下限
+            duration_min, duration_max, red_time_min = [], [], []
+            for e in range(0, len(self.ring_phases)):
+                if self.phase_last_stage[e] < fixed_num:
+                    duration = end[e] - start[e]
+                    duration_min.append(duration)
+                    duration_max.append(duration)
+                    red_time_min.append(None)
+                elif self.phase_stages[e] is None:
+                    duration_min.append(np.full(batch_num, -np.inf))
+                    duration_max.append(np.full(batch_num, np.inf))
+                    red_time_min.append(np.zeros(batch_num))
+                else:
+                    inside_time = lower_times[:, self.phase_stages[e]].sum(axis=1)
+                    duration_min.append(inside_time)
+                    duration_max.append(cycle + 0.5 - (lower_total - inside_time))
+                    red_time_min.append(np.maximum(lower_total - inside_time - 0.5, 0.0)
+                                        if self.previous_phase[e] < 0 else np.zeros(batch_num))
+
+            # 进口道通行能力的范围，确定饱和、不饱和状态
+            capacity_min = self.road_sum(self.row_capacity(duration_min, cycle))
+            capacity_max = self.road_sum(self.row_capacity(duration_max, cycle))
+            positive = capacity_min[self.row_road] > 0
+            saturated = positive & (self.down_flows[:, None] / capacity_max[self.row_road] >=
+                                    self.sat_ratio_threshold * (1 + 1e-9))
+            unsaturated = positive & (self.down_flows[:, None] / capacity_min[self.row_road] <
+                                      self.sat_ratio_threshold * (1 - 1e-9))
+
+            bound = np.zeros(batch_num)
+            for e in range(0, len(self.ring_phases)):
+                r = self.queue_row[e]
+                if r < 0:
+                    continue
+                all_red = self.ring_phases[e][6]
+                phase_queue = []
+                for up_speed in (self.up_speed_sat[r], self.up_speed_unsat[r]):
+                    if red_time_min[e] is None:
+                        phase_queue.append(self.phase_queue_length(
+                            e, self.red_time_before_phase(e, start, end, cycle), end[e] - start[e] - all_red, cycle,
+                            up_speed)[0])
+                    else:
+                        _, over_queue_length, max_queue_length = self.phase_queue_length(
+                            e, red_time_min[e], cycle - red_time_min[e] - all_red, cycle, up_speed)
+                        phase_queue.append(np.minimum(over_queue_length, max_queue_length / 2))
+                bound = bound + np.where(saturated[r], phase_queue[0], np.where(
+                    unsaturated[r], phase_queue[1], np.minimum(phase_queue[0], phase_queue[1])))
+        return bound
+
+    def row_capacity(self, durations, cycle):
+        """各流量行的通行能力：匹配的环相位按时长durations[e]折算，未匹配时为1200"""
+        row_capacity = []
+        for e in self.row_phase:
+            if e >= 0:
+                yellow, sat_flow = self.ring_phases[e][5], self.ring_phases[e][7]
+                row_capacity.append(sat_flow * (durations[e] + yellow - self.start_loss) / cycle)
+            else:
+                row_capacity.append(np.full(len(cycle), 1200.0))
+        return row_capacity
+
+    def road_sum(self, row_values):
+        """
+        各流量行的数值按进口道汇总，与pandas分组求和相同，按行顺序做补偿求和（Kahan）.
+            - 加数为无穷大时补偿项为nan，此时补偿项置0，和保持为无穷大
+        参数：
+            row_values：各流量行长度为方案数的数组。
+        返回值：
+            (进口道数, 方案数)的数组。
+        """
+        total = np.zeros((self.road_num, len(row_values[0]) if row_values else 0))
+        compensation = np.zeros_like(total)
+        for r in range(0, len(row_values)):
+            g = self.row_road[r]
+            y = row_values[r] - compensation[g]
+            t = total[g] + y
+            compensation[g] = np.nan_to_num(t - total[g] - y, nan=0.0, posinf=0.0, neginf=0.0)
+            total[g] = t
+        return total
+
+    def saturated_rows(self, start, end, cycle):
+        """
+        下游通行能力按进口道汇总，判断各流量行是否为饱和状态.
+        返回值：
+            (流量行数, 方案数)的布尔数组。
+        """
+        down_capacity = self.road_sum(self.row_capacity([end[e] - start[e] for e in range(0, len(end))], cycle))
+        sat_ratio = self.down_flows[:, None] / down_capacity[self.row_road]
+        return sat_ratio >= self.sat_ratio_threshold
+
+    def red_time_before_phase(self, e, start, end, cycle):
+        """环相位e之前红灯持续的时长：同一环中存在相同编号的前一相位时，取两者之间的间隔"""
+        previous = self.previous_phase[e]
+        if previous < 0:
+            return cycle - (end[e] - start[e])
+        return np.where(start[e] < end[previous], cycle - end[previous] + start[e], start[e] - end[previous])
+
+    def phase_queue_length(self, e, red_time_before_phase, phase_green_time, cycle, up_speed):
+        """
+        环相位e的排队长度.
+        返回值：
+            (排队长度, 绿灯期间未消散时的排队长度, 最大排队长度)，排队长度为最大、最小排队长度的均值。
+        """
+        r = self.queue_row[e]
+        sat_flow = self.ring_phases[e][7]
+        up_volume = self.flow_rate[r]
+        base_capacity = self.base_capacity[r]
+
+        # 红灯阶段的排队形成波和绿灯阶段的第一个排队消散波
+        speed_wf1 = (0 - up_volume) / (self.stop_density - up_volume / up_speed)
+        sat_pass_headway = 30 / 3.6 * 3600 / sat_flow
+        sat_pass_density = 1000 / sat_pass_headway
+        speed_wd1 = (base_capacity - 0) / (sat_pass_density - self.stop_density)
+
+        phase_max_queue_time = (0.0 + abs(speed_wf1) / 3.6 * red_time_before_phase) / (
+                abs(speed_wd1 - speed_wf1) / 3.6)
+        over_green = phase_max_queue_time > phase_green_time
+
+        # 绿灯期间未消散：最大、最小排队长度均为周期内形成波的长度
+        over_queue_length = cycle * abs(speed_wf1) / 3.6
+        max_queue_length = phase_max_queue_time * abs(speed_wd1) / 3.6
+
+        # 绿灯结束前达到最大排队：第二个排队消散波，计算绿灯结束时刻的最小排队长度
+        speed_wd2 = (base_capacity - up_volume) / (sat_pass_density - up_volume / up_speed)
+        max_queue_dissipation_time = max_queue_length / abs(speed_wd2 / 3.6)
+        speed_wf2 = (0 - base_capacity) / (self.stop_density - sat_pass_density)
+        phase_min_queue_time = (max_queue_length - abs(speed_wd2 / 3.6) * (
+                phase_green_time - phase_max_queue_time)) / abs((speed_wd2 - speed_wf2) / 3.6)
+        min_queue_length = np.where((phase_max_queue_time + max_queue_dissipation_time) < phase_green_time,
+                                    0.0, phase_min_queue_time * abs(speed_wf2) / 3.6)
+
+        queue_length = np.where(over_green, (over_queue_length + over_queue_length) / 2,
+                                (min_queue_length + max_queue_length) / 2)
+        return queue_length, over_queue_length, max_queue_length
@@ -0,0 +1,45 @@
+import numpy as np
+
+from algorithm.key_phase import grouped_quantile
+
+
+def trimmed_group_stats(frame, keys, stats):
+    """
+    按分组计算剔除异常值后的统计量，结果按行展开（与groupby(keys)[column].transform的结果对齐）.
+        - 异常值：超出[中位数 - 3 * 四分位距, 中位数 + 3 * 四分位距]的值
+        - 全部列按(列, 分组)编号后一次排序计算分位数，再按保留的值一次汇总均值或最大值
+    参数：
+        frame：DataFrame，统计列不含空值。
+        keys：分组列。
+        stats：{列名:'mean'或'max'}。
+    返回值：
+        {列名:各行所在分组的统计量数组}
+    """
+    columns = list(stats.keys())
+    codes = frame.groupby(keys, sort=False).ngroup().values
+    group_num = codes.max() + 1 if len(codes) > 0 else 0
+    row_num = len(codes)
+
+    # 第c列第g组的编号为c * group_num + g
+    stacked_codes = (np.arange(len(columns))[:, None] * group_num + codes[None, :]).ravel()
+    stacked_values = np.concatenate([frame[column].values.astype(float) for column in columns])
+    quantiles = grouped_quantile(stacked_codes, stacked_values, [0.25, 0.5, 0.75])
+    delta_q = quantiles[:, 2] - quantiles[:, 0]
+    down = (quantiles[:, 1] - 3 * delta_q)[stacked_codes]
+    up = (quantiles[:, 1] + 3 * delta_q)[stacked_codes]
+    kept = (stacked_values <= up) & (stacked_values >= down)
+
+    total_num = len(columns) * group_num
+    counts = np.bincount(stacked_codes[kept], minlength=total_num)
+    sums = np.bincount(stacked_codes[kept], weights=stacked_values[kept], minlength=total_num)
+    maximums = np.full(total_num, -np.inf)
+    np.maximum.at(maximums, stacked_codes[kept], stacked_values[kept])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    maximums[counts == 0] = np.nan
+
+    result = {}
+    for c in range(0, len(columns)):
+        value = means if stats[columns[c]] == 'mean' else maximums
+        result[columns[c]] = value[stacked_codes[c * row_num:(c + 1) * row_num]]
+    return result
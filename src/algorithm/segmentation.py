@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def segment_costs(values):
+    """
+    各连续区间的组内平方和：cost[i, j]为第i至第j-1个时刻点的特征与其均值之差的平方和.
+    参数：
+        values：(时刻点数, 特征数)的数组，按时间排列。
+    返回值：
+        (时刻点数 + 1, 时刻点数 + 1)的数组，j <= i的区间为inf。
+    """
+    n = len(values)
+    s1 = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    s2 = np.concatenate([[0.0], np.cumsum((values ** 2).sum(axis=1))])
+    length = np.arange(n + 1)[None, :] - np.arange(n + 1)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cost = (s2[None, :] - s2[:, None]) - ((s1[None, :, :] - s1[:, None, :]) ** 2).sum(axis=2) / length
+    return np.where(length > 0, np.maximum(cost, 0.0), np.inf)
+
+
+def segment_slots(values, max_segments, min_length, penalty=None):
+    """
+    将按时间排列的时刻点划分为连续的配时时段（动态规划）.
+        - 时段数为k时的最优划分：cost_k[j] = min(cost_{k-1}[i] + 区间[i, j)的组内平方和)，区间不少于min_length个时刻点
+        - 时段数在1~max_segments内自动选择：组内平方和 + penalty * 时段数最小，相同时取时段数少的
+        - penalty为None时按BIC取 σ² * (特征数 + 1) * ln(时刻点数)，σ²由相邻时刻点特征之差估计
+    参数：
+        values：(时刻点数, 特征数)的数组，按时间排列。
+        max_segments：最多时段数。
+        min_length：每个时段最少的时刻点数（最小时间间隔）。
+        penalty：每增加一个时段的代价。
+    返回值：
+        各时刻点的时段标签，从0开始按时间递增。
+    """
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    n = len(values)
+    min_length = max(int(min_length), 1)
+    segment_num = max(1, min(int(max_segments), n // min_length))
+    if segment_num == 1:
+        return np.zeros(n, dtype=int)
+
+    if penalty is None:
+        noise = (np.diff(values, axis=0) ** 2).mean(axis=0).mean() / 2  # 相邻时刻点之差的方差为2σ²
+        penalty = noise * (values.shape[1] + 1) * np.log(n)
+
+    cost = segment_costs(values)
+    length = np.arange(n + 1)[None, :] - np.arange(n + 1)[:, None]
+    cost[length < min_length] = np.inf
+
+    # best[k][j]：前j个时刻点划分为k + 1个时段的最小平方和，split[k][j]为最后一个时段的起点
+    best = [cost[0]]
+    split = [np.zeros(n + 1, dtype=int)]
+    for k in range(1, segment_num):
+        total = best[-1][:, None] + cost
+        split.append(total.argmin(axis=0))
+        best.append(total.min(axis=0))
+
+    totals = np.array([best[k][n] + penalty * (k + 1) for k in range(0, segment_num)])
+    k = int(np.argmin(totals))  # argmin取第一个最小值，即时段数少的划分
+
+    labels = np.zeros(n, dtype=int)
+    end = n
+    while k > 0:
+        start = split[k][end]
+        labels[start:end] = k
+        end = start
+        k -= 1
+    return labels
@@ -0,0 +1,211 @@
+import copy
+import xml.etree.ElementTree as xee
+
+
+class Node:
+    """
+    XML节点的模型：标签、属性、文本和子节点，按XML中的顺序保存.
+        - 子节点的标签在MODELS中时解析为对应的模型类，其余保存为Node
+        - 文本和尾部文本（tail）原样保存，写回的文件保留原有的缩进和换行
+    """
+
+    def __init__(self, element):
+        self.tag = element.tag
+        self.attrs = dict(element.attrib)
+        self.text = element.text
+        self.tail = element.tail
+        self.children = [parse_node(child) for child in element]
+
+    @classmethod
+    def create(cls, tag, attrs=None, text=None):
+        """新建不对应XML节点的模型，用于写回方案时生成环结构"""
+        node = cls.__new__(cls)
+        node.tag, node.attrs, node.text, node.tail, node.children = tag, dict(attrs or {}), text, None, []
+        return node
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def set(self, name, value):
+        self.attrs[name] = value
+
+    def findall(self, tag):
+        """标签为tag的子节点（不含更深层的节点）"""
+        return [child for child in self.children if child.tag == tag]
+
+    def find(self, tag):
+        children = self.findall(tag)
+        return children[0] if children else None
+
+    def findtext(self, tag):
+        """第一个标签为tag的子节点的文本，与ElementTree一致：无文本时为''，无该子节点时为None"""
+        child = self.find(tag)
+        return (child.text or '') if child is not None else None
+
+    def iter(self, cls):
+        """按文档顺序遍历子孙节点中cls类的模型"""
+        for child in self.children:
+            if isinstance(child, cls):
+                yield child
+            yield from child.iter(cls)
+
+    def to_element(self):
+        """序列化：生成ElementTree节点"""
+        element = xee.Element(self.tag, self.attrs)
+        element.text, element.tail = self.text, self.tail
+        element.extend([child.to_element() for child in self.children])
+        return element
+
+
+def text_property(tag):
+    """子节点tag的文本"""
+    return property(lambda self: self.findtext(tag))
+
+
+def attr_property(name):
+    """属性name的值"""
+    return property(lambda self: self.get(name))
+
+
+class Schedule(Node):
+    """调度：起止月日和星期范围内执行的日计划编号"""
+    no = attr_property('no')
+    start_month = text_property('start_month')
+    start_day = text_property('start_day')
+    end_month = text_property('end_month')
+    end_day = text_property('end_day')
+    week = text_property('week')
+    day_no = text_property('day_no')
+
+
+class Day(Node):
+    """日计划：按开始时刻排列的时段"""
+    no = attr_property('no')
+
+
+class Period(Node):
+    """时段：日计划中从start_time（hh:mm）起执行的方案编号和周期范围"""
+    no = attr_property('no')
+    max_cycle = text_property('max_cycle')
+    min_cycle = text_property('min_cycle')
+    plan_no = text_property('plan_no')
+
+    @property
+    def start_time(self):
+        return '%02d:%02d' % (int(self.findtext('hour')), int(self.findtext('minute')))
+
+
+class Links(Node):
+    """一组渠化车道"""
+    no = attr_property('no')
+
+
+class Link(Node):
+    """渠化路段的一条车道：路段、车道编号、检测器（无检测器时为None）、相位和饱和流率"""
+    phase = attr_property('phase')
+
+    @property
+    def road(self):
+        return self.get('from', '')
+
+    @property
+    def lane(self):
+        return self.get('fromLane', '')
+
+    @property
+    def camera(self):
+        return int(self.get('camera')) if self.get('camera') is not None else None  # camear_id为整型
+
+    @property
+    def sat_flow(self):
+        return self.get('sat_flow', '')
+
+
+class State(Node):
+    """环中的一个相位，attrs为state节点的全部属性"""
+    phase = attr_property('phase')
+
+
+class Barrier(Node):
+    """环中的屏障"""
+
+
+class Plan(Node):
+    """方案：周期和各环的相位、屏障序列"""
+    no = attr_property('no')
+    links_no = attr_property('links')
+    cycle = text_property('cycle')
+
+    @property
+    def rings(self):
+        return [[child for child in ring.children if isinstance(child, (State, Barrier))]
+                for ring in self.findall('ring')]
+
+
+class Light(Node):
+    """交叉口的调度、日计划、渠化和方案，均按XML中的顺序索引"""
+    id = attr_property('id')
+    system_time = text_property('system_time')
+
+    def __init__(self, element):
+        super().__init__(element)
+        self.schedules = {}  # {schedule_no:Schedule}
+        for schedule in self.iter(Schedule):
+            if schedule.no is not None:
+                self.schedules[schedule.no] = schedule
+        self.days = {}  # {day_no:{start_time:Period}}
+        for day in self.iter(Day):
+            if day.no is not None:
+                self.days[day.no] = {period.start_time: period for period in day.iter(Period)}
+        self.links = {}  # {links_no:[Link]}
+        for links in self.iter(Links):
+            if links.no is not None:
+                self.links[links.no] = list(links.iter(Link))
+        self.plans = {}  # {plan_no:Plan}
+        for plan in self.iter(Plan):
+            if plan.no is not None:
+                self.plans[plan.no] = plan
+
+    def cameras(self):
+        """交叉口全部检测器编号，按XML中的顺序去重"""
+        cameras = []
+        for links in self.links.values():
+            for link in links:
+                if link.camera is not None and link.camera not in cameras:
+                    cameras.append(link.camera)
+        return cameras
+
+
+MODELS = {'schedule': Schedule, 'day': Day, 'period': Period, 'links': Links, 'link': Link, 'state': State,
+          'barrier': Barrier, 'plan': Plan, 'light': Light}
+
+
+def parse_node(element):
+    return MODELS.get(element.tag, Node)(element)
+
+
+class SignalConfig:
+    """
+    信控文件的解析模型：
+        - 文件只解析一次，按交叉口编号索引调度、日计划、渠化（按links_no）和方案（按plan_no）
+        - 只保存解析后的模型，不保留XML文档树；写回方案时修改模型的副本（copy），write序列化时才生成XML
+    """
+
+    def __init__(self, traffic_light_file):
+        self.traffic_light_file = traffic_light_file
+        self.root = parse_node(xee.parse(traffic_light_file).getroot())
+        self.lights = {}  # {inter_id:Light}
+        for light in ([self.root] if isinstance(self.root, Light) else []) + list(self.root.iter(Light)):
+            if light.id is not None:
+                self.lights[light.id] = light
+
+    def light(self, inter_id):
+        return self.lights.get(inter_id)
+
+    def copy(self):
+        """模型的副本：写回方案时在副本上修改，不影响共用的模型"""
+        return copy.deepcopy(self)
+
+    def write(self, fn, **kwargs):
+        """将模型序列化为XML文件，kwargs同ElementTree.write"""
+        xee.ElementTree(self.root.to_element()).write(fn, **kwargs)
@@ -1,37 +1,49 @@
 import sys
 import pandas as pd
 import numpy as np
-import time
-import xml.dom.minidom as XML
-from xml.dom import Node
+from algorithm.signal_config import SignalConfig, Barrier
 
 class Traffic_Flow:
 
-    def __init__(self, data_file, traffic_light_file, inter_id, plan_para={}, flow_interval=6):
+    def __init__(self, data_file, traffic_light_file, inter_id, plan_para={}, flow_interval=6, start_time=None,
+                 end_time=None, chunk_size=200000, flow_cache=None, bin_counts=None,
+                 signal_config=None, check_cancel=None):
         self.data_file = data_file
         self.traffic_light_file = traffic_light_file
+        # 过车数据的读取范围：[start_time, end_time)，为None时不限制；按chunk_size行分块读取
+        self.start_time = pd.Timestamp(start_time) if start_time is not None else None
+        self.end_time = pd.Timestamp(end_time) if end_time is not None else None
+        self.chunk_size = chunk_size
+        self.flow_cache = flow_cache  # 聚合流量的磁盘缓存（flow_cache.FlowCache），为None时不使用缓存
+        self.bin_counts = bin_counts  # 预先读取的各时间间隔过车数（read_data的返回格式），不为None时不再读取过车数据文件
+        self.check_cancel = check_cancel  # 每读取一块过车数据后调用check_cancel()，抛出异常即中止读取，为None时不检查
 
         self.plan_para = plan_para
         self.stage_phases = {}  # {key:value} == {phase_no:stage_no}
 
         self.inter_id = inter_id
+        # 时间间隔（分钟）须整除一天的分钟数：各天零点均为时间间隔的边界，逐块按当天零点划分与resample的分组一致
+        if flow_interval <= 0 or 1440 % flow_interval != 0:
+            raise ValueError('流量统计间隔须整除1440分钟：%s' % flow_interval)
         self.flow_interval = flow_interval
         # 渠化映射表
         self.detect_road = {}  # {key:value} == {detect:road}
         self.phase_lane = {}  # {key:{key:{key:value}}} == {camera:{lane:{phase:value,sat_flow:value}}}
+        self.phase_index = {}  # {key:value} == {(inter_id,links_no):DataFrame[camera_id,lane,phase,sat_flow]}
         # 时段映射表
-        self.schedule = {}     # {key:{key:value}} == {schedule_no:{node_name:node_value}}
-        self.day = {}          # {key:{key:{key:value}} == {day_no:{start_time:{node_name:node_value}}
+        self.schedule = {}     # {key:value} == {schedule_no:signal_config.Schedule}
+        self.day = {}          # {key:{key:value}} == {day_no:{start_time:signal_config.Period}}
         # 方案映射表
         self.links_no = ''
         # self.plan = {}                         #{key:value} == {plan_no:links_no}
 
-        self.plan_phases = {}  # {key:value} == {plan_no:xml.nodelist}
+        self.plan_phases = {}  # {key:value} == {plan_no:signal_config.Plan}
 
         self.flows = None
 
-        domTree = XML.parse(self.traffic_light_file)
-        self.rootNode = domTree.documentElement
+        # 信控文件的解析模型，可由调用方传入以复用；交叉口不存在时light为None
+        self.signal_config = signal_config if signal_config is not None else SignalConfig(self.traffic_light_file)
+        self.light = self.signal_config.light(self.inter_id)
 
     def read_XML(self):
         self.read_schedule_info()
@@ -49,132 +61,125 @@ class Traffic_Flow:
     # 读取路段中的进口道-检测器映射信息，以及进口道-车道-相位的映射信息
     def read_links(self):
         detector_ids = ""
-        lights = self.rootNode.getElementsByTagName("light")  # 存在多个交叉口
-        for light in lights:
-            if light.hasAttribute("id") and light.getAttribute("id") == self.inter_id:
-                print("junction_id:", light.getAttribute("id"))
-                all_links = light.getElementsByTagName("links")  # 存在多个links
-                for all_link in all_links:
-                    if all_link.hasAttribute("no"):
-                        self.links_no = all_link.getAttribute("no")
-                        links = all_link.getElementsByTagName("link")
-                        for link in links:
-                            road = link.getAttribute("from")
-                            # 读取XML文件，返回检测器与路段的映射表，和转换成的字符串
-                            if link.hasAttribute("camera"):
-                                camera = int(link.getAttribute("camera"))  # camear_id为整型
-                                self.detect_road[camera] = road
+        if self.light is not None:
+            print("junction_id:", self.light.id)
+            for links_no, links in self.light.links.items():  # 存在多个links
+                self.links_no = links_no
+                for link in links:
+                    # 返回检测器与路段的映射表，和转换成的字符串
+                    if link.camera is not None:
+                        self.detect_road[link.camera] = link.road
 
         detect_ids = list(self.detect_road.keys())
         detector_ids = self.list_to_str(detect_ids)  # 交叉口多个检测器的拼接字符串，以逗号隔开
         return detector_ids
 
-    # 读取过车数，返回过车数据的起始和结束时间，和流量数据
+    # 过车数据中用到的列及其类型
+    data_dtypes = {'camera_id': 'int64', 'lane': 'int64', 'destination': 'object', 'class': 'object'}
+
+    # 将一块过车数据按摄像头和时间窗过滤，并累计为(camera_id, lane, destination, passtime)各时间间隔的过车数
+    def fold_chunk(self, chunk, camera_ids):
+        chunk = chunk[chunk['camera_id'].isin(camera_ids) & chunk['class'].notna()]
+        passtime = pd.to_datetime(chunk['passtime'])
+        in_window = pd.Series(True, index=chunk.index)
+        if self.start_time is not None:
+            in_window &= passtime >= self.start_time
+        if self.end_time is not None:
+            in_window &= passtime < self.end_time
+        chunk, passtime = chunk[in_window], passtime[in_window]
+
+        # 时间间隔从当天零点起划分：resample以首条记录当天零点为起点，flow_interval整除1440时各天零点都在其分组边界上
+        day_start = passtime.dt.normalize()
+        interval = pd.Timedelta(minutes=self.flow_interval)
+        bin_counts = pd.DataFrame({'camera_id': chunk['camera_id'],
+                                   'lane': chunk['lane'],
+                                   'destination': chunk['destination'].fillna(''),
+                                   'passtime': day_start + (passtime - day_start) // interval * interval})
+        return bin_counts.groupby(['camera_id', 'lane', 'destination', 'passtime']).size()
+
+    # 返回指定交叉口各时间间隔的过车数
     def read_data(self):
-        camera_ids = self.read_links()
-        vehicle_flow = pd.read_csv(self.data_file)
-        vehicle_flow = vehicle_flow.query('camera_id in (%s)' % camera_ids)
-        vehicle_flow['passtime'] = pd.to_datetime(vehicle_flow['passtime'])
-        return vehicle_flow
+        self.read_links()
+        if self.bin_counts is not None:
+            return self.bin_counts
+        return self.read_bin_counts(list(self.detect_road.keys()))
+
+    # 分块读取指定摄像头的过车数，返回各时间间隔的过车数（峰值内存取决于时间间隔数，而非过车记录数）
+    def read_bin_counts(self, camera_ids):
+        bin_counts = None
+        reader = pd.read_csv(self.data_file, usecols=['passtime'] + list(self.data_dtypes.keys()),
+                             dtype=self.data_dtypes, chunksize=self.chunk_size)
+        for chunk in reader:
+            if self.check_cancel is not None:
+                self.check_cancel()
+            chunk_counts = self.fold_chunk(chunk, camera_ids)
+            if bin_counts is not None:
+                chunk_counts = pd.concat([bin_counts, chunk_counts]).groupby(level=[0, 1, 2, 3]).sum()
+            bin_counts = chunk_counts
+        if bin_counts is None:  # 文件中没有过车记录时，返回相同列和类型的空表
+            bin_counts = pd.Series([], dtype='int64', index=pd.MultiIndex.from_arrays(
+                [pd.Series([], dtype='int64'), pd.Series([], dtype='int64'), pd.Series([], dtype='object'),
+                 pd.Series([], dtype='datetime64[ns]')], names=['camera_id', 'lane', 'destination', 'passtime']))
+        return bin_counts.rename('vehicle_num').reset_index()
 
     def read_schedule_info(self):  # 读取调度信息
-        sches = self.rootNode.getElementsByTagName("schedule")
-        for sche in sches:
-            if sche.hasAttribute("no"):
-                no = sche.getAttribute("no")
-
-                schedule_info = {}
-                start_month = (sche.getElementsByTagName("start_month")[0]).childNodes[0].data
-                start_day = (sche.getElementsByTagName("start_day")[0]).childNodes[0].data
-                end_month = (sche.getElementsByTagName("end_month")[0]).childNodes[0].data
-                end_day = (sche.getElementsByTagName("end_day")[0]).childNodes[0].data
-                week = (sche.getElementsByTagName("week")[0]).childNodes[0].data
-                day_no = (sche.getElementsByTagName("day_no")[0]).childNodes[0].data
-                schedule_info['start_month'] = start_month
-                schedule_info['start_day'] = start_day
-                schedule_info['end_month'] = end_month
-                schedule_info['end_day'] = end_day
-                schedule_info['week'] = week
-                schedule_info['day_no'] = day_no
-                self.schedule[no] = schedule_info
+        if self.light is not None:
+            self.schedule = self.light.schedules
 
     def read_day_info(self):  # 读取日计划信息
-        days = self.rootNode.getElementsByTagName("day")
-        for d in days:
-            period = {}
-            if d.hasAttribute("no"):
-                day_no = d.getAttribute("no")
-                pds = d.getElementsByTagName("period")
-                for pd in pds:
-                    period_info = {}
-                    pd_no = pd.getAttribute("no")
-                    hour = (pd.getElementsByTagName("hour")[0]).childNodes[0].data
-                    hour = str(int(hour))
-                    minute = (pd.getElementsByTagName("minute")[0]).childNodes[0].data
-                    minute = str(int(minute))
-                    hour = hour if len(hour) == 2 else '0' + hour
-                    minute = minute if len(minute) == 2 else '0' + minute
-                    h_m = hour + ":" + minute
-                    # coord_type = (pd.getElementsByTagName("coord_type")[0]).childNodes[0].data
-                    # control_type = (pd.getElementsByTagName("control_type")[0]).childNodes[0].data
-                    max_cycle = (pd.getElementsByTagName("max_cycle")[0]).childNodes[0].data
-                    min_cycle = (pd.getElementsByTagName("min_cycle")[0]).childNodes[0].data
-                    plan_no = (pd.getElementsByTagName("plan_no")[0]).childNodes[0].data
-                    period_info['no'] = pd_no
-                    # period_info['coord_type'] = coord_type
-                    # period_info['control_type'] = control_type
-                    period_info['max_cycle'] = max_cycle
-                    period_info['min_cycle'] = min_cycle
-                    period_info['plan_no'] = plan_no
-                    period[h_m] = period_info
-            self.day[day_no] = period
+        if self.light is not None:
+            self.day = self.light.days
 
     def read_plan_info(self):
-        pls = self.rootNode.getElementsByTagName("plan")
-        for pl in pls:
-            if (pl.hasAttribute("no")):
-                pl_no = pl.getAttribute("no")
-                links_no = pl.getAttribute("links")
-                #self.plan[pl_no] = links_no
-                self.plan_phases[pl_no] = pl
-
-    def add_day_no(self, sr):  # 流量加入day_no列
-        month_day = sr['date'][5:11]
-        week = sr['week']
-        for key, value in self.schedule.items():
-            start_month = str(int(value['start_month']))
-            start_day = str(int(value['start_day']))
-            end_month = str(int(value['end_month']))
-            end_day = str(int(value['end_day']))
-
-            start_month = start_month if len(start_month) == 2 else '0' + start_month
-            start_day = start_day if len(start_day) == 2 else '0' + start_day
-            end_month = end_month if len(end_month) == 2 else '0' + end_month
-            end_day = end_day if len(end_day) == 2 else '0' + end_day
-            start_date = start_month + "-" + start_day
-            end_date = end_month + "-" + end_day
-            if (month_day >= start_date and month_day <= end_date):
-                if week in value['week']:
-                    return str(int(value['day_no']))
-        return ""
-
-    def add_period_no(self, sr):
-        day_info = self.day[sr['day_no']]
-        period_no = ""
-        for key, value in day_info.items():
-            if sr['time'] >= key:
-                period_no = str(int(day_info[key]['no']))
-        return period_no
-
-    def add_plan_no(self, sr):  # 流量加入plan_no列  TODO:day_info需要采用有序字典
-        day_info = self.day[sr['day_no']]
-        plan_no = ""
-        for key, value in day_info.items():
-            if sr['time'] >= key:
-                plan_no = str(int(day_info[key]['plan_no']))
-        return plan_no
-
-    def add_cycle_length(self, sr):  # 增加最大周期和最小周期的限制
+        if self.light is not None:
+            self.plan_phases = self.light.plans
+
+    # 将调度信息编译为有序的日期-日计划编号日历
+    def compile_day_calendar(self, dates):
+        calendar = pd.DataFrame({'date': np.sort(pd.unique(dates))})
+        passdate = pd.to_datetime(calendar['date'])
+        month_day = (passdate.dt.month * 100 + passdate.dt.day).values
+        week = ((passdate.dt.dayofweek + 1) % 7).astype(str)  # 与strftime("%w")一致，周日为0
+
+        day_nos = np.full(len(calendar), '', dtype=object)
+        matched = np.zeros(len(calendar), dtype=bool)
+        for key, value in self.schedule.items():  # 按XML中的顺序，取第一个满足条件的调度
+            start_date = int(value.start_month) * 100 + int(value.start_day)
+            end_date = int(value.end_month) * 100 + int(value.end_day)
+            hit = (month_day >= start_date) & (month_day <= end_date) & week.isin(list(value.week)).values
+            day_nos[hit & ~matched] = str(int(value.day_no))
+            matched |= hit
+        calendar['day_no'] = day_nos
+        return calendar
+
+    # 将日计划编译为按(day_no, 分钟)排序的时段断点表
+    def compile_period_table(self):
+        breakpoints = []
+        for day_no, day_info in self.day.items():
+            for key, value in day_info.items():
+                hour, minute = key.split(':')
+                breakpoints.append((str(int(day_no)), int(hour) * 60 + int(minute), str(int(value.no)),
+                                    str(int(value.plan_no))))
+        period_table = pd.DataFrame(breakpoints, columns=['day_no', 'minute', 'period_no', 'plan_no'])
+        period_table['minute'] = period_table['minute'].astype('int64')
+        return period_table.sort_values('minute', kind='mergesort').reset_index(drop=True)
+
+    # 流量加入day_no、period_no和plan_no列：日期在日历中二分查找，时刻按断点表向后匹配
+    def add_calendar_info(self):
+        calendar = self.compile_day_calendar(self.flows['date'])
+        date_index = np.searchsorted(calendar['date'].values, self.flows['date'].values)
+        self.flows['day_no'] = calendar['day_no'].values[date_index]
+
+        flows_time = pd.DataFrame({'day_no': self.flows['day_no'].values,
+                                   'minute': (self.flows['passtime'].dt.hour * 60 +
+                                              self.flows['passtime'].dt.minute).values.astype('int64'),
+                                   'row': np.arange(len(self.flows))})
+        flows_time = pd.merge_asof(flows_time.sort_values('minute', kind='mergesort'), self.compile_period_table(),
+                                   on='minute', by='day_no', direction='backward').sort_values('row')
+        self.flows['period_no'] = flows_time['period_no'].fillna('').values
+        self.flows['plan_no'] = flows_time['plan_no'].fillna('').values
+
+    def add_cycle_length(self):  # 增加最大周期和最小周期的限制，与流量行无关，整列赋值
         """
         day_info = self.day[sr['day_no']]
         min_cycle, max_cycle = "", ""
@@ -192,126 +197,174 @@ class Traffic_Flow:
             min_cycle += (min_green + yellow + all_red)
         min_cycle = max(min_cycle, self.plan_para['min_cycle'])
         max_cycle = self.plan_para['max_cycle']
-        return pd.Series([min_cycle, max_cycle])
+        self.flows['min_cycle'] = min_cycle
+        self.flows['max_cycle'] = max_cycle
 
     def get_links_no(self, sr):  # 流量加入links_no列（渠化信息）
         return self.plan[sr['plan_no']]
 
+    # 转向流量的列名
+    directions = ['left', 'straight', 'right', 'uturn']
+
+    # 与resample一致，补全每个(camera_id, lane)首末时间间隔之间缺失的时间间隔
+    def full_interval_index(self, index):
+        bounds = index.to_frame(index=False).groupby(['camera_id', 'lane'])['passtime'].agg(['min', 'max']).reset_index()
+        interval = np.timedelta64(self.flow_interval, 'm')
+        bin_num = ((bounds['max'] - bounds['min']).values // interval + 1).astype('int64')
+        offsets = np.arange(bin_num.sum()) - np.repeat(np.cumsum(bin_num) - bin_num, bin_num)
+        return pd.MultiIndex.from_arrays([np.repeat(bounds['camera_id'].values, bin_num),
+                                          np.repeat(bounds['lane'].values, bin_num),
+                                          np.repeat(bounds['min'].values, bin_num) + offsets * interval],
+                                         names=['camera_id', 'lane', 'passtime'])
+
     def caculate_flow(self, vehicle_flow, type=0):
 
-        # if type==0:       #采用更新时间间隔内的过车，计算流量值
-        flows = vehicle_flow.set_index('passtime').groupby(['camera_id', 'lane']).resample('%dT' % self.flow_interval)[
-            'class'].count().reset_index(name='flow_rate')
-        flows['flow_rate'] *= 60 / self.flow_interval
-        flows_direction = vehicle_flow.set_index('passtime').groupby(['camera_id', 'lane', 'destination']).resample(
-            '%dT' % self.flow_interval)[
-            'class'].count().reset_index(name='direction_flow')
-        flows_direction['direction_flow'] *= 60 / self.flow_interval
-
-        flows_left = flows_direction[flows_direction['destination'] == 'left']
-        flows_straight = flows_direction[flows_direction['destination'] == 'straight']
-        flows_right = flows_direction[flows_direction['destination'] == 'right']
-        flows_uturn = flows_direction[flows_direction['destination'] == 'uturn']
-
-        flows_left = flows_left.drop(columns=['destination'])
-        flows_straight = flows_straight.drop(columns=['destination'])
-        flows_right = flows_right.drop(columns=['destination'])
-        flows_uturn = flows_uturn.drop(columns=['destination'])
-
-        flows = pd.merge(flows, flows_left, on=['camera_id', 'passtime', 'lane'], how='left').rename(
-            columns=({'direction_flow': 'left'}))
-        flows = pd.merge(flows, flows_straight, on=['camera_id', 'passtime', 'lane'], how='left').rename(
-            columns=({'direction_flow': 'straight'}))
-        flows = pd.merge(flows, flows_right, on=['camera_id', 'passtime', 'lane'], how='left').rename(
-            columns=({'direction_flow': 'right'}))
-        flows = pd.merge(flows, flows_uturn, on=['camera_id', 'passtime', 'lane'], how='left').rename(
-            columns=({'direction_flow': 'uturn'}))
-
-        flows['passtime'] = pd.to_datetime(flows['passtime'])
-        flows['time'] = flows.apply(lambda x: x['passtime'].strftime("%H:%M"), axis=1)
-        flows['date'] = flows['passtime'].dt.date.astype(str)
-        flows['week'] = flows.apply(lambda x: x['passtime'].strftime("%w"), axis=1)
+        # if type==0:       #采用更新时间间隔内的过车，计算流量值（vehicle_flow为read_data累计的各时间间隔过车数）
+        # 按时间间隔和转向一次聚合，同时得到总流量和各转向流量
+        counts = vehicle_flow.groupby(['camera_id', 'lane', 'passtime', 'destination'])['vehicle_num'].sum().unstack(
+            'destination', fill_value=0)
+        flows = counts.reindex(columns=self.directions, fill_value=0)
+        flows.insert(0, 'flow_rate', counts.sum(axis=1))
+        flows = flows.reindex(self.full_interval_index(counts.index), fill_value=0) * (60 / self.flow_interval)
+        flows = flows.reset_index()
+        flows.columns.name = None
+        self.flows = flows
+        self.add_time_info()
+
+    # 流量加入时刻、日期和星期列
+    def add_time_info(self):
+        self.flows['time'] = self.flows['passtime'].dt.strftime("%H:%M")
+        self.flows['date'] = self.flows['passtime'].dt.date.astype(str)
+        self.flows['week'] = self.flows['passtime'].dt.strftime("%w")
+
+    # 为新增的流量行添加路段、时段、相位、阶段和周期信息（与generate_flow的处理顺序一致）
+    def label_flow(self, flows):
+        all_flows = self.flows
         self.flows = flows
+        self.add_time_info()
+        self.add_road_info()
+        self.add_calendar_info()
+        self.flows['links_no'] = self.links_no
+        self.add_phase_info()
+        self.add_stage_no_from_input()
+        self.add_cycle_length()
+        flows, self.flows = self.flows, all_flows
+        return flows
+
+    def append_flow(self, records):
+        """
+        增量追加过车数据，只更新受影响的(camera_id, lane, passtime)时间间隔（需先调用generate_flow）.
+        参数：
+            records: 新增的过车记录（列与过车数据文件相同的DataFrame），或新增过车数据的csv文件路径；
+                     允许包含迟到的历史记录，结果与对全部过车数据重新计算一致
+        """
+        camera_ids = list(self.detect_road.keys())
+        if isinstance(records, str):
+            reader = pd.read_csv(records, usecols=['passtime'] + list(self.data_dtypes.keys()),
+                                 dtype=self.data_dtypes, chunksize=self.chunk_size)
+            chunk_counts = [self.fold_chunk(chunk, camera_ids) for chunk in reader]
+        else:
+            chunk_counts = [self.fold_chunk(records.astype(self.data_dtypes), camera_ids)]
+        bin_counts = pd.concat(chunk_counts).groupby(level=[0, 1, 2, 3]).sum()
+        if len(bin_counts) == 0:
+            return
+
+        counts = bin_counts.unstack('destination', fill_value=0)
+        new_counts = counts.reindex(columns=self.directions, fill_value=0)
+        new_counts.insert(0, 'flow_rate', counts.sum(axis=1))
+        count_columns = list(new_counts.columns)
+        factor = 60 / self.flow_interval
+
+        flows = self.flows.set_index(['camera_id', 'lane', 'passtime'])
+        # 已有时间间隔：由流量还原过车数后累加，再换算为流量，避免浮点误差累积
+        updated_index = new_counts.index.intersection(flows.index)
+        flows.loc[updated_index, count_columns] = ((flows.loc[updated_index, count_columns] / factor).round().values +
+                                                   new_counts.loc[updated_index].values) * factor
+
+        # 新增时间间隔：受影响的(camera_id, lane)首末时间间隔扩展后，补全其间缺失的时间间隔
+        affected = flows.index.droplevel('passtime').isin(new_counts.index.droplevel('passtime'))
+        full_index = self.full_interval_index(flows.index[affected].append(new_counts.index))
+        added_index = full_index.difference(flows.index)
+        flows = flows.reset_index()
+        if len(added_index) > 0:
+            added = (new_counts.reindex(added_index, fill_value=0) * factor).reset_index()
+            added = self.label_flow(added)[flows.columns]
+            flows = pd.concat([flows, added], ignore_index=True).sort_values(['camera_id', 'lane', 'passtime'],
+                                                                           kind='mergesort')
+        self.flows = flows.reset_index(drop=True)
 
     # 根据过车数据的时段，选取plan中对应的links编号；根据links编号，在detect_road中找links信息
     def read_phase_info(self, links_no):  # TODO，混合车道包含两个相位的问题（phase_lane)
-        lights = self.rootNode.getElementsByTagName("light")  # 存在多个交叉口
-        for light in lights:
-            if light.hasAttribute("id") and light.getAttribute("id") == self.inter_id:  # 当前交叉口的编号
-                all_links = light.getElementsByTagName("links")  # 存在多个links（可能存在可变车道或者潮汐车道情况）
-                for all_link in all_links:
-                    if all_link.hasAttribute("no") and all_link.getAttribute("no") == links_no:
-                        links = all_link.getElementsByTagName("link")  # 当前渠化路段的编号
-                        for link in links:
-                            lane = link.getAttribute("fromLane")
-
-                            if not link.hasAttribute("camera"):
-                                continue
-
-                            camera = int(link.getAttribute("camera"))
-
-                            # 读取XML文件，返回路段-车道与相位的映射表
-                            if link.hasAttribute("phase"):
-                                phase = link.getAttribute("phase")
-                                sat_flow = link.getAttribute("sat_flow")
-                                if phase[0] == 'P':
-                                    continue
-                                if camera not in self.phase_lane.keys():
-                                    self.phase_lane[camera] = {}
-                                lane_info = {}
-                                lane_info['phase'] = phase
-                                lane_info['sat_flow'] = sat_flow
-                                self.phase_lane[camera][lane] = lane_info
+        if self.light is None:
+            return
+        for link in self.light.links.get(links_no, []):  # 当前渠化路段（可能存在可变车道或者潮汐车道情况）
+            if link.camera is None:
+                continue
+            # 返回路段-车道与相位的映射表
+            if link.phase is not None:
+                if link.phase[0] == 'P':
+                    continue
+                if link.camera not in self.phase_lane.keys():
+                    self.phase_lane[link.camera] = {}
+                lane_info = {}
+                lane_info['phase'] = link.phase
+                lane_info['sat_flow'] = link.sat_flow
+                self.phase_lane[link.camera][link.lane] = lane_info
 
     # 添加路段编号
     def add_road_info(self):
         self.flows['road'] = self.flows['camera_id'].map(self.detect_road)
 
-    def add_phase_no(self, sr):
-        self.read_phase_info(sr['links_no'])  # 根据渠化编号，车道添加相位和饱和流率信息
-        camera_lane_max = max(list(self.phase_lane[sr['camera_id']].keys()))    #当前摄像头拍摄的车道组的最大编号
-        lane = str(int(camera_lane_max) - sr['lane'] + 1)
-        if lane not in self.phase_lane[sr['camera_id']].keys():
-            return pd.Series(['', ''])
-        else:
-            return pd.Series(
-                [self.phase_lane[sr['camera_id']][lane]['phase'], self.phase_lane[sr['camera_id']][lane]['sat_flow']])
+    # 按交叉口和渠化编号构建一次摄像头-车道-相位查找表，XML中的车道编号按摄像头车道组的最大编号换算为过车数据中的车道号
+    def build_phase_index(self, links_no):
+        key = (self.inter_id, links_no)
+        if key not in self.phase_index:
+            self.read_phase_info(links_no)  # 根据渠化编号，车道添加相位和饱和流率信息
+            lane_phases = []
+            for camera, lanes in self.phase_lane.items():
+                camera_lane_max = max(list(lanes.keys()))  # 当前摄像头拍摄的车道组的最大编号
+                for lane, lane_info in lanes.items():
+                    if str(int(lane)) != lane:  # 过车车道号换算后为str(int)格式，非该格式的编号无法匹配
+                        continue
+                    lane_phases.append((camera, int(camera_lane_max) - int(lane) + 1, lane_info['phase'],
+                                        lane_info['sat_flow']))
+            self.phase_index[key] = pd.DataFrame(lane_phases, columns=['camera_id', 'lane', 'phase', 'sat_flow'])
+        return self.phase_index[key]
+
+    # 按渠化编号、摄像头和车道，一次连接添加相位和饱和流率信息
+    def add_phase_info(self):
+        phase_index = pd.concat([self.build_phase_index(links_no).assign(links_no=links_no)
+                                 for links_no in self.flows['links_no'].unique()], ignore_index=True)
+        phase_index = phase_index.astype({'camera_id': self.flows['camera_id'].dtype, 'lane': self.flows['lane'].dtype})
+        flows_phase = pd.merge(self.flows[['links_no', 'camera_id', 'lane']], phase_index,
+                               on=['links_no', 'camera_id', 'lane'], how='left')
+        self.flows['phase'] = flows_phase['phase'].fillna('').values
+        self.flows['sat_flow'] = flows_phase['sat_flow'].fillna('').values
 
     # 根据起始时间和结束时间，读取对应时段的方案信息
     def read_traffic_plan(self, plan_no):
-        plan_phase = self.plan_phases[plan_no]
-        phases = {}
-
-        rings = plan_phase.getElementsByTagName("ring")
+        rings = self.plan_phases[plan_no].rings
         ring_size = len(rings)
         ring_list = [[] for i in range(0, ring_size)]
-        i = 0
-
-        for ring in rings:
-            j = 0
-            for element in ring.childNodes:
-                if element.nodeType == Node.ELEMENT_NODE:
-                    phase_info = {}
-                    if j == 0 and element.nodeName == 'barrier':
-                        phase_info['phase'] = '0'
-                        phase_info['barrier'] = '1'
-                        phase_info['split'] = 0
-                    elif element.nodeName == 'state':
-
-                        for key in element.attributes.keys():
-                            attr = element.attributes[key]
-                            phase_info[attr.name] = attr.value
-                        phase_info['barrier'] = '0'
-                        phase_info['split'] = int(phase_info['green']) + int(phase_info['yellow']) + int(
-                            phase_info['all_red'])
-                    elif j != 0 and element.nodeName == 'barrier':
-                        ring_list[i][-1]['barrier'] = '1'
-                        continue
 
-                    ring_list[i].append(phase_info)
+        for i in range(0, ring_size):
+            for j in range(0, len(rings[i])):
+                element = rings[i][j]
+                phase_info = {}
+                if j == 0 and isinstance(element, Barrier):
+                    phase_info['phase'] = '0'
+                    phase_info['barrier'] = '1'
+                    phase_info['split'] = 0
+                elif isinstance(element, Barrier):
+                    ring_list[i][-1]['barrier'] = '1'
+                    continue
+                else:
+                    phase_info.update(element.attrs)
+                    phase_info['barrier'] = '0'
+                    phase_info['split'] = int(phase_info['green']) + int(phase_info['yellow']) + int(
+                        phase_info['all_red'])
 
-                    j += 1
-            i += 1
+                ring_list[i].append(phase_info)
 
         # 环中第一个相位为空的特殊处理，将阶段时长置为另一环中同一屏障前所有相位的总时长
         if ring_list[0][0]['phase'] == '0' or ring_list[1][0]['phase'] == '0':
@@ -428,17 +481,17 @@ class Traffic_Flow:
             for j in range(0, len(phase_list)):
                 self.stage_phases[phase_list[j]] = 'P' + str(i + 1)
 
-    def add_stage_no_from_input(self, sr):
+    # 按相位-阶段映射表，一次映射添加阶段编号、全红、黄灯和最小绿信息；无相位的流量行均为空字符串
+    def add_stage_no_from_input(self):
         phase_plan = self.plan_para['phase_plan']
-        stage_no, all_red, yellow, min_green = '', '', '', ''
-        if sr['phase'] != '':
-            stage_no = self.stage_phases[sr['phase']]
-            if stage_no != '':
-                stage_index = int(stage_no.split('P')[1]) - 1
-                all_red = phase_plan[stage_index]['all_red']
-                yellow = phase_plan[stage_index]['yellow']
-                min_green = phase_plan[stage_index]['min_green']
-        return pd.Series([stage_no, all_red, yellow, min_green])
+        stage_info = pd.DataFrame({'stage_no': ['P' + str(i + 1) for i in range(0, len(phase_plan))],
+                                   'all_red': [stage['all_red'] for stage in phase_plan],
+                                   'yellow': [stage['yellow'] for stage in phase_plan],
+                                   'min_green': [stage['min_green'] for stage in phase_plan]}, dtype=object)
+        flows_stage = pd.merge(self.flows['phase'].map(self.stage_phases).rename('stage_no').to_frame(), stage_info,
+                               on='stage_no', how='left')
+        for column in ['stage_no', 'all_red', 'yellow', 'min_green']:
+            self.flows[column] = flows_stage[column].astype(object).where(flows_stage['stage_no'].notna(), '').values
 
     # 调用traffic_timing算法
     ##traffic_timing算法里屏蔽聚类算法（timing_cluster）
@@ -460,20 +513,34 @@ class Traffic_Flow:
                 phase_plan.append(stage_info[key])
         return phase_plan
 
-    def generate_flow(self):
+    # 读取过车数据并统计流量，添加与方案参数无关的路段、时段和相位信息
+    def ingest_flow(self):
         vehicle_flow = self.read_data()  # 读取指定交叉口的过车数据
+        if len(vehicle_flow) == 0:
+            raise ValueError('交叉口%s在读取范围内没有过车记录' % self.inter_id)
         self.caculate_flow(vehicle_flow, type=0)  # 统计流量和转向流量
         self.add_road_info()
         self.read_XML()
-        self.read_stage_phase_from_input()  # 将阶段的信息生成为相位-阶段的映射表
-        self.flows['day_no'] = self.flows.apply(self.add_day_no, axis=1)  # 增加日计划编号信息
-        self.flows['period_no'] = self.flows.apply(self.add_period_no, axis=1)  # 增加时段编号信息
-        self.flows['plan_no'] = self.flows.apply(self.add_plan_no, axis=1)  # 增加方案编号信息
+        self.add_calendar_info()  # 增加日计划、时段和方案编号信息
         self.flows['links_no'] = self.links_no  # self.flows.apply(self.get_links_no,axis=1)   #增加渠化信息
-        self.flows[['phase', 'sat_flow']] = self.flows.apply(self.add_phase_no, axis=1)  # 增加相位编号信息
+        self.add_phase_info()  # 增加相位编号信息
+
+    def generate_flow(self):
+        if self.flow_cache is None:
+            self.ingest_flow()
+        else:
+            cache_key = self.flow_cache.key(self.data_file, self.traffic_light_file, self.inter_id, self.flow_interval,
+                                            self.start_time, self.end_time)
+            self.flows = self.flow_cache.get(cache_key)
+            if self.flows is None:
+                self.ingest_flow()
+                self.flow_cache.put(cache_key, self.flows)
+            else:  # 命中缓存时，只需从信控文件中恢复渠化、时段和相位映射表
+                self.read_links()
+                self.read_XML()
+                self.build_phase_index(self.links_no)
+        self.read_stage_phase_from_input()  # 将阶段的信息生成为相位-阶段的映射表
         # self.flows[['stage_no','all_red','yellow','min_green']] = self.flows.apply(lambda x:self.add_stage_no_from_XML(x), axis=1)   #增加阶段编号信息,阶段的黄灯，阶段的最小率
-        self.flows[['stage_no', 'all_red', 'yellow', 'min_green']] = self.flows.apply(
-            lambda x: self.add_stage_no_from_input(x), axis=1)  # 增加阶段编号信息,阶段的黄灯，阶段的最小率
-        self.flows[['min_cycle', 'max_cycle']] = self.flows.apply(lambda x: self.add_cycle_length(x),
-                                                                  axis=1)  # 增加周期长度限制
-        print('1、过车数据处理完成')
\ No newline at end of file
+        self.add_stage_no_from_input()  # 增加阶段编号信息,阶段的黄灯，阶段的最小率
+        self.add_cycle_length()  # 增加周期长度限制
+        print('1、过车数据处理完成')
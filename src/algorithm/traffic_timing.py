@@ -1,11 +1,10 @@
 import numpy as np
 import pandas as pd
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics import silhouette_score
 import math
 import datetime
 import time
-import xml.etree.cElementTree as xee
+from algorithm import key_phase, segmentation, robust_stats
+from algorithm.signal_config import SignalConfig
 
 
 class TrafficTiming:
@@ -21,15 +20,20 @@ class TrafficTiming:
         - 预估车流通行量并输出最终配时方案
     """
 
-    def __init__(self, vehicle_flow_rate, traffic_light_file, inter_id, plan_para):
+    def __init__(self, vehicle_flow_rate, traffic_light_file, inter_id, plan_para, signal_config=None,
+                 check_cancel=None):
         '''
         两个关键参数：
             - 配置文件加载——config.json
             - 关键相位车流率——key_phase_flow_rate.csv
+        signal_config：可选，信控文件的解析模型（signal_config.SignalConfig），write_state_xml写回时使用，为None时重新解析文件
+        check_cancel：可选，auto_timing的各步骤之间调用check_cancel()，抛出异常即中止配时
         '''
         # self.config = config
         self.vehicle_flow_rate = vehicle_flow_rate
         self.traffic_light_file = traffic_light_file
+        self.signal_config = signal_config
+        self.check_cancel = check_cancel
         self.plan_para = plan_para
         self.inter_id = inter_id
         self.flow_phase_para = None  # 关键相位信息
@@ -45,48 +49,8 @@ class TrafficTiming:
         """
         获取关键相位车流率:区分路口、工作日和周末、分时段统计关键相位车流量
         """
-
-        self.vehicle_flow_rate['sat_flow'] = self.vehicle_flow_rate.apply(
-            lambda x: float(x['sat_flow']) if x['sat_flow'] != '' else 0.0, axis=1)
-        self.vehicle_flow_rate = self.vehicle_flow_rate.query('sat_flow != 0.0')
-        # 保存ring-phase与stage-phase间不同时段下的映射关系
-        self.phase_stage_infos = self.vehicle_flow_rate.groupby(['day_no', 'period_no', 'phase', 'stage_no']).agg(
-            {'links_no': 'count'}).reset_index()
-
-        vehicle_flow_temp = self.vehicle_flow_rate
-        vehicle_flow_temp['yi'] = vehicle_flow_temp['flow_rate'] / vehicle_flow_temp['sat_flow']  # 流率比
-
-        vehicle_flow_temp = vehicle_flow_temp.groupby(
-            ['day_no', 'date', 'period_no', 'plan_no', 'time', 'stage_no', 'min_cycle', 'max_cycle']).agg(
-            {'all_red': max, 'yellow': max, 'min_green': max, 'yi': max}).reset_index()  # 取同一时段，同一相位的最大yi值
-        self.flow_phase_para = vehicle_flow_temp.groupby(['day_no', 'period_no', 'plan_no', 'time', 'stage_no']).agg(
-            {'all_red': max, 'yellow': max, 'min_green': max}).reset_index()
-        self.flow_phase_para['all_red'] = self.flow_phase_para['all_red'].astype('int')
-
-        vehicle_flow_temp['Yr'] = \
-            vehicle_flow_temp.groupby(['day_no', 'date', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle'])[
-                'yi'].transform('sum')
-        vehicle_flow_unstack = vehicle_flow_temp.set_index(
-            ['day_no', 'date', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle', 'Yr', 'stage_no'])[
-            'yi'].unstack().reset_index()
-
-        def Yr_quantile(sr):  # 按分位数，返回交叉口关键相位的总饱和度值
-            down = sr.quantile(self.scene_quantile)
-            return sr[(sr >= down)].min()
-
-        vehicle_flow_unstack['Yr_quantile'] = \
-            vehicle_flow_unstack.groupby(['day_no', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle'])[
-                'Yr'].transform(Yr_quantile)
-        vehicle_flow_unstack = vehicle_flow_unstack[
-                                   vehicle_flow_unstack['Yr'] >= vehicle_flow_unstack['Yr_quantile']].iloc[:, :-1]
-
-        key_phase_flow_stack = vehicle_flow_unstack.groupby(
-            ['day_no', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle']).agg(
-            'mean').reset_index()  # 选择某一饱和度区间对应的相位流率均值作为算法输入
-        key_phase_flow = key_phase_flow_stack.set_index(
-            ['day_no', 'period_no', 'plan_no', 'time', 'min_cycle', 'max_cycle', 'Yr']).stack().rename(
-            'yi').reset_index().rename(columns={'level_4': 'stage_no'})
-        self.vehicle_flow_rate = key_phase_flow
+        self.vehicle_flow_rate, self.flow_phase_para, self.phase_stage_infos = key_phase.webster_key_phase(
+            self.vehicle_flow_rate, self.scene_quantile)
         return self
 
     def webster_timing(self):
@@ -98,80 +62,52 @@ class TrafficTiming:
             2. gi = (T - L) * yi / Y - start_loss + yellow
         """
         self.start_loss = 3
-        flow_loss_time = self.flow_phase_para.groupby(['day_no', 'period_no', 'plan_no', 'time']).agg(
+        slot_keys = ['day_no', 'period_no', 'plan_no', 'time']
+        flow_loss_time = self.flow_phase_para.groupby(slot_keys).agg(
             {'all_red': sum}).rename(columns={'all_red': 'all_red_lost'}).reset_index()  # 周期内全红时间计算
 
         flow_rate = self.vehicle_flow_rate.copy()
-        # flow_rate['Yr'] = flow_rate.groupby(['day_no','period_no','plan_no','time','min_cycle','max_cycle','all_red','yellow','min_green'])['yi'].transform('sum')  # 实际的yi求和Yreal
-        flow_rate['Yc'] = flow_rate['Yr'].map(lambda x: min(0.9, max(0.1, x)))  # 计算周期的yi之和Ycount
         # 求解相位个数
         flow_rate['n_phase'] = flow_rate.groupby(['day_no', 'period_no', 'plan_no', 'min_cycle', 'max_cycle', 'time'])[
             'yi'].transform('count')
-        flow_rate = pd.merge(flow_rate, self.flow_phase_para, on=['day_no', 'period_no', 'plan_no', 'time', 'stage_no'],
-                             how='left')  # 添加全红，最小绿，黄灯时间
-        flow_rate = pd.merge(flow_rate, flow_loss_time, on=['day_no', 'period_no', 'plan_no', 'time'],
-                             how='left')  # 添加周期内的全红时间
-        # webster模型求解最佳周期
-        flow_rate['T'] = flow_rate.apply(
-            lambda x: (1.5 * (x['all_red_lost'] + self.start_loss * x['n_phase']) + 5) / (1 - x['Yc']), axis=1)
-
-        flow_rate['max_cycle'] = flow_rate['max_cycle'].astype('int')
-        flow_rate['min_cycle'] = flow_rate['min_cycle'].astype('int')
-        flow_rate['min_green'] = flow_rate['min_green'].astype('int')
-        flow_rate['yellow'] = flow_rate['yellow'].astype('int')
-
-        def get_Tmm(sr):  # 根据交叉口名称，时段
-            return min(sr['max_cycle'], max(sr['min_cycle'], sr['T']))
-
-        # 求解各相位显示绿灯时间:有效绿灯时间 * 流率比权重 + 启动损失时间 - 黄灯时间
-        def get_green(sr):
-            if sr['Yr'] > 0:  # 流率比之和不为0，加权占比求解有效
-                return sr['yi'] / sr['Yr'] * (
-                            sr['Tmm'] - (sr['all_red_lost'] + self.start_loss * sr['n_phase'])) + self.start_loss - sr[
-                           'yellow']
-            else:  # 调用其相位最小绿灯时间
-                return sr['min_green']
-
-        def judge_min_green(sr):  # 判断当前绿灯是否小于最小绿灯时间
-            if 'less_pedestrian_time' in flow_rate.columns.tolist():
-                if sr['less_pedestrian_time']:
-                    return sr['less_pedestrian_time']
-            return sr['phase_time'] < sr['min_green']
-
-        flow_rate['Tmm'] = flow_rate.apply(get_Tmm, axis=1)
-        # 求解各相位显示绿灯时间:有效绿灯时间 * 流率比权重 + 启动损失时间 - 黄灯时间
-
-        flow_rate['phase_time'] = flow_rate.apply(get_green, axis=1)
-
-        def get_effective_green(sr):
-            if sr['less_pedestrian_time']:
-                sr['phase_time'] = sr['min_green']
-            else:
-                if sr['effective_sum_yi'] > 0:  # 流率比之和不为0，加权占比求解有效
-                    sr['phase_time'] = math.floor(sr['yi'] / sr['effective_sum_yi'] * (
-                            sr['Tmm'] - sr['sum_min_time'] - (
-                                sr['all_red_lost'] + self.start_loss * sr['n_phase'])) + self.start_loss - sr[
-                                                     'yellow'])  # 向上取整
-                else:  # 调用其相位最小绿灯时间
-                    sr['phase_time'] = sr[
-                        'min_green']  # self.config['road_settings'][sr['inter_name']]['min_green'][sr['phase']]
-            return sr
-
-        # 调整非最小绿相位的绿灯分配方法
-        # 建立循环，直到不存在小于最小绿的相位
-        i = 0
-        while len(flow_rate[flow_rate['phase_time'] < flow_rate['min_green']]) > 0 or i < flow_rate['n_phase'].max():
-            flow_rate['less_pedestrian_time'] = flow_rate.apply(judge_min_green, axis=1)
-            sum_green = flow_rate.groupby(['day_no', 'period_no', 'plan_no', 'time']).apply(
-                lambda x: (x[x['less_pedestrian_time']]['min_green']).sum()).rename('sum_min_time').reset_index()
-            sum_yi = flow_rate.groupby(['day_no', 'period_no', 'plan_no', 'time']).apply(
-                lambda x: x[x['less_pedestrian_time'] == False]['yi'].sum()).rename('effective_sum_yi').reset_index()
-            flow_rate_temp = pd.merge(sum_green, sum_yi, on=['day_no', 'period_no', 'plan_no', 'time'], how='inner')
-            # flow_rate与flow_rate_temp进行左连接并赋值给flow_rate
-            flow_rate = pd.merge(flow_rate, flow_rate_temp, on=['day_no', 'period_no', 'plan_no', 'time'], how='left')
-            flow_rate = flow_rate.apply(get_effective_green, axis=1)
-            flow_rate = flow_rate.drop(columns=['sum_min_time', 'effective_sum_yi'], axis=1)
-            i += 1
+        flow_rate = pd.merge(flow_rate, self.flow_phase_para, on=slot_keys + ['stage_no'], how='left')  # 添加全红，最小绿，黄灯时间
+        flow_rate = pd.merge(flow_rate, flow_loss_time, on=slot_keys, how='left')  # 添加周期内的全红时间
+        for column in ['max_cycle', 'min_cycle', 'min_green', 'yellow']:
+            flow_rate[column] = flow_rate[column].astype('int')
+
+        # 按(时隙, 阶段)展开为数组计算，slot为各行所属时隙的编号
+        slot_groups = flow_rate.groupby(slot_keys, sort=False)
+        slot, slot_num = slot_groups.ngroup().values, slot_groups.ngroups
+        yi = flow_rate['yi'].values
+        Yr = flow_rate['Yr'].values
+        min_green = flow_rate['min_green'].values
+        yellow = flow_rate['yellow'].values
+        lost_time = flow_rate['all_red_lost'].values + self.start_loss * flow_rate['n_phase'].values  # 周期总损失时间
+
+        # webster模型求解最佳周期，计算周期的yi之和Yc限制在[0.1, 0.9]
+        T = (1.5 * lost_time + 5) / (1 - np.clip(Yr, 0.1, 0.9))
+        Tmm = np.minimum(flow_rate['max_cycle'].values, np.maximum(flow_rate['min_cycle'].values, T))
+        # 求解各相位显示绿灯时间:有效绿灯时间 * 流率比权重 + 启动损失时间 - 黄灯时间；流率比之和为0时取最小绿灯时间
+        with np.errstate(divide='ignore', invalid='ignore'):
+            phase_time = np.where(Yr > 0, yi / Yr * (Tmm - lost_time) + self.start_loss - yellow, min_green)
+
+        # 调整非最小绿相位的绿灯分配方法：小于最小绿的相位固定为最小绿，其余相位按流率比分配剩余的有效绿灯，
+        # 直到不再出现新的小于最小绿的相位（至少分配一次）
+        less = phase_time < min_green
+        while True:
+            sum_min_time = np.bincount(slot, weights=np.where(less, min_green, 0), minlength=slot_num)[slot]
+            effective_sum_yi = np.bincount(slot, weights=np.where(less, 0, yi), minlength=slot_num)[slot]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                phase_time = np.where(less | (effective_sum_yi <= 0), min_green, np.floor(
+                    yi / effective_sum_yi * (Tmm - sum_min_time - lost_time) + self.start_loss - yellow))  # 向下取整
+            new_less = less | (phase_time < min_green)
+            if (new_less == less).all():
+                break
+            less = new_less
+
+        flow_rate['T'] = T
+        flow_rate['Tmm'] = Tmm
+        flow_rate['phase_time'] = phase_time.astype('int64')
 
         # flow_rate['phase_time'] += (flow_rate['all_red'] + flow_rate['yellow'])  # 补全全红时间和黄灯时间
         flow_rate['green_ratio'] = flow_rate['phase_time'] / flow_rate['Tmm']
@@ -185,54 +121,26 @@ class TrafficTiming:
 
     def timing_cluster(self):
         """
-        获取聚类标签
+        获取聚类标签：各日计划、时段、方案内，按各时刻点的相位时间将时刻点划分为连续的配时时段（segmentation.segment_slots），
+        时段数不超过peak_max_plans，每个时段不短于peak_min_interval分钟
+        peak_max_plans默认为1（每个时段一组方案）：return_phase_plan和write_state_xml不区分cluster_label，大于1时只用于分析time_out
         """
         timing = self.timing.reset_index(drop=True)
-        # 增加车流变化率特征
-        for _, group in timing.groupby(['day_no', 'period_no', 'plan_no', 'stage_no']):
-            group.sort_values(by='time', inplace=True)
-            timing.loc[group.index, 'slope'] = group['yi'].diff() / group['yi'].shift(1)
-
         timing.fillna(method='bfill', inplace=True)
 
-        # 对峰值时段内的时隙进行聚类
+        peak_max_plans = self.plan_para.get('peak_max_plans', 1)
+        peak_min_interval = self.plan_para.get('peak_min_interval', 30)
+        min_labels = math.ceil(peak_min_interval / 6)  # 最小时间间隔转化为对最小连续标签数的限制
+
         timing['cluster_label'] = -1  # 平峰聚类标签统一设置为-1
         for name, group in timing.groupby(['day_no', 'period_no', 'plan_no']):
-            # if 'flat' in name[-1]:
-            # continue
-            X = group.pivot(index='time', columns='stage_no', values=['slope', 'phase_time']).sort_index()
-            X['n'] = np.arange(len(X)) * 6
-            X.replace([np.inf, -np.inf], 0, inplace=True)
-            X.fillna(0, inplace=True)
-            time_label_dict = self._cluster(X)
-            timing.loc[group.index, 'cluster_label'] = group.time.map(time_label_dict)
+            X = group.pivot(index='time', columns='stage_no', values='phase_time').sort_index().fillna(0)
+            labels = segmentation.segment_slots(X.values, peak_max_plans, min_labels)
+            timing.loc[group.index, 'cluster_label'] = group['time'].map(dict(zip(X.index, labels)))
 
-        self.timing = timing.astype({'cluster_label': int}).drop(columns='slope')
+        self.timing = timing.astype({'cluster_label': int})
         return self
 
-    def _cluster(self, X):
-        """
-        对高峰期配时时隙进行层次聚类
-        """
-        peak_max_plans = 1  # self.config['general_settings']['peak_max_plans']
-        peak_min_interval = 30  # self.config['general_settings']['peak_min_interval']
-        min_labels = math.ceil(peak_min_interval / 6)  # 最小时间间隔转化为对最小连续标签数的限制
-        labels = AgglomerativeClustering(peak_max_plans).fit_predict(X).tolist()
-        # 依据调整最小时间间隔调整聚类标签
-        n = len(labels)
-        if n > 1:
-            labels[1] = labels[0]
-        for i in range(1, n):
-            combine = True
-            for j in range(i + 1 - min_labels, i + 1):
-                if labels[j:j + min_labels].count(labels[i]) == min_labels:
-                    # 存在连续相同的min_labels个相同标签，意味着无需合并
-                    combine = False
-                    break
-            if combine:
-                labels[i] = labels[i - 1]
-        return dict(zip(X.index, pd.Series(labels)))
-
     def get_phase_time(self):
         """
         主要功能：
@@ -240,42 +148,31 @@ class TrafficTiming:
             - 整合配时方案——剔除重复值
         """
 
-        def green_mean_quantile(sr):
-            delta_q = sr.quantile(0.75) - sr.quantile(0.25)
-            down = sr.quantile(0.5) - 3 * delta_q
-            up = sr.quantile(0.5) + 3 * delta_q
-            return sr[(sr <= up) & (sr >= down)].mean()
-
-        def yellow_red_mean_quantile(sr):
-            delta_q = sr.quantile(0.75) - sr.quantile(0.25)
-            down = sr.quantile(0.5) - 3 * delta_q
-            up = sr.quantile(0.5) + 3 * delta_q
-            return sr[(sr <= up) & (sr >= down)].max()
-
+        # 各时段-聚类内的相位时间、流率比取剔除异常值后的均值，黄灯、全红取最大值，全部列一次计算
         timing = self.timing
-        timing['green'] = timing.groupby(['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'])[
-            'phase_time'].transform(green_mean_quantile).astype(int)  # 绿灯时长直接取整，.apply(lambda x:math.ceil(x))
-        timing['yellow'] = timing.groupby(['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'])[
-            'yellow'].transform(yellow_red_mean_quantile).astype(int)
-        timing['all_red'] = timing.groupby(['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'])[
-            'all_red'].transform(yellow_red_mean_quantile).astype(int)
+        stats = robust_stats.trimmed_group_stats(
+            timing, ['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'],
+            {'phase_time': 'mean', 'yellow': 'max', 'all_red': 'max', 'green_ratio': 'mean', 'flow_ratio': 'mean'})
+        timing['green'] = stats['phase_time'].astype(int)  # 绿灯时长直接取整，.apply(lambda x:math.ceil(x))
+        timing['yellow'] = stats['yellow'].astype(int)
+        timing['all_red'] = stats['all_red'].astype(int)
         # timing.drop_duplicates(subset=['inter_name', 'phase', 'week_label', 'peak_type', 'cluster_label'], inplace=True)
-        timing['green_ratio'] = timing.groupby(['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'])[
-            'green_ratio'].transform(green_mean_quantile)
-        timing['flow_ratio'] = timing.groupby(['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'])[
-            'flow_ratio'].transform(green_mean_quantile)
+        timing['green_ratio'] = stats['green_ratio']
+        timing['flow_ratio'] = stats['flow_ratio']
         self.timing = timing.reset_index(drop=True)
         return self
 
     def get_result(self):
-        self.timing = self.timing[['day_no', 'period_no', 'plan_no', 'time', 'stage_no', 'green', 'yellow', 'all_red']]
+        self.timing = self.timing[['day_no', 'period_no', 'plan_no', 'cluster_label', 'time', 'stage_no', 'green',
+                                   'yellow', 'all_red']]
 
+        # 每个配时时段输出一组方案，time为时段的起始时刻
         subcolumns = self.timing.columns.tolist()
         subcolumns.remove('time')
         self.time_out = self.timing.sort_values(['day_no', 'period_no', 'time']).drop_duplicates(
             subcolumns).reset_index(drop=True)
         self.time_out['phase_time'] = self.time_out['green'] + self.time_out['yellow'] + self.time_out['all_red']
-        self.time_out['cycle'] = self.time_out.groupby(['day_no', 'period_no', 'plan_no'])[
+        self.time_out['cycle'] = self.time_out.groupby(['day_no', 'period_no', 'plan_no', 'cluster_label'])[
             'phase_time'].transform('sum')
         return self
 
@@ -283,15 +180,22 @@ class TrafficTiming:
         print('2、开始进行配时分析……')
         self.get_key_phase_flow_rate()
         print('- 获取关键相位车流率完成')
+        self.cancel_point()
         self.webster_timing()
         print('- webster初配时完成')
+        self.cancel_point()
         self.timing_cluster()
         # print('- 峰值时段聚类完成')
+        self.cancel_point()
         self.get_phase_time()
         print('- 聚类配时完成')
         self.get_result()
         print('- 配时输出方案完成')
 
+    def cancel_point(self):
+        if self.check_cancel is not None:
+            self.check_cancel()
+
     def return_phase_plan(self):
         """
         返回阶段字典值
@@ -307,9 +211,10 @@ class TrafficTiming:
         return pd.Series([plan_no, cycle, self.plan_para])
 
     def write_state_xml(self):  # 相序和相位不变下，微调时长
-        domTree = xee.parse(self.traffic_light_file)
-        rootNode = domTree.getroot()
-        lights = rootNode.findall('light')
+        # 在信控文件模型的副本上修改，序列化时生成XML
+        signal_config = (self.signal_config if self.signal_config is not None else
+                         SignalConfig(self.traffic_light_file)).copy()
+        lights = signal_config.root.findall('light')
         for light in lights:
             print('id:', light.get('id'))
             if (light.get('id') == self.inter_id):
@@ -355,4 +260,4 @@ class TrafficTiming:
                                 state.set('yellow', str(yellow))
                                 state.set('all_red', str(all_red))
 
-        domTree.write("2信控-new.xml", encoding='utf-8')
\ No newline at end of file
+        signal_config.write("2信控-new.xml", encoding='utf-8')
\ No newline at end of file
@@ -1,17 +1,66 @@
 import pandas as pd
 import numpy as np
 import math
+import os
 import sys
 import copy
+import heapq
+import itertools
 
-from queue import PriorityQueue
-import xml.etree.cElementTree as xee
 from collections import Counter
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics import silhouette_score
+from concurrent.futures import ProcessPoolExecutor
+from algorithm import key_phase, segmentation, robust_stats
+from algorithm.queue_model import QueueModel
+from algorithm.green_allocation import water_fill
+from algorithm.plan_cache import PlanCache
+
+worker_optimizer = None  # 工作进程的配时对象，进程池初始化时创建一次
+CHAIN = object()  # 热启动'previous'的上一时刻点方案沿用块内前一时刻点的结果（用is比较，不与阶段时长列表混淆）
+
+
+def init_worker(traffic_light_file, inter_id, plan_para, phase_lane, flow_interval):
+    global worker_optimizer
+    worker_optimizer = TrafficTimingMultiObject(None, traffic_light_file, inter_id, plan_para, phase_lane, flow_interval)
+
+
+def optimize_slots_worker(block):
+    """
+    在工作进程中依次优化一段连续的时刻点(flows, seeds, chained)，返回([(阶段方案, 周期)], 搜索节点数, 排队长度-周期曲线).
+        - CHAIN经序列化后不再是同一对象，由chained标记还原
+    """
+    flows, seeds, chained = block
+    seeds = [CHAIN if chained[i] else seeds[i] for i in range(0, len(seeds))]
+    worker_optimizer.search_stats = dict.fromkeys(worker_optimizer.search_stats, 0)
+    worker_optimizer.cycle_curves = {}
+    return worker_optimizer.optimize_slot_block(flows, seeds), worker_optimizer.search_stats, worker_optimizer.cycle_curves
+
+
+class StageNode:
+    """
+    分支定界的搜索节点：只保存本层确定的阶段时长和剩余阶段的分配时长，前序阶段时长通过parent与父节点共享
+    """
+    __slots__ = ('parent', 'stage_time', 'layer', 'cumulative_stage_time', 'rest_times')
+
+    def __init__(self, parent, stage_time, layer, cumulative_stage_time, rest_times):
+        self.parent = parent
+        self.stage_time = stage_time  # 第layer-1阶段的时长，根节点为None
+        self.layer = layer
+        self.cumulative_stage_time = cumulative_stage_time
+        self.rest_times = rest_times  # 第layer阶段起的分配时长
+
+    def fixed_stage_times(self):
+        """已确定的第0~layer-1阶段的时长"""
+        stage_times = []
+        node = self
+        while node.parent is not None:
+            stage_times.append(node.stage_time)
+            node = node.parent
+        return stage_times[::-1]
+
 
 class TrafficTimingMultiObject:
-    def __init__(self,vehicle_flow_rate, traffic_light_file, inter_id, plan_para, phase_lane, flow_interval=6):
+    def __init__(self,vehicle_flow_rate, traffic_light_file, inter_id, plan_para, phase_lane, flow_interval=6,
+                 plan_cache=None, progress=None):
 
         self.vehicle_flow_rate = vehicle_flow_rate
         self.phase_lane = phase_lane
@@ -26,6 +75,21 @@ class TrafficTimingMultiObject:
         self.sat_ratio_threshold = 0.8     # 判断拥堵状态的阈值
         self.ring_num = 2                 # 环数
         self.scene_quantile = 0.9         # 场景覆盖率
+        self.exact_search = self.plan_para.get('exact_search', False)  # 精确搜索：按排队长度下界剪枝，得到网格上的最优方案
+        # 热启动：webster配时（'webster'）或上一时刻点的最优方案（'previous'）按周期缩放后作为备选方案，
+        # 排队长度小于启发式搜索结果时取热启动方案，并作为精确搜索的初始上界
+        self.warm_start = self.plan_para.get('warm_start')
+        self.previous_stage_times = None  # 上一时刻点的最优阶段时长
+        self.search_stats = {'expanded': 0, 'pruned': 0, 'warm_start_kept': 0}  # 分支定界扩展、剪枝的节点数，热启动方案保留为最优的次数
+        # 周期搜索方式：'bisect'按排队长度对周期单峰的假设二分搜索，'sweep'扫描周期网格上的全部周期
+        self.cycle_search = self.plan_para.get('cycle_search', 'bisect')
+        self.cycle_curves = {}  # 扫描周期时各时刻点的排队长度-周期曲线{(day_no, period_no, plan_no, time):DataFrame(cycle, junction_queue)}
+        # 时刻点配时方案的缓存（plan_cache.PlanCache）：未传入时，方案参数包含flow_tolerance（流量容差）才启用
+        if plan_cache is None and 'flow_tolerance' in self.plan_para:
+            plan_cache = PlanCache(self.plan_para['flow_tolerance'])
+        self.plan_cache = plan_cache
+        # 进度回调progress(已完成时刻点数, 时刻点总数)：每完成一个时刻点（进程池计算时为一块）调用一次，抛出异常即中止优化
+        self.progress = progress
 
         self.timing = pd.DataFrame()  # 最终配时方案
         self.time_out = pd.DataFrame()  # 配时输出方案
@@ -35,35 +99,7 @@ class TrafficTimingMultiObject:
         """
         获取关键相位车流率:分时段统计关键相位车流量
         """
-
-        self.vehicle_flow_rate['sat_flow'] = self.vehicle_flow_rate.apply(
-            lambda x: float(x['sat_flow']) if x['sat_flow'] != '' else 0.0, axis=1)
-        self.vehicle_flow_rate = self.vehicle_flow_rate.query('sat_flow != 0.0')
-
-        self.vehicle_flow_rate['yi'] = self.vehicle_flow_rate['flow_rate'] / self.vehicle_flow_rate['sat_flow']  # 流率比
-
-        self.vehicle_flow_rate['Yr'] = \
-            self.vehicle_flow_rate.groupby(['day_no', 'date', 'period_no', 'plan_no', 'time'])['yi'].transform('sum')
-
-        def Yr_quantile(sr):  # 按分位数，返回交叉口关键相位的总饱和度值
-            down = sr.quantile(self.scene_quantile)
-            return sr[(sr >= down)].min()
-
-        self.vehicle_flow_rate['Yr_quantile'] = \
-            self.vehicle_flow_rate.groupby(['day_no', 'period_no', 'plan_no', 'time'])['Yr'].transform(Yr_quantile)
-        self.vehicle_flow_rate = self.vehicle_flow_rate[
-                                self.vehicle_flow_rate['Yr'] >= self.vehicle_flow_rate['Yr_quantile']].iloc[:, :-1]
-
-        self.vehicle_flow_rate = self.vehicle_flow_rate.groupby(
-            ['day_no', 'period_no', 'plan_no', 'time', 'road', 'phase', 'lane']).agg(
-            {'flow_rate': 'mean'}).reset_index()  # 选择某一饱和度区间对应的相位流率均值作为算法输入
-
-        key_phase_flow = self.vehicle_flow_rate.groupby(['day_no', 'period_no', 'plan_no', 'time', 'road', 'phase']).agg(
-            {'flow_rate': 'max'}).reset_index()  # 取同一时段，同一相位的最大yi值
-        key_phase_flow['road_flow_rate'] = key_phase_flow.groupby(['day_no', 'period_no', 'plan_no', 'time', 'road'])[
-            'flow_rate'].transform('mean')
-        key_phase_flow = key_phase_flow.query('phase != ""')
-        return key_phase_flow
+        return key_phase.queue_key_phase(self.vehicle_flow_rate, self.scene_quantile)
 
     def list_to_str(self,detect_ids):
         id_string = ''
@@ -202,14 +238,10 @@ class TrafficTimingMultiObject:
                     overlap_phases_num[ring_main_phase] -= 1
         return ring_list
 
-    def algorithm_input(self, key_phase_flow, time):
-        flow = key_phase_flow[key_phase_flow['time'] == time]
-        return flow
-
     # 将输入阶段转为环结构，并判断相位是否存在搭接和屏障；
     # 通过在双环的相位上，添加搭接标志或者屏障;选择每个阶段的最大或最小流量作为阶段的流量。
     ##主相位为屏障相位，阶段取最大流量；如果双环存在至少一个搭接主相位，则阶段选取最小流量；如果双环不存在搭接相位，则阶段选取最大流量。
-    # 根据阶段的流量，计算主相位的排队长度；每个阶段添加个清空系数，用于在周期一定下，调整某一相位的绿灯时长。
+    # 根据阶段的流量，计算主相位的排队长度；周期一定时，按阶段流量比例分配各阶段的绿灯时长。
     def return_flow_input(self, ring_list, flow):
         flow_dict = {}
         for i in range(0, self.ring_num):
@@ -275,7 +307,7 @@ class TrafficTimingMultiObject:
             else:
                 stage_flow = min(ring1_max_flow, ring2_max_flow)
 
-            ##将阶段流量stage_flow、关键相位stage_key_phase、清空系数stage_clear_ratio、阶段时长stage_time添加到phase_plan中
+            ##将阶段流量stage_flow、关键相位stage_key_phase、阶段时长stage_time添加到phase_plan中
             if stage_flow == ring1_max_flow:
                 stage_key_phase = ring1_phase
             else:
@@ -295,8 +327,8 @@ class TrafficTimingMultiObject:
             flow_input[ring2_phase] -= stage_flow
 
             phase_plan[stage_i]['stage_flow'] = stage_flow
+            phase_plan[stage_i]['stage_flow_fixed'] = stage_flow == 0.0  # 无流量的阶段按最小阶段时长换算流量，与周期无关
             phase_plan[stage_i]['stage_key_phase'] = stage_key_phase
-            phase_plan[stage_i]['stage_clear_ratio'] = 1.0
 
             if ring_overlap[0][ring_col_index[0]]['barrier'] == ring_overlap[1][ring_col_index[1]]['barrier']:
                 for i in range(0, self.ring_num):
@@ -325,44 +357,22 @@ class TrafficTimingMultiObject:
                             'sat_headway_time'])
         return phase_plan
 
-    ###如果阶段的时长小于最小绿要求，则将最小绿作为阶段配时，并计算清空系数（最小绿/阶段时长）；
-    def iterate_clear_ratio(self, phase_plan, overall_ratio):
+    def allocation_parameters(self, phase_plan):
+        """绿灯分配的阶段参数：(阶段流量与饱和车头时距的乘积, 启动损失与全红之和, 最小阶段时长)"""
+        weights = np.array([stage['stage_flow'] * stage['sat_headway_time'] for stage in phase_plan], dtype=float)
+        loss_times = np.array([self.start_loss + stage['all_red'] for stage in phase_plan], dtype=float)
+        min_times = np.array([max(stage['min_green'], stage['pedestrian_time']) + stage['yellow'] + stage['all_red']
+                              for stage in phase_plan], dtype=float)
+        return weights, loss_times, min_times
+
+    ###按阶段流量比例分配周期时长：阶段时长 = λ * 阶段流量 * 饱和车头时距 + 启动损失 + 全红，
+    ###达不到最小绿灯（或行人时长）、黄灯和全红之和的阶段取最小时长，其余阶段按比例分配剩余时长（green_allocation.water_fill）；
+    ###周期小于各阶段最小时长之和时无可行分配，返回的周期为None。
+    def allocate_green_time(self, phase_plan, cycle):
+        stage_times, feasible = water_fill(*self.allocation_parameters(phase_plan), cycle)
         for i in range(0, len(phase_plan)):
-            min_stage_time = max(phase_plan[i]['min_green'], phase_plan[i]['pedestrian_time']) + phase_plan[i][
-                'yellow'] + \
-                             phase_plan[i]['all_red']
-            if phase_plan[i]['stage_time'] * overall_ratio < min_stage_time:
-                phase_plan[i]['stage_clear_ratio'] = (phase_plan[i]['stage_clear_ratio'] / overall_ratio) * (
-                        min_stage_time / phase_plan[i]['stage_time'])
-
-            else:
-                phase_plan[i]['stage_clear_ratio'] *= overall_ratio
-
-    def calculate_cycle_time(self,phase_plan):
-        iterative_cycle = 0.0
-        for i in range(0, len(phase_plan)):
-            phase_plan[i]['stage_time'] = phase_plan[i]['stage_flow'] * phase_plan[i]['sat_headway_time'] * \
-                                          phase_plan[i][
-                                              'stage_clear_ratio']
-            phase_plan[i]['stage_time'] += (self.start_loss + phase_plan[i]['all_red'])
-            iterative_cycle += phase_plan[i]['stage_time']
-        return iterative_cycle
-
-    ###如果阶段总体的周期时长小于传入的时长，则将计算所有清空系数（传入时长/周期时长）；
-    ###如果阶段总体的周期时长大于传入的时长，则在保证最小绿情况下，计算其他阶段的清空系数（传入时长-阶段达到最小绿）/（周期时长-阶段达到最小绿）
-    ###将阶段流量乘以清空系数，得到换算后的流量，重新分配绿灯；
-    ###直到接近传入的时长。
-    def allocate_green_time(self,phase_plan, cycle):
-        overall_ratio = 1.0
-        self.iterate_clear_ratio(phase_plan, overall_ratio)
-        iterative_cycle = self.calculate_cycle_time(phase_plan)
-
-        while abs(iterative_cycle - cycle) >= 0.5:
-            overall_ratio = cycle / iterative_cycle
-            self.iterate_clear_ratio(phase_plan, overall_ratio)
-            iterative_cycle = self.calculate_cycle_time(phase_plan)
-            # print(iterative_cycle)
-        return phase_plan, iterative_cycle
+            phase_plan[i]['stage_time'] = float(stage_times[0, i])
+        return phase_plan, float(stage_times[0].sum()) if feasible[0] else None
 
     def stage_to_ring(self, phase_plan):
         ring_num = 2
@@ -519,185 +529,6 @@ class TrafficTimingMultiObject:
                             ring_list[m][n]['sat_flow'] = float(value['sat_flow'])
         return ring_list
 
-    def initial_queue_calculation(self, phase_plan, flow, iterative_cycle):
-        ring_phases_info = self.stage_to_ring(phase_plan)
-        ring_phases_queue = ring_phases_info
-        for i in range(0, self.ring_num):
-            for j in range(0, len(ring_phases_queue[i])):
-                ring_phases_queue[i][j]['initial_queue_length'] = 0.0
-                ring_phases_queue[i][j]['max_queue_length'] = 0.0
-                ring_phases_queue[i][j]['min_queue_length'] = 0.0
-
-        ##计算排队长度
-        ###以进口道为统计单位，统计进口道的平均车道流量，作为上游的流量；以绿灯期间的车道通行能力作为下游的放行流量，而红灯期间下游放行流量为0；
-        def calculate_capacity_under_control(sr):
-            base_capacity, phase_capacity = 1200.0, 1200.0
-            for i in range(0, self.ring_num):
-                for j in range(0, len(ring_phases_info[i])):
-                    if sr['phase'] in (ring_phases_info[i][j]['id'] + ',' + ring_phases_info[i][j]['overlap']):
-                        base_capacity = ring_phases_info[i][j]['sat_flow']
-                        phase_capacity = ring_phases_info[i][j]['sat_flow'] * (
-                                ring_phases_info[i][j]['end'] - ring_phases_info[i][j]['start'] +
-                                ring_phases_info[i][j]['yellow'] - self.start_loss) / iterative_cycle
-                        if 'phase_capacity' in sr.index.tolist():
-                            phase_capacity += sr['phase_capacity']
-            return pd.Series([base_capacity, phase_capacity])
-
-        ###上游的速度，按照经验公式，通过流量计算出速度（如果进口道的平均车道流量>进口道通行能力的0.8，表示饱和状态；否则为不饱和状态）；
-        def calculate_speed_from_flow(sr):
-            # 饱和状态区间的最大速度设为35km/h；不饱和状态区间的最大速度设为60km/h,最小速度设为40km/h(交通流手册，48页),车道默认最大的通行能力为1800pcu/h
-            max_speed_sat = 35
-            max_speed_unsat = 60
-            min_speed_unsat = 40
-            # 标定流量与速度曲线的系数：(城市干道路段速度_流量模型及通行能力研究,https://max.book118.com/html/2017/0423/101864563.shtm)
-            ##饱和状态下：
-            b0 = 6.9671
-            b1 = math.log(max_speed_sat / b0) / sr['road_ave_capacity']
-            ##不饱和状态下：
-            a0 = 60
-            a1 = (min_speed_unsat - max_speed_unsat) / sr['road_ave_capacity']
-            # 按通行能力换算当前流量
-            # volume = sr['road_sum_capacity'] / sr['down_capacity'] * sr['road_flow_rate']  # TODO:如何改变上游进口道的总换算流量,sr['road_sum_capacity']/sr['down_capacity']应该是个固定值，现在随下游通行能力改变
-            volume = sr['road_flow_rate']
-            # 根据流量计算速度
-            # sr['sat_ratio'] = 0.7
-            if sr['sat_ratio'] >= self.sat_ratio_threshold:
-                speed = b0 * math.exp(b1 * volume)
-            else:
-                speed = a0 + a1 * volume
-            return speed
-
-        if 'phase_capacity' in flow.columns.tolist():
-            flow = flow.drop(columns=['phase_capacity'])
-
-        flow[['base_capacity', 'phase_capacity']] = flow.apply(calculate_capacity_under_control, axis=1)
-        flow['road_sum_capacity'] = flow.groupby(['day_no', 'period_no', 'plan_no', 'time', 'road'])[
-            'base_capacity'].transform('sum')
-        flow['road_ave_capacity'] = flow.groupby(['day_no', 'period_no', 'plan_no', 'time', 'road'])[
-            'base_capacity'].transform('mean')
-        flow['down_flows'] = flow.groupby(['day_no', 'period_no', 'plan_no', 'time', 'road'])[
-            'flow_rate'].transform('sum')
-        flow['down_capacity'] = flow.groupby(['day_no', 'period_no', 'plan_no', 'time', 'road'])[
-            'phase_capacity'].transform('sum')
-        flow['sat_ratio'] = flow['down_flows'] / flow['down_capacity']  # 暂时仅用于评价交通状态（分为饱和状态和非饱和状态）
-        flow['up_speed'] = flow.apply(calculate_speed_from_flow, axis=1)
-        return flow, ring_phases_queue
-
-    ##将阶段转换为环结构，遍历环的相位时长，计算每个相位的排队长度：
-    ###按照红灯阶段的排队形成波和绿灯阶段的排队消散波，分别计算形成波速wf和消散波速wd1；并按照几何规则，计算两波相遇的位置和周期内的相对时间点，分别作为最大排队长度值和排队最大时刻；
-    ####如果最大排队长度超过了路段的长度，缩短红灯的持续时间（传入周期时长-当前相位的绿灯时长？？？）
-    ###如果排队最大时刻小于相位的绿灯结束时刻时，形成第二个消散波wd2，计算在绿灯结束时刻的排队长度，作为最小排队长度值。
-    ###取相位的最大排队长度和最小排队长度的均值，作为相位的排队长度，进而将所有相位的排队长度的均值，作为交叉口的排队长度值。
-
-    def calculate_junction_queue_length(self, flow, ring_phases_queue, iterative_cycle):
-        junction_queue_length = 0.0
-
-        for i in range(0, self.ring_num):
-            for j in range(0, len(ring_phases_queue[i])):
-
-                def caculate_max_flow_phase(overlap, flow, phase_id):
-                    flow_info = flow[flow['phase'] == phase_id]
-                    max_flow = 0.0
-                    if flow_info.shape[0] > 0:
-                        max_flow = flow[flow['phase'] == phase_id].iloc[0]['flow_rate']
-
-                    if overlap != '':
-                        ring_list = overlap.split(',')
-                        for ring_p in ring_list:
-                            flow_info = flow[flow['phase'] == ring_p]
-                            if flow_info.shape[0] == 0:
-                                continue
-                            if flow_info.iloc[0]['flow_rate'] > max_flow:
-                                phase_id = ring_p
-                                max_flow = max(max_flow, flow_info.iloc[0]['flow_rate'])
-                    return phase_id
-
-                phase_id = caculate_max_flow_phase(ring_phases_queue[i][j]['overlap'], flow,
-                                                   ring_phases_queue[i][j]['id'])
-                phase_flow_info = flow[flow['phase'] == phase_id]
-                if len(phase_flow_info) == 0:
-                    continue
-                # print('phase_id: ', ring_phases_queue[i][j]['id'])
-                # 红灯阶段的排队形成波
-                # phase_flow_info.iloc[0]['road_flow_rate']        #按通行能力换算当前流量
-                # phase_flow_info.iloc[0]['road_sum_capacity']/phase_flow_info.iloc[0]['down_capacity'] * phase_flow_info.iloc[0]['road_flow_rate']
-                up_volume = phase_flow_info.iloc[0]['flow_rate']  # TODO：如何设计当前相位的总流量。需要知道相位在上游路段时，对应的流量
-                speed_wf1 = (0 - up_volume) / (self.stop_density - up_volume / phase_flow_info.iloc[0]['up_speed'])
-
-                # 绿灯阶段的第一个排队消散波
-                sat_pass_headway = 30 / 3.6 * 3600 / ring_phases_queue[i][j][
-                    'sat_flow']  # 绿灯饱和通行状态下的密度，放行速度不低于路段速度的50%-70%（直行最大）（城市道路设计规范）
-                sat_pass_density = 1000 / sat_pass_headway
-                speed_wd1 = (phase_flow_info.iloc[0]['base_capacity'] - 0) / (sat_pass_density - self.stop_density)
-
-                # print('speed_wf1:',speed_wf1/3.6)
-                # print('speed_wd1:',speed_wd1/3.6)
-
-                ##当前相位下，寻找前一红灯持续的时长
-                index_list = list(range(j - 1, -1, -1)) + list(range(len(ring_phases_queue[i]) - 1, j, -1))
-
-                red_time_before_phase = iterative_cycle - (
-                        ring_phases_queue[i][j]['end'] - ring_phases_queue[i][j]['start'])
-                for r in index_list:
-                    if ring_phases_queue[i][r]['id'] == ring_phases_queue[i][j]['id']:
-                        if ring_phases_queue[i][j]['start'] < ring_phases_queue[i][r]['end']:
-                            red_time_before_phase = iterative_cycle - ring_phases_queue[i][r]['end'] + \
-                                                    ring_phases_queue[i][j]['start']
-                        else:
-                            red_time_before_phase = ring_phases_queue[i][j]['start'] - ring_phases_queue[i][r]['end']
-                        break
-
-                # 绿灯期间，两个波相遇的位置和周期内的相对时间点，分别作为最大排队长度值和排队最大时刻
-                phase_max_queue_time = (ring_phases_queue[i][j]['initial_queue_length'] + abs(
-                    speed_wf1) / 3.6 * red_time_before_phase) / (abs(speed_wd1 - speed_wf1) / 3.6)
-                phase_green_time = ring_phases_queue[i][j]['end'] - ring_phases_queue[i][j]['start'] - \
-                                   ring_phases_queue[i][j]['all_red']
-
-                if phase_max_queue_time > phase_green_time:
-                    ring_phases_queue[i][j]['max_queue_length'] = iterative_cycle * abs(speed_wf1) / 3.6
-                    ring_phases_queue[i][j]['min_queue_length'] = ring_phases_queue[i][j]['max_queue_length']
-                    ring_phases_queue[i][j]['initial_queue_length'] = ring_phases_queue[i][j]['max_queue_length']
-
-                    junction_queue_length += (ring_phases_queue[i][j]['min_queue_length'] + ring_phases_queue[i][j][
-                        'max_queue_length']) / 2
-
-                    # print('max_queue_length:', ring_phases_queue[i][j]['max_queue_length'])
-                    # print('min_queue_length:', ring_phases_queue[i][j]['min_queue_length'])
-                    continue
-                else:
-                    ring_phases_queue[i][j]['max_queue_length'] = phase_max_queue_time * abs(speed_wd1) / 3.6
-
-                # print('max_queue_time:%f ,green_time:%f ' % (phase_max_queue_time, phase_green_time))
-
-                # 如果排队最大时刻小于相位的绿灯结束时刻时，形成第二个消散波wd2，计算在绿灯结束时刻的排队长度，作为最小排队长度值。
-                ##绿灯阶段的第二个排队消散波
-
-                speed_wd2 = (phase_flow_info.iloc[0]['base_capacity'] - up_volume) / (
-                        sat_pass_density - up_volume / phase_flow_info.iloc[0]['up_speed'])
-                # print('speed_wd2:',speed_wd2/3.6)
-                max_queue_dissipation_time = ring_phases_queue[i][j]['max_queue_length'] / abs(speed_wd2 / 3.6)
-
-                if (phase_max_queue_time + max_queue_dissipation_time) < phase_green_time:
-                    ring_phases_queue[i][j]['min_queue_length'] = 0.0
-                else:
-                    speed_wf2 = (0 - phase_flow_info.iloc[0]['base_capacity']) / (self.stop_density - sat_pass_density)
-                    # print('speed_wf2:',speed_wf2)
-                    phase_min_queue_time = (ring_phases_queue[i][j]['max_queue_length'] - abs(speed_wd2 / 3.6) * (
-                            phase_green_time - phase_max_queue_time)) / abs((speed_wd2 - speed_wf2) / 3.6)
-                    # print('min_queue_time:', phase_min_queue_time)
-                    ring_phases_queue[i][j]['min_queue_length'] = phase_min_queue_time * abs(speed_wf2) / 3.6
-                    # print('min_queue_length:', ring_phases_queue[i][j]['min_queue_length'])
-                    ring_phases_queue[i][j]['initial_queue_length'] = ring_phases_queue[i][j]['min_queue_length']
-
-                # print('max_queue_length:', ring_phases_queue[i][j]['max_queue_length'])
-                # print('min_queue_length:', ring_phases_queue[i][j]['min_queue_length'])
-
-                ###取相位的最大排队长度和最小排队长度的均值，作为相位的排队长度，进而将所有相位的排队长度的均值，作为交叉口的排队长度值。
-                junction_queue_length += (ring_phases_queue[i][j]['min_queue_length'] + ring_phases_queue[i][j][
-                    'max_queue_length']) / 2
-
-        return junction_queue_length
-
     # 具体步骤：
     ##由松弛条件下的初始可行解，并得到交叉口的排队长度值。建立搜索树结构，根节点表示所有可行解（以哨兵方式建立），并标记根节点的层为0；上界设为0，建树过程中只更新上界值；
     ##第一层分支，计算阶段一的时长范围，最小值为最小绿，最大值为周期时长减去剩余阶段的最小绿之和；
@@ -707,11 +538,65 @@ class TrafficTimingMultiObject:
     ###如果当前阶段的节点是叶节点（即当前阶junction_queue_pred段到达最大阶段数），将该节点计算的交叉口排队长度作为上界；
     ###继续遍历优先队列里的节点，如果节点对应的排队长度值大于该上界时（即使没达到叶节点），则直接返回（因而拓展节点采用优先队列存储，从而实现剪枝的目的），表示完成算法过程；
     ###当优先队列为空时，也表示完成算法过程。
-    def branch_and_bound(self, phase_plan, stages_priority_queue, flow, iterative_cycle, initial_cycle):
+    def branch_and_bound(self, phase_plan, junction_queue_pred, queue_model, iterative_cycle, initial_cycle,
+                         warm_stage_times=None):
+        """
+        分支定界法逐阶段搜索阶段时长.
+        参数：
+            phase_plan：按周期分配绿灯后的阶段方案，作为根节点（不修改）。
+            junction_queue_pred：根节点的交叉口排队长度。
+            queue_model：时刻点的排队长度模型（QueueModel）。
+            warm_stage_times：热启动的阶段时长（总和为initial_cycle），为None时不使用热启动。
+        启发式搜索不设初始上界（剪枝依据的排队长度估计不是下界，初始上界会改变搜索结果），热启动方案只作为备选：
+        其排队长度小于搜索结果时取热启动方案。
+        精确搜索时，以上述结果作为排队长度上界，再按排队长度下界搜索，得到阶段时长网格上的最优方案。
+        返回值：
+            (排队长度, 阶段方案)，阶段方案为新建的列表。
+        """
 
         result = []
 
-        junction_queue_threshold = sys.float_info.max
+        stage_num = len(phase_plan)
+        plan = copy.deepcopy(phase_plan)  # 剩余阶段分配绿灯的工作方案，每次搜索只复制一次
+        root_node = StageNode(None, None, 0, 0.0, tuple(stage['stage_time'] for stage in phase_plan))
+
+        junction_queue_threshold, result_stage_times = self.search_stage_time(
+            plan, root_node, junction_queue_pred, queue_model, iterative_cycle, initial_cycle, False,
+            sys.float_info.max, [])
+        if warm_stage_times is not None:
+            # 与搜索的完整方案相同，最后一个阶段按迭代周期计算排队长度
+            warm_queue_times = list(warm_stage_times[:-1]) + [iterative_cycle - sum(warm_stage_times[:-1])]
+            warm_queue = queue_model.junction_queue_length([warm_queue_times], iterative_cycle)[0]
+            if warm_queue < junction_queue_threshold:
+                junction_queue_threshold, result_stage_times = warm_queue, list(warm_stage_times)
+        if self.exact_search:
+            root_bound = queue_model.lower_bound([root_node.rest_times], 0, iterative_cycle)[0]
+            junction_queue_threshold, result_stage_times = self.search_stage_time(
+                plan, root_node, root_bound, queue_model, iterative_cycle, initial_cycle, True,
+                junction_queue_threshold, result_stage_times)
+
+        if warm_stage_times is not None and result_stage_times == list(warm_stage_times):
+            self.search_stats['warm_start_kept'] += 1
+        if result_stage_times:
+            result = [dict(plan[s], stage_time=result_stage_times[s]) for s in range(0, stage_num)]
+        junction_queue_threshold *= self.flow_interval * 60 / initial_cycle
+        # print('junction_queue: ', junction_queue_threshold)
+        # print()
+        return junction_queue_threshold, result
+
+    def search_stage_time(self, plan, root_node, root_queue, queue_model, iterative_cycle, initial_cycle, exact,
+                          junction_queue_threshold, result_stage_times):
+        """
+        从根节点开始的一次分支定界搜索.
+        参数：
+            plan：工作方案，扩展节点时在其中分配剩余阶段的绿灯时长。
+            root_queue：根节点的排队长度（精确搜索时为排队长度下界）。
+            exact：是否为精确搜索。精确搜索时，中间节点按排队长度下界排序和剪枝，最后一层节点的排队长度为完整方案的排队长度，
+                   优先队列中的最小下界不小于当前最优值时，当前最优即为最优方案。
+            junction_queue_threshold、result_stage_times：已有的排队长度上界和对应的阶段时长。
+        返回值：
+            (排队长度上界, 阶段时长列表)
+        """
 
         def generate_stage_time(min_green, max_green):
             stage_time_list = list(range(min_green, max_green, self.step))
@@ -719,267 +604,459 @@ class TrafficTimingMultiObject:
                 stage_time_list.append(max_green)
             return stage_time_list
 
-        stage_no, stage_num = 0, len(phase_plan)
+        stage_num = len(plan)
+        weights, loss_times, min_times = self.allocation_parameters(plan)  # 剩余阶段绿灯分配的参数
+        # 阶段时长的下限：节点的最大绿灯不小于最小绿灯时，其子树中各阶段时长不小于最小绿灯（最后一个阶段为分配时长，误差0.5秒）
+        min_stage_times = [plan[s]['min_green'] + plan[s]['yellow'] + plan[s]['all_red'] for s in range(0, stage_num)]
+        min_stage_times[-1] -= 0.5
 
-        while 1:
+        # 小顶堆按排队长度出队，排队长度相同时按入队顺序，不比较节点
+        counter = itertools.count()
+        stages_heap = [(root_queue, next(counter), root_node)]
 
-            if stages_priority_queue.empty():
-                #print(result)
-                break
+        while stages_heap:
 
-            junction_queue, stage_node = stages_priority_queue.get()
-            #         print('"""""'*5)
-            #         print('junction_queue: %f'%junction_queue)
-            #         print('cumulative_stage_time: %d'%stage_node['cumulative_stage_time'])
+            junction_queue, _, stage_node = heapq.heappop(stages_heap)
 
             if junction_queue >= junction_queue_threshold:  # 剪枝
-                #print(result)
+                self.search_stats['pruned'] += len(stages_heap) + 1
                 break
+            self.search_stats['expanded'] += 1
 
-            stage_no = stage_node['layer']
+            stage_no = stage_node.layer
+            fixed_stage_times = stage_node.fixed_stage_times()
 
-            phase_plan = stage_node['phase_plan']
-            phase_plan_rest = phase_plan[stage_no + 1:stage_num]
-
-            min_green = phase_plan[stage_no]['min_green'] + phase_plan[stage_no]['yellow'] + phase_plan[stage_no][
-                'all_red']  # 可考虑排队空间
-            max_green = math.ceil(phase_plan[stage_no]['stage_time'])  # 预估的某一可行阶段时长
+            min_green = plan[stage_no]['min_green'] + plan[stage_no]['yellow'] + plan[stage_no]['all_red']  # 可考虑排队空间
 
             cumulative_min_green = 0.0
             for s in range(stage_no + 1, stage_num):
-                cumulative_min_green += phase_plan[s]['min_green'] + phase_plan[s]['yellow'] + phase_plan[s]['all_red']
-            max_green_2 = math.floor(iterative_cycle - stage_node[
-                'cumulative_stage_time'] - cumulative_min_green)  # 加入最大绿灯时间的限制，通过后续的阶段的最大绿灯计算
-            # print('iterative_cycle: %f,cumulative_stage_time: %f,cumulative_min_green: %f,max_green_2:%d'%(iterative_cycle,stage_node['cumulative_stage_time'],cumulative_min_green,max_green_2))
+                cumulative_min_green += plan[s]['min_green'] + plan[s]['yellow'] + plan[s]['all_red']
+            max_green_2 = math.floor(iterative_cycle - stage_node.cumulative_stage_time - cumulative_min_green)  # 加入最大绿灯时间的限制，通过后续的阶段的最大绿灯计算
 
             stage_time_list = generate_stage_time(min_green, max_green_2)  # 根据最小和最大绿灯时长，产生当前阶段的可行绿灯时长列表
 
-            for i in range(0, len(stage_time_list)):  # 分支
-
-                # 初始化相位的清空系数为1.0
-                for j in range(0, len(phase_plan_rest)):
-                    phase_plan_rest[j]['stage_clear_ratio'] = 1.0
-
-                # 将当前阶段的时长置为遍历值
-                phase_plan[stage_no]['stage_time'] = stage_time_list[i]
-                # print("stage_no:%d, stage_time:%d"%(stage_no,stage_time_list[i]))
-                # 创建节点
-                current_stage_node = {'junction_queue_pred': 0.0, 'current_stage_time': stage_time_list[i],
-                                      'cumulative_stage_time': stage_node['cumulative_stage_time'] + stage_time_list[i],
-                                      'layer': stage_no + 1,
-                                      'phase_plan': []}
-
-                cycle_rest = iterative_cycle - current_stage_node['cumulative_stage_time']
-
-                # 计算剩余阶段的绿灯分配时长，得到phase_plan_rest(包含新的stage_time)和剩余的阶段时长和
-                phase_plan_rest, cycle_rest = self.allocate_green_time(phase_plan_rest, cycle_rest)
-                # 拼接完整的阶段方案phase_plan
-                phase_plan = phase_plan[0:stage_no + 1] + phase_plan_rest
-                # 估计交叉口的排队总长
-                flow, ring_phases_queue = self.initial_queue_calculation(phase_plan, flow, iterative_cycle)
-                junction_queue_pred = self.calculate_junction_queue_length(flow, ring_phases_queue, iterative_cycle)
-                # print("junction_queue_pred: %f"%junction_queue_pred)
-                # print()
-                current_stage_node['junction_queue_pred'] = junction_queue_pred
-                new_phase_plan = copy.deepcopy(phase_plan)
-                current_stage_node['phase_plan'] = new_phase_plan
+            # 分支：一次计算全部子节点剩余阶段的绿灯分配时长，剩余时长不足以满足剩余阶段最小时长的子节点剪枝
+            cumulative_stage_times = stage_node.cumulative_stage_time + np.array(stage_time_list, dtype=float)
+            rest_stage_times, feasible = water_fill(weights[stage_no + 1:], loss_times[stage_no + 1:],
+                                                    min_times[stage_no + 1:], iterative_cycle - cumulative_stage_times)
+            self.search_stats['pruned'] += int((~feasible).sum())
+
+            # 子节点只保存当前阶段时长和剩余阶段的分配时长
+            child_nodes = [StageNode(stage_node, stage_time_list[k], stage_no + 1, float(cumulative_stage_times[k]),
+                                     tuple(rest_stage_times[k].tolist()))
+                           for k in range(0, len(stage_time_list)) if feasible[k]]
+            if not child_nodes:
+                continue
+
+            # 一次估计全部子节点的交叉口排队总长（精确搜索的中间节点为排队长度下界）
+            last_layer = stage_no + 1 == stage_num - 1
+            child_stage_times = [fixed_stage_times + [node.stage_time] + list(node.rest_times) for node in child_nodes]
+            if exact and not last_layer:
+                junction_queue_preds = queue_model.lower_bound(
+                    child_stage_times, stage_no + 1, iterative_cycle, min_stage_times if max_green_2 >= min_green else None)
+            else:
+                junction_queue_preds = queue_model.junction_queue_length(child_stage_times, iterative_cycle)
+
+            for current_stage_node, junction_queue_pred in zip(child_nodes, junction_queue_preds):
 
                 if junction_queue_pred < junction_queue_threshold:
 
-                    # 按照交叉口的排队长度值，将当前阶段时长的对应拓展节点存储在优先队列中
-                    stages_priority_queue.put((junction_queue_pred, current_stage_node))
+                    # 按照交叉口的排队长度值，将当前阶段时长的对应拓展节点存储在优先队列中（精确搜索的完整方案无需再扩展）
+                    if not (exact and last_layer):
+                        heapq.heappush(stages_heap, (junction_queue_pred, next(counter), current_stage_node))
 
-                    if stage_no + 1 == stage_num - 1:
-                        phase_plan[stage_no + 1]['stage_time'] = int(
-                            initial_cycle - current_stage_node['cumulative_stage_time'])
+                    if last_layer:
                         # 更新排队长度的上界值junction_queue_threshold
                         junction_queue_threshold = junction_queue_pred
-                        result = phase_plan
-        junction_queue_threshold *= self.flow_interval * 60 / initial_cycle
-        # print('junction_queue: ', junction_queue_threshold)
-        # print()
-        return junction_queue_threshold, result
-
-    def muti_object_optimize(self):
-        # 生成每个时刻点的配时方案
-        key_phase_flow = self.get_key_phase_flow_rate()
-        times_info = key_phase_flow.groupby(['day_no', 'period_no', 'plan_no', 'time']).agg(
-            {'phase': 'count'}).reset_index()
+                        result_stage_times = fixed_stage_times + [current_stage_node.stage_time, int(
+                            initial_cycle - current_stage_node.cumulative_stage_time)]
+                else:
+                    self.search_stats['pruned'] += 1
 
-        for i in range(0,times_info.shape[0]):
-            time_point = times_info.iloc[i]['time']
-            flow = self.algorithm_input(key_phase_flow, time_point)
+        return junction_queue_threshold, result_stage_times
 
-            result = []
-            min_junction_queue = sys.float_info.max
+    def optimize_time_slot(self, flow):
+        """
+        一个时刻点的配时优化：周期搜索（二分搜索或扫描），每个周期内分支定界搜索阶段时长.
+        参数：
+            flow：时刻点的关键相位流量（关键相位流量按日计划、时段、方案和时刻分组后的一组）。
+        返回值：
+            (阶段方案列表, 周期)，阶段方案包含阶段时长stage_time、黄灯、全红和阶段流量stage_flow。
+        """
+        flow = flow.copy()
+        queue_model = QueueModel(self, self.plan_para['phase_plan'], flow)  # 时刻点的排队长度模型，各周期、各节点共用
+        ring_overlap = self.judge_main_phase_overlap()
+
+        min_cycle = 0
+        for stage in self.plan_para['phase_plan']:
+            min_green = stage['min_green']
+            yellow = stage['yellow']
+            all_red = stage['all_red']
+            min_cycle += (min_green + yellow + all_red)
+        min_cycle = max(min_cycle, self.plan_para['min_cycle'])
+        max_cycle = self.plan_para['max_cycle']
+
+        if self.cycle_search == 'sweep':
+            result, result_cycle, cycle_curve = self.sweep_cycles(flow, queue_model, ring_overlap, min_cycle, max_cycle)
+            self.cycle_curves[tuple(flow[['day_no', 'period_no', 'plan_no', 'time']].iloc[0])] = cycle_curve
+        else:
+            result, result_cycle = self.bisect_cycles(flow, queue_model, ring_overlap, min_cycle, max_cycle)
+
+        if result:
+            self.previous_stage_times = [stage['stage_time'] for stage in result]
+        return result, result_cycle
+
+    def bisect_cycles(self, flow, queue_model, ring_overlap, min_cycle, max_cycle):
+        """
+        二分搜索周期：每次比较区间中点及其后一个步长的两个周期，保留排队长度较小的一侧.
+        返回值：
+            (阶段方案列表, 周期)
+        """
+        result = []
+        result_cycle = None
+        min_junction_queue = sys.float_info.max
 
-            cycle_list = []
-            cycles_queue_map = {}
-            cycles_priority_queue = PriorityQueue()
+        cycle_list = []
+        cycles_queue_map = {}
 
-            phase_plan = copy.deepcopy(self.plan_para['phase_plan'])
-            ring_overlap = self.judge_main_phase_overlap()
+        phase_plan = copy.deepcopy(self.plan_para['phase_plan'])
 
-            min_cycle = 0
-            for i in range(0, len(self.plan_para['phase_plan'])):
-                min_green = self.plan_para['phase_plan'][i]['min_green']
-                yellow = self.plan_para['phase_plan'][i]['yellow']
-                all_red = self.plan_para['phase_plan'][i]['all_red']
-                min_cycle += (min_green + yellow + all_red)
-            min_cycle = max(min_cycle, self.plan_para['min_cycle'])
-            max_cycle = self.plan_para['max_cycle']
+        # 不满足周期范围时，取区间的中间值作为周期时长
+        if max_cycle - min_cycle <= 2 * self.step:
+            cycle = min_cycle + math.floor((max_cycle - min_cycle) / (2 * self.step)) * self.step
 
-            # 不满足周期范围时，取区间的中间值作为周期时长
-            if max_cycle - min_cycle <= 2 * self.step:
-                cycle = min_cycle + math.floor((max_cycle - min_cycle) / (2 * self.step)) * self.step
+            # 调用周期内的计算函数，计算出junction_queue_pred
+            flow['cycle_flow'] = flow['flow_rate'] / 3600 * cycle
+            flow_input = self.return_flow_input(ring_overlap, flow)  # 返回字典，每个相位的流量
 
-                # 调用周期内的计算函数，计算出junction_queue_pred
-                flow['cycle_flow'] = flow['flow_rate'] / 3600 * cycle
-                flow_input = self.return_flow_input(ring_overlap, flow)  # 返回字典，每个相位的流量
+            phase_plan = self.caculate_stage_flow(flow_input, ring_overlap, phase_plan)
 
-                phase_plan = self.caculate_stage_flow(flow_input, ring_overlap, phase_plan)
+            # 第一次生成方案，初始化优先队列
+            phase_plan, iterative_cycle = self.allocate_green_time(phase_plan, cycle)
+            if iterative_cycle is not None:  # 周期小于各阶段最小时长之和时无可行方案
+                junction_queue_pred = queue_model.junction_queue_length(
+                    [[stage['stage_time'] for stage in phase_plan]], iterative_cycle)[0]
 
-                # 第一次生成方案，初始化优先队列
-                phase_plan, iterative_cycle = self.allocate_green_time(phase_plan, cycle)
-                flow, ring_phases_queue = self.initial_queue_calculation(phase_plan, flow, iterative_cycle)
-                junction_queue_pred = self.calculate_junction_queue_length(flow, ring_phases_queue, iterative_cycle)
+                # 分支定界法搜索方法
+                junction_queue_threshold, phase_plan = self.branch_and_bound(
+                    phase_plan, junction_queue_pred, queue_model, iterative_cycle, cycle,
+                    self.warm_start_stage_times(phase_plan, cycle))
+                result = copy.deepcopy(phase_plan)
+                result_cycle = cycle
 
-                stages_priority_queue = PriorityQueue()
+        while max_cycle - min_cycle > 2 * self.step:  # 周期搜索步长的体现地方
 
-                stage_node = {'junction_queue_pred': junction_queue_pred,
-                              'current_stage_time': 0.0,
-                              'cumulative_stage_time': 0.0,
-                              'layer': 0,
-                              'phase_plan': phase_plan}
-                stages_priority_queue.put((junction_queue_pred, stage_node))
+            middle_cycle = min_cycle + math.floor((max_cycle - min_cycle) / (2 * self.step)) * self.step
+            cycle_first = middle_cycle
+            cycle_second = middle_cycle + self.step
+            cycle_list.append(cycle_first)
+            cycle_list.append(cycle_second)
 
-                # 分支定界法搜索方法
-                junction_queue_threshold, phase_plan = self.branch_and_bound(phase_plan, stages_priority_queue, flow,
-                                                                        iterative_cycle, cycle)
-                result = copy.deepcopy(phase_plan)
+            # print('min_cycle: %d, max_cycle:%d' % (min_cycle, max_cycle))
+            # print('cycle_list', cycle_list)
 
-            while max_cycle - min_cycle > 2 * self.step:  # 周期搜索步长的体现地方
+            for c in cycle_list:
 
-                middle_cycle = min_cycle + math.floor((max_cycle - min_cycle) / (2 * self.step)) * self.step
-                cycle_first = middle_cycle
-                cycle_second = middle_cycle + self.step
-                cycle_list.append(cycle_first)
-                cycle_list.append(cycle_second)
+                if c in cycles_queue_map.keys():
+                    junction_queue_threshold = cycles_queue_map[c]['junction_queue']
+                    phase_plan = cycles_queue_map[c]['phase_plan']
+                else:
 
-                # print('min_cycle: %d, max_cycle:%d' % (min_cycle, max_cycle))
-                # print('cycle_list', cycle_list)
+                    # 调用周期内的计算函数，计算出junction_queue_pred
+                    flow['cycle_flow'] = flow['flow_rate'] / 3600 * c
+                    flow_input = self.return_flow_input(ring_overlap, flow)  # 返回字典，每个相位的流量
 
-                for c in cycle_list:
+                    # 从参数方案重新生成，不修改已缓存周期的方案
+                    phase_plan = self.caculate_stage_flow(flow_input, ring_overlap,
+                                                          copy.deepcopy(self.plan_para['phase_plan']))
 
-                    if c in cycles_queue_map.keys():
-                        junction_queue_threshold = cycles_queue_map[c]['junction_queue']
-                        phase_plan = cycles_queue_map[c]['phase_plan']
+                    # 第一次生成方案，初始化优先队列
+                    phase_plan, iterative_cycle = self.allocate_green_time(phase_plan, c)
+                    if iterative_cycle is None:  # 周期小于各阶段最小时长之和时无可行方案
+                        junction_queue_threshold, phase_plan = sys.float_info.max, []
                     else:
+                        junction_queue_pred = queue_model.junction_queue_length(
+                            [[stage['stage_time'] for stage in phase_plan]], iterative_cycle)[0]
 
-                        # 调用周期内的计算函数，计算出junction_queue_pred
-                        flow['cycle_flow'] = flow['flow_rate'] / 3600 * c
-                        flow_input = self.return_flow_input(ring_overlap, flow)  # 返回字典，每个相位的流量
+                        # 分支定界法搜索方法
+                        junction_queue_threshold, phase_plan = self.branch_and_bound(
+                            phase_plan, junction_queue_pred, queue_model, iterative_cycle, c,
+                            self.warm_start_stage_times(phase_plan, c))
+
+                    # 加入到周期长度的缓存字典中
+                    queue_info = {'junction_queue': junction_queue_threshold, 'phase_plan': phase_plan}
+                    cycles_queue_map[c] = queue_info
+
+                if junction_queue_threshold < min_junction_queue:
+                    result = copy.deepcopy(phase_plan)
+                    result_cycle = c
+                    min_junction_queue = junction_queue_threshold
+
+                # cycle_node = {'junction_queue_pred': junction_queue_threshold,
+                #               'cycle': c,
+                #               'phase_plan': phase_plan}
+                # cycles_priority_queue.put((junction_queue_threshold, cycle_node))
+            if cycles_queue_map[cycle_list[0]]['junction_queue'] < cycles_queue_map[cycle_list[1]]['junction_queue']:
+                max_cycle = cycle_list[1]
+            else:
+                min_cycle = cycle_list[0]
 
-                        phase_plan = self.caculate_stage_flow(flow_input, ring_overlap, phase_plan)
+            cycle_list.clear()
 
-                        # 第一次生成方案，初始化优先队列
-                        phase_plan, iterative_cycle = self.allocate_green_time(phase_plan, c)
-                        flow, ring_phases_queue = self.initial_queue_calculation(phase_plan, flow, iterative_cycle)
-                        junction_queue_pred = self.calculate_junction_queue_length(flow, ring_phases_queue, iterative_cycle)
+        return result, result_cycle
 
-                        stages_priority_queue = PriorityQueue()
+    def sweep_cycles(self, flow, queue_model, ring_overlap, min_cycle, max_cycle):
+        """
+        扫描周期网格（min_cycle起、步长step）上的全部周期，不依赖排队长度对周期单峰的假设.
+            - 阶段流量与周期成正比：按1秒周期计算一次阶段流量，各周期的阶段流量为其与周期的乘积（无流量的阶段除外）
+            - 各周期的初始绿灯分配和根节点排队长度一次批量计算，再逐周期分支定界
+        返回值：
+            (阶段方案列表, 周期, 排队长度-周期曲线)，曲线为cycle、junction_queue列的DataFrame，无可行方案的周期为NaN。
+        """
+        cycles = np.arange(min_cycle, max_cycle + 1, self.step)
+        if len(cycles) == 0:  # 周期范围为空时与二分搜索相同，取区间的中间值
+            cycles = np.array([min_cycle + math.floor((max_cycle - min_cycle) / (2 * self.step)) * self.step])
+
+        flow['cycle_flow'] = flow['flow_rate'] / 3600
+        unit_plan = self.caculate_stage_flow(self.return_flow_input(ring_overlap, flow), ring_overlap,
+                                             copy.deepcopy(self.plan_para['phase_plan']))
+        unit_flows = np.array([stage['stage_flow'] for stage in unit_plan], dtype=float)
+        stage_flow_fixed = np.array([stage['stage_flow_fixed'] for stage in unit_plan])
+        stage_flows = np.where(stage_flow_fixed, unit_flows, unit_flows * cycles[:, None])
+
+        weights, loss_times, min_times = self.allocation_parameters(unit_plan)
+        stage_times, feasible = water_fill(np.where(stage_flow_fixed, weights, weights * cycles[:, None]), loss_times,
+                                           min_times, cycles)
+        iterative_cycles = stage_times.sum(axis=1)
+        junction_queue_preds = queue_model.junction_queue_length(stage_times, iterative_cycles)
 
-                        stage_node = {'junction_queue_pred': junction_queue_pred,
-                                      'current_stage_time': 0.0,
-                                      'cumulative_stage_time': 0.0,
-                                      'layer': 0,
-                                      'phase_plan': phase_plan}
-                        stages_priority_queue.put((junction_queue_pred, stage_node))
+        result = []
+        result_cycle = None
+        min_junction_queue = sys.float_info.max
+        junction_queues = []
+        for k in range(0, len(cycles)):
+            cycle = int(cycles[k])
+            if not feasible[k]:  # 周期小于各阶段最小时长之和时无可行方案
+                junction_queues.append(np.nan)
+                continue
+            phase_plan = [dict(unit_plan[s], stage_flow=float(stage_flows[k, s]), stage_time=float(stage_times[k, s]))
+                          for s in range(0, len(unit_plan))]
+            junction_queue, phase_plan = self.branch_and_bound(
+                phase_plan, junction_queue_preds[k], queue_model, float(iterative_cycles[k]), cycle,
+                self.warm_start_stage_times(phase_plan, cycle))
+            junction_queues.append(junction_queue)
+            if junction_queue < min_junction_queue:
+                result = phase_plan
+                result_cycle = cycle
+                min_junction_queue = junction_queue
+        return result, result_cycle, pd.DataFrame({'cycle': cycles, 'junction_queue': junction_queues})
+
+    def optimize_slot_block(self, slot_flows, seeds=None, progress=None):
+        """
+        依次优化一段时刻点；progress(块内已完成时刻点数).
+            - seeds[i]为第i个时刻点热启动'previous'的上一时刻点方案：CHAIN沿用块内前一时刻点的结果，否则为阶段时长列表或None
+            - seeds为None时从块内第一个时刻点开始累积
+        """
+        outcomes = []
+        for i in range(0, len(slot_flows)):
+            seed = None if i == 0 else CHAIN
+            if seeds is not None:
+                seed = seeds[i]
+            if seed is not CHAIN:
+                self.previous_stage_times = seed
+            outcomes.append(self.optimize_time_slot(slot_flows[i]))
+            if progress is not None:
+                progress(len(outcomes))
+        return outcomes
+
+    def report_progress(self, done, total):
+        if self.progress is not None:
+            self.progress(done, total)
+
+    def warm_start_stage_times(self, phase_plan, cycle):
+        """
+        热启动的阶段时长，总和为周期时长，各阶段不小于最小绿灯、黄灯和全红时长之和.
+            - webster：按各阶段的流率比yi分配有效绿灯时长，阶段时长 = (C - L) * yi / Y + 启动损失 + 全红
+            - previous：上一时刻点的最优阶段时长按周期等比例缩放
+            低于下限的阶段固定为下限，其余阶段重新分配，直到不再出现新的低于下限的阶段；取整后余数计入最后一个阶段。
+        返回值：
+            整数阶段时长列表；无可用方案或周期小于阶段下限之和时返回None。
+        """
+        min_stage_times = np.array([stage['min_green'] + stage['yellow'] + stage['all_red'] for stage in phase_plan],
+                                   dtype=float)
+        if self.warm_start == 'webster':
+            base_times = np.array([self.start_loss + stage['all_red'] for stage in phase_plan], dtype=float)
+            weights = np.array([stage['stage_flow'] * stage['sat_headway_time'] for stage in phase_plan], dtype=float)
+        elif self.warm_start == 'previous' and self.previous_stage_times is not None and \
+                len(self.previous_stage_times) == len(phase_plan):
+            base_times = np.zeros(len(phase_plan))
+            weights = np.array(self.previous_stage_times, dtype=float)
+        else:
+            return None
+        if min_stage_times.sum() > cycle:
+            return None
+
+        fixed = np.zeros(len(phase_plan), dtype=bool)
+        while True:
+            rest_weights = np.where(fixed, 0.0, weights)
+            if rest_weights.sum() <= 0:
+                rest_weights = np.where(fixed, 0.0, 1.0)
+            rest_time = cycle - min_stage_times[fixed].sum() - base_times[~fixed].sum()
+            stage_times = np.where(fixed, min_stage_times, base_times + rest_time * rest_weights / rest_weights.sum())
+            new_fixed = fixed | (stage_times < min_stage_times)
+            if (new_fixed == fixed).all() or new_fixed.all():
+                break
+            fixed = new_fixed
+
+        stage_times = np.maximum(np.floor(stage_times), min_stage_times).astype(int).tolist()
+        stage_times[-1] = int(cycle - sum(stage_times[:-1]))
+        return stage_times if stage_times[-1] >= min_stage_times[-1] else None
+
+    def plan_from_cache(self, flow, cycle, stage_times):
+        """由缓存的周期和阶段时长生成时刻点的阶段方案，阶段流量按当前时刻点的流量计算"""
+        flow = flow.copy()
+        flow['cycle_flow'] = flow['flow_rate'] / 3600 * cycle
+        ring_overlap = self.judge_main_phase_overlap()
+        flow_input = self.return_flow_input(ring_overlap, flow)
+        phase_plan = self.caculate_stage_flow(flow_input, ring_overlap, copy.deepcopy(self.plan_para['phase_plan']))
+        for s in range(0, len(phase_plan)):
+            phase_plan[s]['stage_time'] = stage_times[s]
+        return phase_plan
 
-                        # 分支定界法搜索方法
-                        junction_queue_threshold, phase_plan = self.branch_and_bound(phase_plan, stages_priority_queue, flow,
-                                                                                iterative_cycle, c)
-
-                        # 加入到周期长度的缓存字典中
-                        queue_info = {'junction_queue': junction_queue_threshold, 'phase_plan': phase_plan}
-                        cycles_queue_map[c] = queue_info
-
-                    if junction_queue_threshold < min_junction_queue:
-                        result = copy.deepcopy(phase_plan)
-                        min_junction_queue = junction_queue_threshold
-
-                    # cycle_node = {'junction_queue_pred': junction_queue_threshold,
-                    #               'cycle': c,
-                    #               'phase_plan': phase_plan}
-                    # cycles_priority_queue.put((junction_queue_threshold, cycle_node))
-                if cycles_queue_map[cycle_list[0]]['junction_queue'] < cycles_queue_map[cycle_list[1]]['junction_queue']:
-                    max_cycle = cycle_list[1]
+    def optimize_time_slots(self, slot_flows):
+        """
+        优化全部时刻点，按时刻点顺序返回阶段方案列表.
+            - 启用方案缓存时，命中的时刻点复用缓存的周期和阶段时长，相同的键只优化一次
+            - 各时刻点的周期搜索和分支定界相互独立：方案参数processes不为1时在进程池中计算，工作进程只接收时刻点的流量
+        """
+        results = [None] * len(slot_flows)
+        keys = [None] * len(slot_flows)
+        cached = {}  # {key:(cycle, stage_times)}，本次查询或计算得到的方案
+        hit_keys = set()  # 查询时已在缓存中的键
+        pending = []  # 需要优化的时刻点序号
+        repeated = np.zeros(len(slot_flows), dtype=bool)  # 键在前面的时刻点已出现，不再查询缓存
+        for i in range(0, len(slot_flows)):
+            if self.plan_cache is None:
+                pending.append(i)
+                continue
+            keys[i] = self.plan_cache.key(slot_flows[i], self.plan_para, self.phase_lane)
+            repeated[i] = keys[i] in cached
+            if not repeated[i]:
+                cached[keys[i]] = self.plan_cache.get(keys[i])
+                if cached[keys[i]] is None:
+                    pending.append(i)
                 else:
-                    min_cycle = cycle_list[0]
+                    hit_keys.add(keys[i])
+        seeds = self.previous_seeds(slot_flows, pending, keys, cached, hit_keys)
+
+        total = len(slot_flows)
+        done = total - len(pending)  # 缓存命中的时刻点
+        self.report_progress(done, total)
+        processes = self.plan_para.get('processes', 1)
+        if processes == 1 or len(pending) <= 1:
+            outcomes = self.optimize_slot_block([slot_flows[i] for i in pending], seeds,
+                                                lambda n: self.report_progress(done + n, total))
+        else:
+            # 按连续的时刻点分块，每块在一个工作进程中依次计算；热启动'previous'时只在上一时刻点方案不沿用块内结果处分块，
+            # 各时刻点的热启动方案与进程数无关
+            block_size = max(1, len(pending) // (4 * (processes or os.cpu_count())))
+            starts = [0]
+            for b in range(1, len(pending)):
+                if b - starts[-1] >= block_size and (self.warm_start != 'previous' or seeds[b] is not CHAIN):
+                    starts.append(b)
+            blocks = [([slot_flows[i] for i in pending[b:e]], [None if seed is CHAIN else seed for seed in seeds[b:e]],
+                       [seed is CHAIN for seed in seeds[b:e]]) for b, e in zip(starts, starts[1:] + [len(pending)])]
+            outcomes = []
+            with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                     initargs=(self.traffic_light_file, self.inter_id, self.plan_para, self.phase_lane,
+                                               self.flow_interval)) as executor:
+                for block_outcomes, search_stats, cycle_curves in executor.map(optimize_slots_worker, blocks):
+                    outcomes.extend(block_outcomes)
+                    for key, value in search_stats.items():
+                        self.search_stats[key] += value
+                    self.cycle_curves.update(cycle_curves)
+                    self.report_progress(done + len(outcomes), total)
+
+        for i, (result, cycle) in zip(pending, outcomes):
+            results[i] = result
+            if self.plan_cache is not None and cycle is not None:
+                cached[keys[i]] = (cycle, [stage['stage_time'] for stage in result])
+                self.plan_cache.put(keys[i], *cached[keys[i]])
+
+        # 同一键的其余时刻点复用方案
+        for i in range(0, len(slot_flows)):
+            if results[i] is None:
+                if repeated[i]:
+                    self.plan_cache.get(keys[i])  # 重复出现的键计入命中，首次出现的键已在查询时计入
+                results[i] = self.plan_from_cache(slot_flows[i], *cached[keys[i]]) if cached[keys[i]] else []
+        return results
+
+    def previous_seeds(self, slot_flows, pending, keys, cached, hit_keys):
+        """
+        各待优化时刻点热启动'previous'的上一时刻点方案（optimize_slot_block的seeds），只在同一日计划、时段、方案内沿时刻传递：
+            - 前一时刻点也需要优化：CHAIN，沿用其优化结果
+            - 前一时刻点命中查询前已有的缓存：缓存的阶段时长
+            - 前一时刻点是本次优化的重复键、属于其他分组或不存在：None，重新开始
+        只由分组、缓存查询结果决定，与进程数和分块无关。热启动方案不参与启发式搜索的剪枝，只在排队长度更小时替代搜索结果，
+        因此结果仍与缓存中已有的方案有关；精确搜索时结果为网格上的最优方案
+        """
+        groups = [tuple(flow[['day_no', 'period_no', 'plan_no']].iloc[0]) for flow in slot_flows]
+        is_pending = np.zeros(len(slot_flows), dtype=bool)
+        is_pending[pending] = True
+        seeds = []
+        for i in pending:
+            seed = None
+            if i > 0 and groups[i - 1] == groups[i]:
+                if is_pending[i - 1]:
+                    seed = CHAIN
+                elif keys[i - 1] in hit_keys:
+                    seed = list(cached[keys[i - 1]][1])
+            seeds.append(seed)
+        return seeds
+
+    def muti_object_optimize(self):
+        # 生成每个时刻点的配时方案：按日计划、时段、方案和时刻一次分组，得到各时刻点的流量
+        key_phase_flow = self.get_key_phase_flow_rate()
+        slot_groups = list(key_phase_flow.groupby(['day_no', 'period_no', 'plan_no', 'time']))
+        slot_flows = [slot_flow for _, slot_flow in slot_groups]
 
-                cycle_list.clear()
+        results = self.optimize_time_slots(slot_flows)
 
-            # 将结果添加到配时参数结果中：
+        # 将结果添加到配时参数结果中：先收集为记录列表，最后一次生成DataFrame
+        records = []
+        for ((day_no, period_no, plan_no, time_point), _), result in zip(slot_groups, results):
             for r in range(0, len(result)):
-                stage_no = 'P' + str(r + 1)
-                self.timing = self.timing.append({'day_no': times_info.iloc[i]['day_no'],
-                                        'period_no': times_info.iloc[i]['period_no'],
-                                        'plan_no': times_info.iloc[i]['plan_no'],
-                                        'time': time_point,
-                                        'stage_no': stage_no,
-                                        'phase_time': result[r]['stage_time'],
-                                        'yellow': result[r]['yellow'],
-                                        'all_red': result[r]['all_red'],
-                                        'yi': result[r]['stage_flow']}, ignore_index=True)
+                records.append({'day_no': day_no,
+                                'period_no': period_no,
+                                'plan_no': plan_no,
+                                'time': time_point,
+                                'stage_no': 'P' + str(r + 1),
+                                'phase_time': result[r]['stage_time'],
+                                'yellow': result[r]['yellow'],
+                                'all_red': result[r]['all_red'],
+                                'yi': result[r]['stage_flow']})
+        self.timing = pd.DataFrame(records)
 
     def timing_cluster(self):
         """
-        获取聚类标签
+        获取聚类标签：各日计划、时段、方案内，按各时刻点的阶段时长将时刻点划分为连续的配时时段（segmentation.segment_slots），
+        时段数不超过peak_max_plans，每个时段不短于peak_min_interval分钟
+        peak_max_plans默认为1（每个时段一组方案）：return_phase_plan和write_state_xml不区分cluster_label，大于1时只用于分析time_out
         """
         self.timing = self.timing.reset_index(drop=True)
-        # 增加车流变化率特征
-        for _, group in self.timing.groupby(['day_no', 'period_no', 'plan_no', 'stage_no']):
-            group.sort_values(by='time', inplace=True)
-            self.timing.loc[group.index, 'slope'] = group['yi'].diff() / group['yi'].shift(1)
-
         self.timing.fillna(method='bfill', inplace=True)
 
-        # 对峰值时段内的时隙进行聚类
+        peak_max_plans = self.plan_para.get('peak_max_plans', 1)
+        peak_min_interval = self.plan_para.get('peak_min_interval', 30)
+        min_labels = math.ceil(peak_min_interval / self.flow_interval)  # 最小时间间隔转化为对最小连续标签数的限制
+
         self.timing['cluster_label'] = -1  # 平峰聚类标签统一设置为-1
         for name, group in self.timing.groupby(['day_no', 'period_no', 'plan_no']):
-            # if 'flat' in name[-1]:
-            # continue
-            X = group.pivot(index='time', columns='stage_no', values=['slope', 'phase_time']).sort_index()
-            X['n'] = np.arange(len(X)) * 6
-            X.replace([np.inf, -np.inf], 0, inplace=True)
-            X.fillna(0, inplace=True)
-            time_label_dict = self._cluster(X)
-            self.timing.loc[group.index, 'cluster_label'] = group.time.map(time_label_dict)
-
-        self.timing = self.timing.astype({'cluster_label': int}).drop(columns='slope')
-
-    def _cluster(self,X):
-        """
-        对高峰期配时时隙进行层次聚类
-        """
-        peak_max_plans = 1  # self.config['general_settings']['peak_max_plans']
-        peak_min_interval = 30  # self.config['general_settings']['peak_min_interval']
-        min_labels = math.ceil(peak_min_interval / 6)  # 最小时间间隔转化为对最小连续标签数的限制
-        labels = AgglomerativeClustering(peak_max_plans).fit_predict(X).tolist()
-        # 依据调整最小时间间隔调整聚类标签
-        n = len(labels)
-        if n > 1:
-            labels[1] = labels[0]
-        for i in range(1, n):
-            combine = True
-            for j in range(i + 1 - min_labels, i + 1):
-                if labels[j:j + min_labels].count(labels[i]) == min_labels:
-                    # 存在连续相同的min_labels个相同标签，意味着无需合并
-                    combine = False
-                    break
-            if combine:
-                labels[i] = labels[i - 1]
-        return dict(zip(X.index, pd.Series(labels)))
+            X = group.pivot(index='time', columns='stage_no', values='phase_time').sort_index().fillna(0)
+            labels = segmentation.segment_slots(X.values, peak_max_plans, min_labels)
+            self.timing.loc[group.index, 'cluster_label'] = group['time'].map(dict(zip(X.index, labels)))
+
+        self.timing = self.timing.astype({'cluster_label': int})
 
     def get_phase_time(self):
         """
@@ -987,30 +1064,34 @@ class TrafficTimingMultiObject:
             - 获取各时段-聚类内平均相位时间作为该聚类的配时数据
             - 整合配时方案——剔除重复值
         """
-        def green_mean_quantile(sr):
-            delta_q = sr.quantile(0.75) - sr.quantile(0.25)
-            down = sr.quantile(0.5) - 3 * delta_q
-            up = sr.quantile(0.5) + 3 * delta_q
-            return sr[(sr <= up) & (sr >= down)].mean()
-
-        self.timing['green'] = self.timing.groupby(['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'])[
-            'phase_time'].transform(green_mean_quantile).astype(int)  # 绿灯时长直接取整，.apply(lambda x:math.ceil(x))
+        stats = robust_stats.trimmed_group_stats(
+            self.timing, ['stage_no', 'day_no', 'period_no', 'plan_no', 'cluster_label'], {'phase_time': 'mean'})
+        self.timing['green'] = stats['phase_time'].astype(int)  # 绿灯时长直接取整，.apply(lambda x:math.ceil(x))
         self.timing = self.timing.reset_index(drop=True)
 
     def get_result(self):
-        self.timing = self.timing[['day_no', 'period_no', 'plan_no', 'time', 'stage_no', 'green', 'yellow', 'all_red']]
+        self.timing = self.timing[['day_no', 'period_no', 'plan_no', 'cluster_label', 'time', 'stage_no', 'green',
+                                   'yellow', 'all_red']]
 
+        # 每个配时时段输出一组方案，time为时段的起始时刻
         subcolumns = self.timing.columns.tolist()
         subcolumns.remove('time')
         self.time_out = self.timing.sort_values(['day_no', 'period_no', 'time']).drop_duplicates(
             subcolumns).reset_index(drop=True)
         self.time_out['phase_time'] = self.time_out['green']
-        self.time_out['cycle'] = self.time_out.groupby(['day_no', 'period_no', 'plan_no'])['phase_time'].transform('sum')
+        self.time_out['cycle'] = self.time_out.groupby(['day_no', 'period_no', 'plan_no', 'cluster_label'])[
+            'phase_time'].transform('sum')
 
     def auto_timing(self):
         print('2、开始进行配时分析……')
         self.muti_object_optimize()
-        print('- 多目标配时完成')
+        print('- 多目标配时完成（%s周期，%s，热启动%s：扩展节点%d个，剪枝节点%d个，热启动方案为最优%d次）' % (
+            '扫描' if self.cycle_search == 'sweep' else '二分搜索', '精确搜索' if self.exact_search else '启发式搜索',
+            self.warm_start or '无', self.search_stats['expanded'],
+            self.search_stats['pruned'], self.search_stats['warm_start_kept']))
+        if self.plan_cache is not None:
+            print('- 方案缓存：命中%d个时刻点，未命中%d个，命中率%.1f%%' % (
+                self.plan_cache.hits, self.plan_cache.misses, self.plan_cache.hit_rate() * 100))
         self.timing_cluster()
         self.get_phase_time()
         print('- 聚类配时完成')
@@ -1,9 +1,9 @@
 # 采用起始和结束时间方式，保存成中间结构
 from collections import Counter
-import xml.etree.cElementTree as xee
 import time
+from algorithm.signal_config import SignalConfig, Node, State, Barrier
 
-def write_plan_xml(plan_no, cycle, plan_para, traffic_light_file, inter_id):
+def write_plan_xml(plan_no, cycle, plan_para, traffic_light_file, inter_id, signal_config=None):
     """
         将阶段表示的方案，写入到XML文件中。
         参数：
@@ -12,6 +12,7 @@ def write_plan_xml(plan_no, cycle, plan_para, traffic_light_file, inter_id):
             plan_para：方案信息，包含最大周期、最小周期以及方案信息（相位编号、最小绿灯、黄灯时长、全红时长、行人时长、阶段（相位）时长）等。
             traffic_light_file：优化前信控文件名，包含路径信息。
             inter_id：交叉口的编号。
+            signal_config：可选，信控文件的解析模型（signal_config.SignalConfig），传入时不再解析traffic_light_file。
         返回值：
             无。
     """
@@ -154,10 +155,9 @@ def write_plan_xml(plan_no, cycle, plan_para, traffic_light_file, inter_id):
             if ring_list[m][n]['id'] in overlap.keys():
                 ring_list[m][n]['overlap'] = list_to_str(overlap[ring_list[m][n]['id']])
 
-    # 写入XML
-    eTree = xee.parse(traffic_light_file)
-    rootNode = eTree.getroot()
-    lights = rootNode.findall('light')
+    # 写入XML：在信控文件模型的副本上修改，序列化时生成XML
+    signal_config = (signal_config if signal_config is not None else SignalConfig(traffic_light_file)).copy()
+    lights = signal_config.root.findall('light')
     for light in lights:
         if light.get('id') == inter_id:
             system_time_text = light.findall('system_time')
@@ -176,34 +176,32 @@ def write_plan_xml(plan_no, cycle, plan_para, traffic_light_file, inter_id):
             plans = light.findall('plan')
             for plan in plans:
                 if plan.get('no') == plan_no:
-                    # plan = xee.SubElement(light,"plan",{'no':plan_no,'links'='1'})
                     cycle_text = plan.findall('cycle')
                     cycle_text[0].text = cycle
 
-                    rings = plan.findall('ring')
-                    for ring in rings:
-                        plan.remove(ring)
+                    plan.children = [child for child in plan.children if child.tag != 'ring']
 
                     for i in range(0, ring_num):
 
-                        ring = xee.SubElement(plan, "ring")
+                        ring = Node.create('ring')
+                        plan.children.append(ring)
                         for j in range(0, len(ring_list[m])):
                             if ring_list[i][j]['id'] == '0':
-                                state = xee.SubElement(ring, 'barrier')
+                                ring.children.append(Barrier.create('barrier'))
                                 continue
-                            state = xee.SubElement(ring, 'state', {'phase': ring_list[i][j]['id'],
-                                                                   'overlap': ring_list[i][j]['overlap'],
-                                                                   'green': str(int(ring_list[i][j]['end']) - int(
-                                                                       ring_list[i][j]['start']) - int(
-                                                                       ring_list[i][j]['yellow']) - int(
-                                                                       ring_list[i][j]['all_red'])),
-                                                                   'yellow': ring_list[i][j]['yellow'],
-                                                                   'all_red': ring_list[i][j]['all_red'],
-                                                                   'coord_status': '0',
-                                                                   'min': '15',
-                                                                   'max': '90'})
+                            ring.children.append(State.create('state', {'phase': ring_list[i][j]['id'],
+                                                                        'overlap': ring_list[i][j]['overlap'],
+                                                                        'green': str(int(ring_list[i][j]['end']) - int(
+                                                                            ring_list[i][j]['start']) - int(
+                                                                            ring_list[i][j]['yellow']) - int(
+                                                                            ring_list[i][j]['all_red'])),
+                                                                        'yellow': ring_list[i][j]['yellow'],
+                                                                        'all_red': ring_list[i][j]['all_red'],
+                                                                        'coord_status': '0',
+                                                                        'min': '15',
+                                                                        'max': '90'}))
                             if ring_list[i][j]['barrier'] == '1':
-                                state = xee.SubElement(ring, 'barrier')
+                                ring.children.append(Barrier.create('barrier'))
 
-    eTree.write('./xml/sample.xml', encoding="utf-8", xml_declaration=True)
-    print("3、配时方案写入XML完成")
\ No newline at end of file
+    signal_config.write('./xml/sample.xml', encoding="utf-8", xml_declaration=True)
+    print("3、配时方案写入XML完成")
@@ -19,3 +19,18 @@ class Meta(object):
 
 
 DATA_PATH = Meta('data.path', 'data').get()
+# 聚合流量的磁盘缓存目录（为空时不启用缓存）及最大字节数
+FLOW_CACHE_PATH = Meta('flow_cache.path', '').get()
+FLOW_CACHE_SIZE = Meta('flow_cache.size', 512 * 1024 * 1024, int).get()
+# 配时算法的工作进程数（为0时取CPU核数）、排队等待的任务数上限，及队列满时建议客户端重试的间隔（秒）
+WORKER_PROCESSES = Meta('worker.processes', 1, int).get()
+WORKER_QUEUE_SIZE = Meta('worker.queue_size', 4, int).get()
+RETRY_AFTER = Meta('worker.retry_after', 30, int).get()
+# 异步任务的保存目录（上传文件、状态和结果）及任务结束后的保留时长（秒）
+JOB_PATH = os.path.join(DATA_PATH, 'jobs')
+JOB_TTL = Meta('job.ttl', 24 * 3600, int).get()
+# 单个上传文件的最大字节数（压缩文件按上传和解压后的大小分别限制）
+MAX_UPLOAD_SIZE = Meta('upload.max_size', 256 * 1024 * 1024, int).get()
+# 推荐方案缓存的最大条数（为0时不缓存）及有效期（秒）
+RESULT_CACHE_SIZE = Meta('result_cache.size', 256, int).get()
+RESULT_CACHE_TTL = Meta('result_cache.ttl', 3600, int).get()
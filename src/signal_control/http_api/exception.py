@@ -8,3 +8,27 @@ class BadRequestError(Exception):
     def __init__(self, msg):
         Exception.__init__(self)
         self.msg = msg
+
+
+class ServiceBusyError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self)
+        self.msg = msg
+
+
+class NotFoundError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self)
+        self.msg = msg
+
+
+class JobCancelledError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self)
+        self.msg = msg
+
+
+class PayloadTooLargeError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self)
+        self.msg = msg
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import time
+
+from signal_control.http_api.util import gen_uuid
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class JobStore(object):
+    """
+    异步配时任务的磁盘存储，每个任务一个目录<path>/<job_id>/，包含上传文件和状态文件job.json：
+        - 状态：queued（排队）、running（执行中）、done（完成）、failed（失败）、cancelled（已取消）
+        - 状态文件由接口进程和工作进程共同写入：先写临时文件再替换，读取方不会读到写了一半的内容
+        - 取消执行中的任务时写入cancel标记文件，工作进程完成当前时刻点后检查到标记即中止
+        - 结束超过ttl秒的任务在清理时删除
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+
+    def job_path(self, job_id):
+        return os.path.join(self.path, job_id)
+
+    def create(self):
+        """新建排队中的任务，返回任务编号"""
+        job_id = gen_uuid()
+        os.makedirs(self.job_path(job_id))
+        now = time.time()
+        self.write(job_id, {'job_id': job_id, 'status': 'queued', 'done': 0, 'total': 0, 'created': now,
+                            'updated': now, 'result': None, 'message': ''})
+        return job_id
+
+    def write(self, job_id, job):
+        fn = os.path.join(self.job_path(job_id), 'job.json')
+        with open(fn + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(fn + '.tmp', fn)
+
+    def read(self, job_id):
+        """返回任务状态字典，任务不存在时返回None"""
+        if not job_id.isalnum():  # 任务编号为gen_uuid生成的十六进制串，其余路径一律视为不存在
+            return None
+        try:
+            with open(os.path.join(self.job_path(job_id), 'job.json'), encoding='utf-8') as f:
+                job = json.load(f)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        job['cancel_requested'] = self.cancel_requested(job_id)
+        return job
+
+    def update(self, job_id, **fields):
+        job = self.read(job_id)
+        if job is None:  # 任务已被删除
+            return None
+        job.pop('cancel_requested')
+        job.update(fields, updated=time.time())
+        self.write(job_id, job)
+        return job
+
+    def request_cancel(self, job_id):
+        """写入取消标记，任务目录已被删除时返回False"""
+        try:
+            open(os.path.join(self.job_path(job_id), 'cancel'), 'a').close()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(os.path.join(self.job_path(job_id), 'cancel'))
+
+    def remove_uploads(self, job_id):
+        for name in ('flow', 'light'):
+            fn = os.path.join(self.job_path(job_id), name)
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    def remove(self, job_id):
+        shutil.rmtree(self.job_path(job_id), ignore_errors=True)
+
+    def job_ids(self):
+        return os.listdir(self.path) if os.path.isdir(self.path) else []
+
+    def cleanup(self, now=None):
+        """删除结束超过ttl秒的任务，返回删除的任务数"""
+        now = time.time() if now is None else now
+        removed = 0
+        for job_id in self.job_ids():
+            job = self.read(job_id)
+            if job is not None and job['status'] in FINISHED and now - job['updated'] > self.ttl:
+                self.remove(job_id)
+                removed += 1
+        return removed
+
+    def interrupt(self):
+        """服务重启后，上次未结束的任务已随工作进程退出，标记为失败"""
+        for job_id in self.job_ids():
+            job = self.read(job_id)
+            if job is not None and job['status'] not in FINISHED:
+                self.update(job_id, status='failed', message='服务重启，任务中断')
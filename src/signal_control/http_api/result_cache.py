@@ -0,0 +1,57 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+
+def request_key(cross_id, params, light_digest, flow_digest):
+    """请求内容的缓存键：路口编号、按键排序的方案参数和两个上传文件（解压后内容）的sha256摘要"""
+    content = json.dumps([cross_id, params, light_digest, flow_digest], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    推荐方案的内存缓存：
+        - 以请求内容的摘要作为键，相同的文件和参数直接返回上次的方案，不再调用算法
+        - 超过max_size条时按最近使用淘汰（LRU），超过ttl秒的方案视为过期，统计命中率
+        - max_size为0时不缓存
+    """
+
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.results = OrderedDict()  # {key:(写入时间, 方案)}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now=None):
+        """返回缓存的方案，未命中或已过期时返回None"""
+        now = time.time() if now is None else now
+        if key in self.results and now - self.results[key][0] > self.ttl:
+            del self.results[key]
+        if key not in self.results:
+            self.misses += 1
+            return None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return self.results[key][1]
+
+    def put(self, key, result, now=None):
+        if self.max_size <= 0:
+            return
+        self.results[key] = (time.time() if now is None else now, result)
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+    def __len__(self):
+        return len(self.results)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self):
+        return {'size': len(self.results), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate()}
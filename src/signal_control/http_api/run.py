@@ -1,18 +1,31 @@
+import asyncio
+import hashlib
 import json
 import os
+from concurrent.futures.process import BrokenProcessPool
 
 from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from starlette.responses import JSONResponse
 
-from algorithm import traffic_flow, traffic_timing
-from signal_control.http_api.exception import ServerError
+from signal_control.http_api.exception import ServerError, ServiceBusyError, BadRequestError, NotFoundError, \
+    PayloadTooLargeError
 from signal_control.http_api.util import gen_uuid
-from signal_control.http_api.config import DATA_PATH
+from signal_control.http_api.config import DATA_PATH, WORKER_PROCESSES, WORKER_QUEUE_SIZE, RETRY_AFTER, JOB_PATH, \
+    JOB_TTL, MAX_UPLOAD_SIZE, RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+from signal_control.http_api.job import JobStore, FINISHED
+from signal_control.http_api.result_cache import ResultCache, request_key
+from signal_control.http_api.upload import save_upload
+from signal_control.http_api.worker import WorkerPool, recommend, run_job
 from signal_control.log import LOG
 
 app = FastAPI()
+worker_pool = WorkerPool(WORKER_PROCESSES, WORKER_QUEUE_SIZE)
+job_store = JobStore(JOB_PATH, JOB_TTL)
+job_futures = {}  # 本进程提交、尚未结束的异步任务{job_id:Future}
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+computing = {}  # 计算中的推荐请求{缓存键:asyncio.Task}，内容相同的请求等待同一结果
 
 
 class Response(object):
@@ -36,6 +49,76 @@ async def validation_exception_handler(request, exc):
         jsonable_encoder(Response(code=500, message='服务器错误')), 500)
 
 
+@app.exception_handler(ServiceBusyError)
+async def service_busy_exception_handler(request, exc):
+    return JSONResponse(
+        jsonable_encoder(Response(code=503, message='服务器繁忙，请稍后重试')), 503,
+        headers={'Retry-After': str(RETRY_AFTER)})
+
+
+@app.exception_handler(BadRequestError)
+async def bad_request_exception_handler(request, exc):
+    return JSONResponse(
+        jsonable_encoder(Response(code=400, message=exc.msg)), 400)
+
+
+@app.exception_handler(NotFoundError)
+async def not_found_exception_handler(request, exc):
+    return JSONResponse(
+        jsonable_encoder(Response(code=404, message=exc.msg)), 404)
+
+
+@app.exception_handler(PayloadTooLargeError)
+async def payload_too_large_exception_handler(request, exc):
+    return JSONResponse(
+        jsonable_encoder(Response(code=413, message=exc.msg)), 413)
+
+
+@app.middleware("http")
+async def limit_request_size(request, call_next):
+    """按Content-Length提前拒绝过大的请求（两个文件加表单字段），不等请求体接收完"""
+    length = request.headers.get('content-length')
+    if length is not None and length.isdigit() and int(length) > 2 * MAX_UPLOAD_SIZE + 64 * 1024:
+        return JSONResponse(
+            jsonable_encoder(Response(code=413, message='请求超过%d字节' % (2 * MAX_UPLOAD_SIZE))), 413)
+    return await call_next(request)
+
+
+@app.on_event("startup")
+def recover_jobs():
+    job_store.interrupt()
+    job_store.cleanup()
+
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    worker_pool.shutdown()
+
+
+@app.get("/api/queue")
+async def get_queue_depth():
+    return worker_pool.depth()
+
+
+@app.get("/api/cache")
+async def get_cache_stats():
+    return result_cache.stats()
+
+
+async def compute_recommendation(key, flow_fn, light_fn, cross_id, params):
+    """在工作进程中计算推荐方案并写入缓存，结束后删除上传文件（不随等待的请求取消而中断）"""
+    try:
+        result = await worker_pool.run(recommend, flow_fn, light_fn, cross_id, params)
+        result_cache.put(key, result)
+        LOG.info("algorithm done")
+        return result
+    finally:
+        computing.pop(key, None)
+        os.remove(light_fn)
+        os.remove(flow_fn)
+        LOG.info("file removed")
+
+
 @app.post("/api/recommendation")
 async def create_recommendation(
         cross_id: str = Form(...),
@@ -43,28 +126,115 @@ async def create_recommendation(
         flow_file: UploadFile = File(...),
         traffic_light_file: UploadFile = File(...)
 ):
-    # 存入文件
+    # 队列已满时，只有缓存或计算中的请求可能命中才接收文件，否则不接收请求体直接拒绝
+    if worker_pool.full() and len(result_cache) == 0 and not computing:
+        raise ServiceBusyError('任务队列已满')
+    params = json.loads(config)
+
+    # 存入文件，同时计算文件内容的摘要（缓存命中的请求不占用工作进程）
     light_fn = os.path.join(DATA_PATH, gen_uuid())
-    with open(light_fn, 'x') as f:
-        f.write((await traffic_light_file.read()).decode('utf-8'))
     flow_fn = os.path.join(DATA_PATH, gen_uuid())
-    with open(flow_fn, 'x') as f:
-        f.write((await flow_file.read()).decode('utf-8'))
-    params = json.loads(config)
+    light_digest = hashlib.sha256()
+    flow_digest = hashlib.sha256()
+    try:
+        await save_upload(traffic_light_file, light_fn, MAX_UPLOAD_SIZE, light_digest)
+        await save_upload(flow_file, flow_fn, MAX_UPLOAD_SIZE, flow_digest)
+    except Exception:
+        if os.path.exists(light_fn):
+            os.remove(light_fn)
+        raise
     LOG.info("file save done")
 
-    # 调用算法
-    vehicle_flow = traffic_flow.Traffic_Flow(
-        flow_fn, light_fn, params, cross_id)
-    vehicle_flow.generate_flow()
-    traffic_time = traffic_timing.TrafficTiming(
-        vehicle_flow.flows, light_fn, params, cross_id)
-    traffic_time.auto_timing()
-    plan_no, cycle, result = traffic_time.return_phase_plan()
-    LOG.info("algorithm done")
-
-    # 删除文件
-    os.remove(light_fn)
-    os.remove(flow_fn)
-    LOG.info("file removed")
-    return result
+    # 命中缓存或相同的请求正在计算时，不再调用算法
+    key = request_key(cross_id, params, light_digest.hexdigest(), flow_digest.hexdigest())
+    result = result_cache.get(key)
+    task = computing.get(key)
+    if result is not None or task is not None:
+        os.remove(light_fn)
+        os.remove(flow_fn)
+        LOG.info("result cache hit" if result is not None else "waiting for the same request")
+        return result if result is not None else await asyncio.shield(task)
+
+    # 调用算法（工作进程中执行）
+    task = asyncio.ensure_future(compute_recommendation(key, flow_fn, light_fn, cross_id, params))
+    computing[key] = task
+    return await asyncio.shield(task)
+
+
+@app.post("/api/jobs")
+async def create_job(
+        cross_id: str = Form(...),
+        config: str = Form(...),
+        flow_file: UploadFile = File(...),
+        traffic_light_file: UploadFile = File(...)
+):
+    """提交异步配时任务，立即返回任务状态（含job_id）"""
+    if worker_pool.full():
+        raise ServiceBusyError('任务队列已满')
+    job_store.cleanup()
+
+    params = json.loads(config)
+    job_id = job_store.create()
+    try:
+        await save_upload(traffic_light_file, os.path.join(job_store.job_path(job_id), 'light'), MAX_UPLOAD_SIZE)
+        await save_upload(flow_file, os.path.join(job_store.job_path(job_id), 'flow'), MAX_UPLOAD_SIZE)
+        future = worker_pool.submit(run_job, job_store, job_id, cross_id, params)
+    except Exception:
+        job_store.remove(job_id)
+        raise
+    job_futures[job_id] = future
+    future.add_done_callback(lambda f: finish_job(job_id, f))
+    LOG.info("job %s submitted", job_id)
+    return job_store.read(job_id)
+
+
+def finish_job(job_id, future):
+    """任务结束的回调：工作进程异常退出时run_job未能写入状态，标记为失败"""
+    job_futures.pop(job_id, None)
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        job_store.update(job_id, status='failed', message='工作进程异常退出')
+        job_store.remove_uploads(job_id)
+
+
+def read_job(job_id):
+    job = job_store.read(job_id)
+    if job is None:
+        raise NotFoundError('任务不存在：' + job_id)
+    return job
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """任务状态：status、进度done/total（已完成/全部时刻点数，webster配时不报告进度）、结果result"""
+    return read_job(job_id)
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = read_job(job_id)
+    if job['status'] != 'done':
+        raise BadRequestError('任务未完成：' + job['status'])
+    return job['result']
+
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """
+    取消或删除任务：
+        - 已结束的任务删除任务目录
+        - 排队中的任务直接取消；执行中的任务写入取消标记，工作进程在当前一块过车数据、配时步骤或时刻点完成后中止，状态变为cancelled
+        - 写入标记前任务已结束并被删除时返回404
+    """
+    job = read_job(job_id)
+    if job['status'] in FINISHED:
+        job_store.remove(job_id)
+        return job
+    future = job_futures.get(job_id)
+    if future is not None and future.cancel():
+        job_store.remove_uploads(job_id)
+        job = job_store.update(job_id, status='cancelled')
+    else:
+        job_store.request_cancel(job_id)
+        job = read_job(job_id)  # 任务在此期间结束并被删除时返回404
+    LOG.info("job %s cancelled", job_id)
+    return job
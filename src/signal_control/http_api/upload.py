@@ -0,0 +1,142 @@
+import os
+import zlib
+
+from signal_control.http_api.exception import BadRequestError, PayloadTooLargeError
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时不接收zstd压缩的文件
+    zstandard = None
+
+CHUNK_SIZE = 1024 * 1024  # 每次读取、解压输出的字节数
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZSTD_INPUT_SIZE = 256  # 每次输入zstd解压器的字节数
+
+
+class PlainStream(object):
+    def feed(self, data):
+        yield data
+
+    def finish(self):
+        return []
+
+
+class GzipStream(object):
+    """gzip流式解压：每次输出不超过CHUNK_SIZE字节，支持多个gzip成员依次拼接"""
+
+    def __init__(self):
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.started = False  # 当前成员是否已输入数据
+
+    def feed(self, data):
+        while data:
+            self.started = True
+            try:
+                out = self.decompressor.decompress(data, CHUNK_SIZE)
+            except zlib.error:
+                raise BadRequestError('gzip文件解压失败')
+            if out:
+                yield out
+            if self.decompressor.eof:
+                data = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                self.started = False
+            else:
+                data = self.decompressor.unconsumed_tail
+
+    def finish(self):
+        out = self.decompressor.flush()
+        if self.started and not self.decompressor.eof:
+            raise BadRequestError('gzip文件不完整')
+        return [out] if out else []
+
+
+class ZstdStream(object):
+    """
+    zstd流式解压：每次向解压器输入不超过ZSTD_INPUT_SIZE字节，支持多个帧依次拼接.
+        - zstd的每个块至少4字节（块头3字节），最多解压出128KiB，单次输出不超过(ZSTD_INPUT_SIZE / 4 + 1) * 128KiB（约8MiB），
+          不会因一块上传数据整体解压而占满内存
+    """
+
+    def __init__(self):
+        if zstandard is None:
+            raise BadRequestError('不支持zstd压缩的文件（未安装zstandard）')
+        self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+        self.started = False  # 当前帧是否已输入数据
+
+    def feed(self, data):
+        for start in range(0, len(data), ZSTD_INPUT_SIZE):
+            piece = data[start:start + ZSTD_INPUT_SIZE]
+            while piece:
+                self.started = True
+                try:
+                    out = self.decompressor.decompress(piece)
+                except zstandard.ZstdError:
+                    raise BadRequestError('zstd文件解压失败')
+                if out:
+                    yield out
+                if self.decompressor.eof:
+                    piece = self.decompressor.unused_data
+                    self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+                    self.started = False
+                else:
+                    piece = b''
+
+    def finish(self):
+        if self.started:
+            raise BadRequestError('zstd文件不完整')
+        return []
+
+
+def open_stream(head):
+    """按文件头识别压缩格式"""
+    if head.startswith(GZIP_MAGIC):
+        return GzipStream()
+    if head.startswith(ZSTD_MAGIC):
+        return ZstdStream()
+    return PlainStream()
+
+
+async def iter_upload(upload, max_size):
+    """按CHUNK_SIZE逐块读取上传文件，gzip、zstd压缩的文件按文件头识别并边读取边解压；上传的字节数超过max_size时抛出PayloadTooLargeError"""
+    received = 0
+    stream = None
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        received += len(chunk)
+        if received > max_size:
+            raise PayloadTooLargeError('上传文件超过%d字节' % max_size)
+        if stream is None:
+            stream = open_stream(chunk)
+        for data in stream.feed(chunk):
+            yield data
+    if stream is not None:
+        for data in stream.finish():
+            yield data
+
+
+async def save_upload(upload, fn, max_size, digest=None):
+    """
+    将上传文件分块写入磁盘，不整体读入内存、不解码，返回写入的字节数.
+        - 压缩的文件写入解压后的内容，解压后超过max_size字节时抛出PayloadTooLargeError
+        - digest（hashlib摘要对象）不为None时，按写入的内容更新摘要
+        - 失败时删除已写入的文件
+    """
+    written = 0
+    with open(fn, 'xb') as f:
+        try:
+            async for data in iter_upload(upload, max_size):
+                written += len(data)
+                if written > max_size:
+                    raise PayloadTooLargeError('解压后的文件超过%d字节' % max_size)
+                f.write(data)
+                if digest is not None:
+                    digest.update(data)
+        except BaseException:
+            f.close()
+            os.remove(fn)
+            raise
+    return written
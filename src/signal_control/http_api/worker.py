@@ -0,0 +1,142 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from algorithm import traffic_flow, traffic_timing, traffic_timing_mobj
+from algorithm.flow_cache import FlowCache
+from signal_control.http_api.config import FLOW_CACHE_PATH, FLOW_CACHE_SIZE
+from signal_control.http_api.exception import ServiceBusyError, JobCancelledError
+from signal_control.log import LOG
+
+flow_cache = None  # 工作进程内的聚合流量缓存，首次使用时创建
+
+
+def recommend(flow_fn, light_fn, cross_id, params, progress=None, check_cancel=None):
+    """
+    在工作进程中运行流量统计和配时算法，返回阶段方案.
+        - 优化目标goal为1时使用多目标配时，progress(已完成时刻点数, 时刻点总数)报告进度；否则使用webster配时
+        - check_cancel()在读取每块过车数据后、流量统计与配时之间和webster配时的各步骤之间调用，抛出异常即中止
+        - 工作进程内不再创建进程池，多目标配时的processes固定为1，并行由WorkerPool提供
+        - params中的start_time、end_time为过车数据的读取范围，同main.generate_traffic_time
+    """
+    global flow_cache
+    if flow_cache is None and FLOW_CACHE_PATH:
+        flow_cache = FlowCache(FLOW_CACHE_PATH, FLOW_CACHE_SIZE)
+    vehicle_flow = traffic_flow.Traffic_Flow(
+        flow_fn, light_fn, cross_id, params, start_time=params.get('start_time'), end_time=params.get('end_time'),
+        flow_cache=flow_cache, check_cancel=check_cancel)
+    vehicle_flow.generate_flow()
+    if check_cancel is not None:
+        check_cancel()
+    if params.get('goal', 0) == 1:
+        params['processes'] = 1
+        traffic_time = traffic_timing_mobj.TrafficTimingMultiObject(
+            vehicle_flow.flows, light_fn, cross_id, params, vehicle_flow.phase_lane, progress=progress)
+    else:
+        traffic_time = traffic_timing.TrafficTiming(vehicle_flow.flows, light_fn, cross_id, params,
+                                                    signal_config=vehicle_flow.signal_config, check_cancel=check_cancel)
+    traffic_time.auto_timing()
+    plan_no, cycle, result = traffic_time.return_phase_plan()
+    return result
+
+
+def run_job(job_store, job_id, cross_id, params):
+    """
+    在工作进程中执行异步任务：状态、进度和结果写入任务目录，结束后删除上传文件.
+        - 流量统计、配时的各阶段之间检查取消标记，计算完成后才收到的取消请求同样不再报告结果
+    """
+    job_path = job_store.job_path(job_id)
+
+    def check_cancel():
+        if job_store.cancel_requested(job_id):
+            raise JobCancelledError('任务已取消')
+
+    def progress(done, total):
+        check_cancel()
+        job_store.update(job_id, done=done, total=total)
+
+    try:
+        check_cancel()
+        job_store.update(job_id, status='running')
+        result = recommend(os.path.join(job_path, 'flow'), os.path.join(job_path, 'light'), cross_id, params,
+                           progress, check_cancel)
+        check_cancel()
+        job_store.update(job_id, status='done', result=result)
+    except JobCancelledError:
+        job_store.update(job_id, status='cancelled')
+    except Exception:
+        LOG.exception('job %s failed', job_id)
+        job_store.update(job_id, status='failed', message='配时计算失败')
+    finally:
+        job_store.remove_uploads(job_id)
+
+
+class WorkerPool(object):
+    """
+    配时算法的进程池：
+        - CPU密集的算法在子进程中执行，事件循环只负责收发请求，健康检查等请求不受影响
+        - 执行中和排队的任务总数不超过processes + queue_size，队列满时拒绝新任务（ServiceBusyError）
+        - 计数只在事件循环中修改，不需要加锁
+        - 子进程异常退出（如内存超限被杀）后进程池不可用，丢弃并在下次提交时重建，等待中的请求返回ServiceBusyError
+    """
+
+    def __init__(self, processes, queue_size):
+        self.processes = processes if processes > 0 else os.cpu_count()
+        self.queue_size = queue_size
+        self.executor = None  # 首次提交任务时创建
+        self.pending = 0  # 执行中和排队的任务数
+
+    def capacity(self):
+        return self.processes + self.queue_size
+
+    def full(self):
+        return self.pending >= self.capacity()
+
+    def depth(self):
+        """返回执行中、排队的任务数和容量"""
+        return {'running': min(self.pending, self.processes),
+                'queued': max(self.pending - self.processes, 0),
+                'capacity': self.capacity()}
+
+    def submit(self, fn, *args):
+        """在事件循环中提交任务，返回concurrent.futures.Future，队列已满时抛出ServiceBusyError"""
+        if self.full():
+            raise ServiceBusyError('任务队列已满')
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:  # 进程池已损坏，但回调尚未丢弃
+            self.discard(self.executor)
+            self.executor = ProcessPoolExecutor(max_workers=self.processes)
+            future = self.executor.submit(fn, *args)
+        executor = self.executor
+        self.pending += 1
+        # 任务结束（包括客户端断开后仍在执行、排队时被取消的任务）时才释放名额，回调可能在进程池的线程中执行，转回事件循环修改计数
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self.release, f, executor))
+        return future
+
+    async def run(self, fn, *args):
+        """在子进程中执行fn(*args)并等待结果，子进程异常退出时抛出ServiceBusyError"""
+        try:
+            return await asyncio.wrap_future(self.submit(fn, *args))
+        except BrokenProcessPool:
+            raise ServiceBusyError('工作进程异常退出')
+
+    def release(self, future, executor):
+        self.pending -= 1
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self.discard(executor)
+
+    def discard(self, executor):
+        if self.executor is executor:
+            LOG.error('worker process died, recreating the process pool')
+            executor.shutdown(wait=False)
+            self.executor = None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
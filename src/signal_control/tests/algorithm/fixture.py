@@ -0,0 +1,82 @@
+import copy
+import os
+
+import pandas as pd
+
+from algorithm import traffic_flow
+
+# 四个进口道：摄像头编号、路段、直行相位、左转相位；XML中车道1右转（无相位）、2直行、3左转，过车数据中车道号顺序相反
+ROADS = [(101, 'W', '2', '5'), (102, 'E', '6', '1'), (103, 'N', '4', '7'), (104, 'S', '8', '3')]
+
+PHASE_PLAN = [
+    {'id': ['2', '6'], 'min_green': 15, 'yellow': 3, 'all_red': 0, 'pedestrian_time': 15},
+    {'id': ['1', '5'], 'min_green': 15, 'yellow': 3, 'all_red': 0, 'pedestrian_time': 15},
+    {'id': ['4', '8'], 'min_green': 15, 'yellow': 3, 'all_red': 0, 'pedestrian_time': 15},
+    {'id': ['3', '7'], 'min_green': 15, 'yellow': 3, 'all_red': 0, 'pedestrian_time': 15}]
+
+
+def plan_para(goal, **options):
+    para = {'goal': goal, 'max_cycle': 130, 'min_cycle': 60, 'step': 3, 'phase_plan': copy.deepcopy(PHASE_PLAN)}
+    para.update(options)
+    return para
+
+
+def light_xml():
+    links = []
+    for camera, road, through, left in ROADS:
+        links.append('<link from="%s" fromLane="1" camera="%d"/>' % (road, camera))
+        links.append('<link from="%s" fromLane="2" camera="%d" phase="%s" sat_flow="1800"/>' % (road, camera, through))
+        links.append('<link from="%s" fromLane="3" camera="%d" phase="%s" sat_flow="1600"/>' % (road, camera, left))
+    states = ''.join('<state phase="%s" green="%d" yellow="3" all_red="0" min="15" overlap=""/>%s' % (
+        phase, green, '<barrier/>' if phase in '2468' else '') for phase, green in
+                     [('1', 15), ('2', 30), ('3', 15), ('4', 30)])
+    ring = '<ring>%s</ring><ring>%s</ring>' % (states, states.translate(str.maketrans('1234', '5678')))
+    return '''<?xml version="1.0" encoding="utf-8"?>
+<root>
+<light id="J1">
+<system_time>2022-01-01 00:00:00</system_time>
+<links no="1">%s</links>
+<schedule no="1"><start_month>1</start_month><start_day>1</start_day><end_month>12</end_month><end_day>31</end_day><week>0123456</week><day_no>1</day_no></schedule>
+<day no="1">
+<period no="1"><hour>0</hour><minute>0</minute><max_cycle>130</max_cycle><min_cycle>60</min_cycle><plan_no>1</plan_no></period>
+<period no="2"><hour>7</hour><minute>30</minute><max_cycle>130</max_cycle><min_cycle>60</min_cycle><plan_no>2</plan_no></period>
+</day>
+<plan no="1" links="1"><cycle>120</cycle>%s</plan>
+<plan no="2" links="1"><cycle>120</cycle>%s</plan>
+</light>
+</root>
+''' % (''.join(links), ring, ring)
+
+
+def pass_records(symmetric=False, slots=10):
+    """
+    07:00起slots个6分钟时刻点的过车记录，每个时刻点内均匀分布，不含随机数.
+        - symmetric为True时四个进口道流量相同且不随时间变化（排队长度相同的方案多，用于检验分支定界的并列处理）
+    """
+    rows = []
+    start = pd.Timestamp('2022-03-07 07:00:00')
+    for camera, road, through, left in ROADS:
+        for lane, destination, base in [(1, 'left', 380), (2, 'straight', 1000), (3, 'right', 150)]:
+            for k in range(0, slots):
+                scale = 1.0 if symmetric else (1 + 0.15 * (camera % 3)) * (0.7 + 0.6 * (k % 5) / 4)
+                count = int(base * scale / 10)  # 每小时流量换算为6分钟的过车数
+                for i in range(0, count):
+                    passtime = start + pd.Timedelta(minutes=6 * k) + pd.Timedelta(seconds=360 * i // count)
+                    rows.append((camera, passtime.strftime('%Y-%m-%d %H:%M:%S'), lane, destination, 'car'))
+    return pd.DataFrame(rows, columns=['camera_id', 'passtime', 'lane', 'destination', 'class'])
+
+
+def write_fixture(path, symmetric=False, slots=10):
+    """在path中写入过车数据和信控文件，返回(过车数据文件, 信控文件)"""
+    data_file = os.path.join(path, 'flow.csv')
+    light_file = os.path.join(path, 'light.xml')
+    pass_records(symmetric, slots).to_csv(data_file, index=False)
+    with open(light_file, 'w', encoding='utf-8') as f:
+        f.write(light_xml())
+    return data_file, light_file
+
+
+def vehicle_flow(data_file, light_file, para):
+    flow = traffic_flow.Traffic_Flow(data_file, light_file, 'J1', para)
+    flow.generate_flow()
+    return flow
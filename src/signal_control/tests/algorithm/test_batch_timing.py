@@ -0,0 +1,31 @@
+import contextlib
+import io
+import tempfile
+import unittest
+
+from algorithm import batch_timing
+from signal_control.tests.algorithm import fixture
+
+
+class BatchTimingTestCase(unittest.TestCase):
+    def test_read_window(self):
+        para = fixture.plan_para(1, start_time='2022-03-07 07:00:00')
+        self.assertEqual(batch_timing.read_window(para), ('2022-03-07 07:00:00', None))
+        self.assertEqual(batch_timing.read_window(fixture.plan_para(1)), (None, None))
+        self.assertEqual(batch_timing.read_window({'J1': para, 'J2': dict(para)}), ('2022-03-07 07:00:00', None))
+        with self.assertRaises(ValueError):
+            batch_timing.read_window({'J1': para, 'J2': fixture.plan_para(1)})
+
+    def test_window(self):
+        # 读取范围内没有过车记录的交叉口配时失败，结果为None
+        with tempfile.TemporaryDirectory() as path, contextlib.redirect_stdout(io.StringIO()):
+            data_file, light_file = fixture.write_fixture(path)
+            for end_time, timed in [('2022-03-07 07:00:00', False), ('2022-03-07 08:00:00', True)]:
+                results = batch_timing.batch_timing(data_file, light_file, fixture.plan_para(0), processes=1,
+                                                    end_time=end_time)
+                self.assertEqual(list(results), ['J1'])
+                self.assertEqual(results['J1'] is not None, timed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from algorithm.green_allocation import water_fill
+
+STEP = 0.1
+
+
+def grid_allocation(weights, loss_times, min_times, cycle):
+    """
+    穷举：三个阶段的时长按STEP取值、和为周期，各阶段不小于最小时长，
+    取最大流量比（权重 / (阶段时长 - 损失时间)）最小的分配.
+    """
+    floor_times = np.maximum(min_times, loss_times)
+    first = np.arange(floor_times[0], cycle, STEP)
+    second = np.arange(floor_times[1], cycle, STEP)
+    t1, t2 = [a.ravel() for a in np.meshgrid(first, second)]
+    times = np.column_stack([t1, t2, cycle - t1 - t2])
+    times = times[times[:, 2] >= floor_times[2] - 1e-9]
+    ratios = (np.asarray(weights) / (times - loss_times)).max(axis=1)
+    best = ratios.argmin()
+    return times[best], ratios[best]
+
+
+class WaterFillTestCase(unittest.TestCase):
+    loss_times = np.array([3.0, 3.0, 5.0])
+    min_times = np.array([18.0, 21.0, 18.0])
+
+    def test_grid(self):
+        for weights in [[20.0, 10.0, 5.0], [30.0, 4.0, 12.0], [8.0, 8.0, 8.0]]:
+            for cycle in [60.0, 75.0, 96.0, 130.0]:
+                stage_times, feasible = water_fill(weights, self.loss_times, self.min_times, cycle)
+                self.assertTrue(feasible[0])
+                self.assertAlmostEqual(stage_times[0].sum(), cycle)
+                self.assertTrue((stage_times[0] >= self.min_times - 1e-9).all())
+                ratio = (np.asarray(weights) / (stage_times[0] - self.loss_times)).max()
+                grid_times, grid_ratio = grid_allocation(weights, self.loss_times, self.min_times, cycle)
+                # 连续解不劣于任何网格点，且与网格上的最优分配只差网格步长
+                self.assertLessEqual(ratio, grid_ratio + 1e-9)
+                np.testing.assert_allclose(stage_times[0], grid_times, atol=2 * STEP)
+
+    def test_batch(self):
+        weights = np.array([[20.0, 10.0, 5.0], [30.0, 4.0, 12.0], [8.0, 8.0, 8.0]])
+        cycles = np.array([60.0, 96.0, 130.0])
+        stage_times, feasible = water_fill(weights, self.loss_times, self.min_times, cycles)
+        for i in range(0, len(cycles)):
+            expected, _ = water_fill(weights[i], self.loss_times, self.min_times, cycles[i])
+            np.testing.assert_array_equal(stage_times[i], expected[0])
+        self.assertTrue(feasible.all())
+
+    def test_infeasible(self):
+        # 周期小于最小时长之和；各阶段权重均为0、多余时长无法分配
+        stage_times, feasible = water_fill([[20.0, 10.0, 5.0], [0.0, 0.0, 0.0]], self.loss_times, self.min_times,
+                                           [50.0, 90.0])
+        self.assertFalse(feasible.any())
+        np.testing.assert_array_equal(stage_times, [self.min_times, self.min_times])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from algorithm.key_phase import grouped_quantile
+
+
+class GroupedQuantileTestCase(unittest.TestCase):
+    def test_groupby_quantile(self):
+        # 组大小不同（含单值组）、值有重复；0.007、0.013等分位数换算为百分位数（q * 100 / 100）后与原值不同
+        rng = np.random.RandomState(0)
+        sizes = [1, 2, 3, 5, 8, 13, 40]
+        codes = np.repeat(np.arange(len(sizes)), sizes)
+        values = rng.randint(0, 20, len(codes)).astype(float) + rng.choice([0.0, 0.1, 1 / 3], len(codes))
+        order = rng.permutation(len(codes))
+        codes, values = codes[order], values[order]
+        quantiles = [0, 0.007, 0.013, 0.1, 0.25, 0.3, 0.5, 0.57, 0.7, 0.75, 0.9, 0.95, 1]
+
+        result = grouped_quantile(codes, values, quantiles)
+        # 原实现为groupby().transform中逐组调用Series.quantile，结果应完全一致
+        expected = pd.Series(values).groupby(codes).apply(lambda sr: sr.quantile(quantiles)).unstack().values
+        np.testing.assert_array_equal(result, expected)
+        # groupby().quantile不经过百分位数换算，与上面的结果只差舍入误差
+        np.testing.assert_allclose(result, pd.Series(values).groupby(codes).quantile(quantiles).unstack().values,
+                                   rtol=1e-12)
+
+    def test_series_quantile(self):
+        values = np.array([3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0])
+        for q in [0.007, 0.013, 0.1, 0.3, 0.57, 0.85]:
+            result = grouped_quantile(np.zeros(len(values), dtype=int), values, [q])
+            self.assertEqual(result[0, 0], pd.Series(values).quantile(q))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import tempfile
+import unittest
+
+import numpy as np
+
+from algorithm import traffic_timing_mobj
+from algorithm.queue_model import QueueModel
+from signal_control.tests.algorithm import fixture
+
+
+def completions(rng, cycle, num, min_time=18):
+    """随机生成num个完整方案：前三个阶段为整数秒，最后一个阶段为周期的剩余时长，各阶段不小于min_time"""
+    rest = cycle - 4 * min_time
+    cuts = np.sort(rng.randint(0, rest + 1, (num, 3)), axis=1)
+    extra = np.diff(np.hstack([np.zeros((num, 1)), cuts, np.full((num, 1), rest)]), axis=1)
+    stage_times = min_time + extra
+    stage_times[:, 3] -= rng.choice([0.0, 0.5, -0.5], num)  # 最后一个阶段与周期之差不超过0.5秒
+    return stage_times
+
+
+class QueueModelTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as path, contextlib.redirect_stdout(io.StringIO()):
+            data_file, light_file = fixture.write_fixture(path)
+            para = fixture.plan_para(1)
+            flow = fixture.vehicle_flow(data_file, light_file, para)
+            cls.optimizer = traffic_timing_mobj.TrafficTimingMultiObject(flow.flows.copy(), light_file, 'J1', para,
+                                                                         flow.phase_lane)
+            key_phase_flow = cls.optimizer.get_key_phase_flow_rate()
+        cls.slot_flows = [slot_flow for _, slot_flow in key_phase_flow.groupby(['day_no', 'period_no', 'plan_no', 'time'])]
+        cls.min_stage_times = np.array([stage['min_green'] + stage['yellow'] + stage['all_red']
+                                        for stage in fixture.PHASE_PLAN], dtype=float)
+        cls.min_stage_times[-1] -= 0.5  # 与分支定界的阶段时长下限一致
+
+    def test_lower_bound(self):
+        # 下界只与已确定的阶段有关，且不大于任一满足约束的完整方案的排队长度（分支定界剪枝的可容许性）
+        rng = np.random.RandomState(3)
+        for slot_flow in self.slot_flows[::3]:
+            queue_model = QueueModel(self.optimizer, fixture.PHASE_PLAN, slot_flow)
+            for cycle in [72, 99, 129]:
+                stage_times = completions(rng, cycle, 200)
+                queue_length = queue_model.junction_queue_length(stage_times, cycle)
+                for fixed_num in range(0, 4):
+                    for min_stage_times in [self.min_stage_times, None]:
+                        bound = queue_model.lower_bound(stage_times, fixed_num, cycle, min_stage_times)
+                        self.assertTrue((bound <= queue_length * (1 + 1e-9) + 1e-9).all(),
+                                        (cycle, fixed_num, (bound - queue_length).max()))
+                        prefix = np.where(np.arange(4) < fixed_num, stage_times, 0.0)
+                        np.testing.assert_array_equal(
+                            queue_model.lower_bound(prefix, fixed_num, cycle, min_stage_times), bound)
+
+    def test_batch(self):
+        # 批量计算与逐个方案计算一致
+        rng = np.random.RandomState(4)
+        queue_model = QueueModel(self.optimizer, fixture.PHASE_PLAN, self.slot_flows[0])
+        stage_times = completions(rng, 99, 20)
+        cycles = rng.choice([96, 99, 102], 20)
+        queue_length = queue_model.junction_queue_length(stage_times, cycles)
+        for i in range(0, len(stage_times)):
+            self.assertEqual(queue_model.junction_queue_length([stage_times[i]], cycles[i])[0], queue_length[i])
+        self.assertTrue((queue_length > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
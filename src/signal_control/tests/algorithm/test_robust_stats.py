@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from algorithm.robust_stats import trimmed_group_stats
+
+
+def trimmed(sr, stat):
+    """原实现：逐组剔除超出[中位数 - 3 * 四分位距, 中位数 + 3 * 四分位距]的值后取均值或最大值"""
+    delta_q = sr.quantile(0.75) - sr.quantile(0.25)
+    down = sr.quantile(0.5) - 3 * delta_q
+    up = sr.quantile(0.5) + 3 * delta_q
+    return getattr(sr[(sr <= up) & (sr >= down)], stat)()
+
+
+class TrimmedGroupStatsTestCase(unittest.TestCase):
+    def test_transform(self):
+        rng = np.random.RandomState(1)
+        frame = pd.DataFrame({'road': rng.choice(['E', 'W', 'N'], 300), 'phase': rng.choice(['1', '2'], 300),
+                              'flow_rate': rng.gamma(4, 100, 300), 'queue': rng.poisson(6, 300).astype(float)})
+        frame.loc[[3, 50, 120], 'flow_rate'] = [5000, 8000, -3000]  # 异常值
+        frame.loc[[7, 80], 'queue'] = 200
+        frame = pd.concat([frame, pd.DataFrame({'road': ['S'], 'phase': ['1'], 'flow_rate': [10.0], 'queue': [1.0]})],
+                          ignore_index=True)  # 单值组
+
+        result = trimmed_group_stats(frame, ['road', 'phase'], {'flow_rate': 'mean', 'queue': 'max'})
+        for column, stat in [('flow_rate', 'mean'), ('queue', 'max')]:
+            expected = frame.groupby(['road', 'phase'])[column].transform(lambda sr: trimmed(sr, stat)).values
+            np.testing.assert_allclose(result[column], expected, rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from algorithm.segmentation import segment_slots
+
+NOISE = np.array([0, 1, -1, 0.5, -0.5, 1, 0, -1, 0.5, 0])
+
+# 30个时刻点的两阶段时长：三段平稳的时长加相同的扰动
+PHASE_TIMES = np.vstack([np.column_stack([30 + NOISE, 20 - NOISE]),
+                         np.column_stack([45 + NOISE, 25 + NOISE]),
+                         np.column_stack([35 - NOISE, 30 + NOISE])])
+
+# 原实现（AgglomerativeClustering(3)聚类后按最小连续标签数5平滑）在PHASE_TIMES上的标签
+CLUSTER_LABELS = [1] * 10 + [0] * 10 + [2] * 10
+
+
+def partition(labels):
+    """标签序列划分出的各段起点，不依赖标签的编号"""
+    return [i for i in range(0, len(labels)) if i == 0 or labels[i] != labels[i - 1]]
+
+
+def brute_force(values, max_segments, min_length, penalty):
+    """穷举全部分段点，返回组内平方和 + penalty * 时段数的最小值"""
+    n = len(values)
+    best = np.inf
+    for k in range(1, max_segments + 1):
+        for cuts in itertools.combinations(range(1, n), k - 1):
+            bounds = [0] + list(cuts) + [n]
+            if min(np.diff(bounds)) < min_length:
+                continue
+            cost = sum(((values[s:e] - values[s:e].mean(axis=0)) ** 2).sum() for s, e in zip(bounds, bounds[1:]))
+            best = min(best, cost + penalty * k)
+    return best
+
+
+def total_cost(values, labels, penalty):
+    cost = sum(((values[labels == label] - values[labels == label].mean(axis=0)) ** 2).sum()
+               for label in np.unique(labels))
+    return cost + penalty * len(np.unique(labels))
+
+
+class SegmentSlotsTestCase(unittest.TestCase):
+    def test_cluster_labels(self):
+        labels = segment_slots(PHASE_TIMES, 3, 5)
+        self.assertEqual(labels.tolist(), [0] * 10 + [1] * 10 + [2] * 10)
+        self.assertEqual(partition(labels), partition(CLUSTER_LABELS))
+        self.assertEqual(segment_slots(PHASE_TIMES, 1, 5).tolist(), [0] * 30)
+
+    def test_min_length(self):
+        # 时段数受时刻点数和最小时间间隔限制：30个时刻点、最小间隔20时只能为一个时段
+        self.assertEqual(segment_slots(PHASE_TIMES, 3, 20).tolist(), [0] * 30)
+        labels = segment_slots(PHASE_TIMES, 3, 12)
+        self.assertTrue(min(np.bincount(labels)) >= 12)
+
+    def test_brute_force(self):
+        rng = np.random.RandomState(2)
+        values = np.vstack([rng.normal(30, 2, (5, 2)), rng.normal(40, 2, (4, 2)), rng.normal(32, 2, (5, 2))])
+        for max_segments, min_length, penalty in [(3, 3, 10.0), (3, 2, 50.0), (4, 2, 0.0), (2, 4, 200.0)]:
+            labels = segment_slots(values, max_segments, min_length, penalty)
+            self.assertAlmostEqual(total_cost(values, labels, penalty),
+                                   brute_force(values, max_segments, min_length, penalty))
+
+
+if __name__ == '__main__':
+    unittest.main()
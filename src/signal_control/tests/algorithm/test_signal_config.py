@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as xee
+
+from algorithm import write_xml
+from algorithm.signal_config import SignalConfig, Barrier
+
+LIGHT_XML = '''<?xml version="1.0" encoding="utf-8"?>
+<root>
+  <meta><owner level="1">test</owner></meta>
+  <light id="J1">
+    <system_time>2022-01-01 00:00:00</system_time>
+    <links no="1">
+      <link from="W" fromLane="1" camera="101" phase="2" sat_flow="1800"/>
+      <link from="W" fromLane="2" camera="101" phase="5" sat_flow="1600"/>
+      <link from="E" fromLane="1" camera="102"/>
+    </links>
+    <schedule no="1"><start_month>1</start_month><start_day>1</start_day><end_month>12</end_month><end_day>31</end_day><week>0123456</week><day_no>1</day_no></schedule>
+    <day no="1">
+      <period no="1"><hour>0</hour><minute>0</minute><coord_type>0</coord_type><max_cycle>130</max_cycle><min_cycle>60</min_cycle><plan_no>1</plan_no></period>
+      <period no="2"><hour>7</hour><minute>30</minute><max_cycle>130</max_cycle><min_cycle>60</min_cycle><plan_no>1</plan_no></period>
+    </day>
+    <plan no="1" links="1"><cycle>96</cycle><offset>0</offset>
+      <ring><state phase="2" green="30" yellow="3" all_red="0"/><state phase="1" green="15" yellow="3" all_red="0"/><barrier/></ring>
+      <ring><state phase="6" green="30" yellow="3" all_red="0"/><state phase="5" green="15" yellow="3" all_red="0"/><barrier/></ring>
+    </plan>
+  </light>
+</root>
+'''
+
+
+class SignalConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.tmp.name, 'light.xml')
+        with open(self.fn, 'w', encoding='utf-8') as f:
+            f.write(LIGHT_XML)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, fn):
+        with open(fn, 'rb') as f:
+            return f.read()
+
+    def test_model(self):
+        light = SignalConfig(self.fn).light('J1')
+        self.assertEqual(light.cameras(), [101, 102])
+        self.assertEqual(sorted(light.days['1'].keys()), ['00:00', '07:30'])
+        self.assertEqual(light.days['1']['07:30'].plan_no, '1')
+        self.assertEqual(light.schedules['1'].week, '0123456')
+        rings = light.plans['1'].rings
+        self.assertEqual([state.phase for state in rings[0][:2]], ['2', '1'])
+        self.assertIsInstance(rings[0][2], Barrier)
+
+    def test_round_trip(self):
+        # 模型序列化与ElementTree读写的结果逐字节一致，模型未解析的节点和字段原样保留
+        SignalConfig(self.fn).write(os.path.join(self.tmp.name, 'model.xml'), encoding='utf-8')
+        xee.parse(self.fn).write(os.path.join(self.tmp.name, 'tree.xml'), encoding='utf-8')
+        self.assertEqual(self.read(os.path.join(self.tmp.name, 'model.xml')),
+                         self.read(os.path.join(self.tmp.name, 'tree.xml')))
+
+    def test_write_plan_xml(self):
+        signal_config = SignalConfig(self.fn)
+        phase_plan = [{'id': ['2', '6'], 'green_time': 40, 'yellow': 3, 'all_red': 0},
+                      {'id': ['1', '5'], 'green_time': 20, 'yellow': 3, 'all_red': 0}]
+        cwd = os.getcwd()
+        os.makedirs(os.path.join(self.tmp.name, 'xml'))
+        os.chdir(self.tmp.name)
+        try:
+            write_xml.write_plan_xml('1', '66', {'max_cycle': 120, 'min_cycle': 50, 'phase_plan': phase_plan},
+                                     'missing.xml', 'J1', signal_config)  # 传入模型时不再读取文件
+        finally:
+            os.chdir(cwd)
+        plan = SignalConfig(os.path.join(self.tmp.name, 'xml', 'sample.xml')).light('J1').plans['1']
+        self.assertEqual(plan.cycle, '66')
+        self.assertEqual(plan.findtext('offset'), '0')
+        self.assertEqual([(state.phase, state.get('green')) for state in plan.rings[0] if state.tag == 'state'],
+                         [('2', '37'), ('1', '17')])
+        # 写回只修改模型的副本
+        self.assertEqual(signal_config.light('J1').plans['1'].cycle, '96')
+        self.assertEqual(len(signal_config.light('J1').plans['1'].rings[0]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
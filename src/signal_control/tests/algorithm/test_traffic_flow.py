@@ -0,0 +1,55 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from algorithm import traffic_flow
+from signal_control.tests.algorithm import fixture
+
+
+class TrafficFlowTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file, self.light_file = fixture.write_fixture(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bin_counts_resample(self):
+        # 跨两天、按5分钟间隔逐块累计的过车数与resample一致
+        records = fixture.pass_records()
+        next_day = records.assign(passtime=(pd.to_datetime(records['passtime']) + pd.Timedelta(hours=20, minutes=3))
+                                  .dt.strftime('%Y-%m-%d %H:%M:%S'))
+        data_file = os.path.join(self.tmp.name, 'two_days.csv')
+        pd.concat([records, next_day]).to_csv(data_file, index=False)
+        flow = traffic_flow.Traffic_Flow(data_file, self.light_file, 'J1', flow_interval=5, chunk_size=1000)
+        bin_counts = flow.read_bin_counts([101, 102])
+
+        records = pd.read_csv(data_file)
+        records = records[records['camera_id'].isin([101, 102])]
+        expected = records.assign(passtime=pd.to_datetime(records['passtime'])).set_index('passtime').groupby(
+            ['camera_id', 'lane', 'destination']).resample('5T')['class'].count()
+        expected = expected[expected > 0].rename('vehicle_num').reset_index()
+        pd.testing.assert_frame_equal(bin_counts.sort_values(list(bin_counts.columns)).reset_index(drop=True),
+                                      expected.sort_values(list(expected.columns)).reset_index(drop=True))
+
+    def test_empty_window(self):
+        # 读取范围内没有过车记录时返回相同列的空表，流量统计给出明确的错误
+        flow = traffic_flow.Traffic_Flow(self.data_file, self.light_file, 'J1', fixture.plan_para(1),
+                                         start_time='2023-01-01')
+        bin_counts = flow.read_bin_counts([101])
+        self.assertEqual(len(bin_counts), 0)
+        self.assertEqual(list(bin_counts.columns), ['camera_id', 'lane', 'destination', 'passtime', 'vehicle_num'])
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(ValueError):
+            flow.generate_flow()
+
+    def test_flow_interval(self):
+        with self.assertRaises(ValueError):
+            traffic_flow.Traffic_Flow(self.data_file, self.light_file, 'J1', flow_interval=7)
+
+
+if __name__ == '__main__':
+    unittest.main()
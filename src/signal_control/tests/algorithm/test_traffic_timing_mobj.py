@@ -0,0 +1,92 @@
+import contextlib
+import io
+import tempfile
+import unittest
+
+import pandas.testing as pdt
+
+from algorithm import traffic_timing_mobj
+from signal_control.tests.algorithm import fixture
+
+
+class TrafficTimingMultiObjectTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.data_file, cls.light_file = fixture.write_fixture(cls.tmp.name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.flow = fixture.vehicle_flow(cls.data_file, cls.light_file, fixture.plan_para(1))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def optimize(self, plan_cache=None, flow=None, light_file=None, **options):
+        flow = flow or self.flow
+        optimizer = traffic_timing_mobj.TrafficTimingMultiObject(
+            flow.flows.copy(), light_file or self.light_file, 'J1', fixture.plan_para(1, **options), flow.phase_lane,
+            plan_cache=plan_cache)
+        optimizer.muti_object_optimize()
+        return optimizer
+
+    def assertFeasible(self, timing):
+        """各时刻点的阶段时长不小于最小绿灯与黄灯之和，周期在范围内"""
+        self.assertEqual(len(timing), 10 * len(fixture.PHASE_PLAN))
+        self.assertTrue((timing['phase_time'] >= 18).all())
+        cycles = timing.groupby('time')['phase_time'].sum()
+        self.assertTrue(((cycles >= 72) & (cycles <= 130)).all())
+
+    def test_heap_ties(self):
+        # 排队长度相同的节点出队时不比较节点（原实现比较到阶段方案字典时抛出TypeError）
+        self.assertFeasible(self.optimize().timing)
+        with tempfile.TemporaryDirectory() as path, contextlib.redirect_stdout(io.StringIO()):
+            data_file, light_file = fixture.write_fixture(path, symmetric=True)
+            flow = fixture.vehicle_flow(data_file, light_file, fixture.plan_para(1))
+            self.assertFeasible(self.optimize(flow=flow, light_file=light_file).timing)
+
+    def test_processes(self):
+        # 进程池按时刻点分块计算，结果与单进程相同；热启动'previous'的上一时刻点方案与分块无关
+        for options in [{}, {'warm_start': 'previous'}]:
+            single = self.optimize(processes=1, **options)
+            pool = self.optimize(processes=2, **options)
+            pdt.assert_frame_equal(pool.timing, single.timing)
+            self.assertEqual(pool.search_stats, single.search_stats)
+
+    def test_plan_cache(self):
+        # 缓存命中的时刻点复用缓存的周期和阶段时长，方案与不使用缓存时相同
+        plain = self.optimize()
+        first = self.optimize(flow_tolerance=0)
+        pdt.assert_frame_equal(first.timing, plain.timing)
+        # 两个时段的流量按时刻点重复，第二个时段全部命中
+        self.assertEqual((first.plan_cache.hits, first.plan_cache.misses), (5, 5))
+        second = self.optimize(plan_cache=first.plan_cache, flow_tolerance=0)
+        pdt.assert_frame_equal(second.timing, plain.timing)
+        self.assertEqual((first.plan_cache.hits, first.plan_cache.misses), (15, 5))
+        self.assertEqual(second.search_stats['expanded'], 0)
+
+    def test_warm_start(self):
+        # 热启动方案不参与启发式搜索的剪枝，扩展、剪枝的节点与不使用热启动时相同，只在排队长度更小时替代搜索结果
+        cold = self.optimize()
+        for warm_start in ['webster', 'previous']:
+            warm = self.optimize(warm_start=warm_start)
+            self.assertEqual((warm.search_stats['expanded'], warm.search_stats['pruned']),
+                             (cold.search_stats['expanded'], cold.search_stats['pruned']))
+            if warm.search_stats['warm_start_kept'] == 0:
+                pdt.assert_frame_equal(warm.timing, cold.timing)
+
+    def test_sweep_cycles(self):
+        # 扫描取排队长度-周期曲线上的最小值，二分搜索得到的周期在曲线上不会更优
+        bisect = self.optimize()
+        sweep = self.optimize(cycle_search='sweep')
+        self.assertFeasible(sweep.timing)
+        bisect_cycles = bisect.timing.groupby(['day_no', 'period_no', 'plan_no', 'time'])['phase_time'].sum()
+        sweep_cycles = sweep.timing.groupby(['day_no', 'period_no', 'plan_no', 'time'])['phase_time'].sum()
+        self.assertEqual(set(sweep.cycle_curves), set(sweep_cycles.index))
+        for key, curve in sweep.cycle_curves.items():
+            curve = curve.set_index('cycle')['junction_queue']
+            self.assertEqual(curve[sweep_cycles[key]], curve.min())
+            self.assertLessEqual(curve.min(), curve[bisect_cycles[key]])
+
+
+if __name__ == '__main__':
+    unittest.main()
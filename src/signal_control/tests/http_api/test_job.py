@@ -0,0 +1,31 @@
+import tempfile
+import time
+import unittest
+
+from signal_control.http_api.job import JobStore
+
+
+class JobStoreTestCase(unittest.TestCase):
+    def test_lifecycle(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = JobStore(path, 60)
+            job_id = store.create()
+            self.assertEqual(store.read(job_id)['status'], 'queued')
+            store.update(job_id, status='running', done=3, total=10)
+            store.request_cancel(job_id)
+            job = store.read(job_id)
+            self.assertEqual((job['status'], job['done'], job['total']), ('running', 3, 10))
+            self.assertTrue(job['cancel_requested'])
+            self.assertIsNone(store.read('..'))
+
+            # 重启后未结束的任务标记为失败，结束超过ttl的任务被清理
+            store.interrupt()
+            self.assertEqual(store.read(job_id)['status'], 'failed')
+            self.assertEqual(store.cleanup(), 0)
+            self.assertEqual(store.cleanup(time.time() + 61), 1)
+            self.assertIsNone(store.read(job_id))
+            self.assertFalse(store.request_cancel(job_id))  # 任务已删除
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from signal_control.http_api.result_cache import ResultCache, request_key
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    def test_key(self):
+        key = request_key('J1', {'goal': 0, 'step': 3}, 'light', 'flow')
+        self.assertEqual(key, request_key('J1', {'step': 3, 'goal': 0}, 'light', 'flow'))
+        self.assertNotEqual(key, request_key('J1', {'goal': 0, 'step': 3}, 'flow', 'light'))
+
+    def test_eviction(self):
+        cache = ResultCache(max_size=2, ttl=10)
+        cache.put('a', {'plan': 1}, now=0)
+        cache.put('b', {'plan': 2}, now=0)
+        self.assertEqual(cache.get('a', now=1), {'plan': 1})
+        cache.put('c', {'plan': 3}, now=1)  # 淘汰最近未使用的b
+        self.assertIsNone(cache.get('b', now=1))
+        self.assertIsNone(cache.get('a', now=11))  # 过期
+        self.assertEqual(cache.get('c', now=11), {'plan': 3})
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
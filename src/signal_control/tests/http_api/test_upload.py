@@ -0,0 +1,61 @@
+import asyncio
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+import zstandard
+
+from signal_control.http_api.exception import BadRequestError, PayloadTooLargeError
+from signal_control.http_api.upload import save_upload
+
+
+class BytesUpload(object):
+    def __init__(self, content):
+        self.file = io.BytesIO(content)
+
+    async def read(self, size=-1):
+        return self.file.read(size)
+
+
+class SaveUploadTestCase(unittest.TestCase):
+    def save(self, content, max_size):
+        fn = os.path.join(self.path, 'upload')
+        if os.path.exists(fn):
+            os.remove(fn)
+        asyncio.run(save_upload(BytesUpload(content), fn, max_size))
+        with open(fn, 'rb') as f:
+            return f.read()
+
+    def test_save(self):
+        content = ''.join('%d,路口,%d\n' % (i, i * 7) for i in range(0, 200000)).encode('utf-8')
+        with tempfile.TemporaryDirectory() as self.path:
+            self.assertEqual(self.save(content, len(content)), content)
+            # 多个gzip成员拼接的文件按顺序解压
+            half = len(content) // 2
+            self.assertEqual(self.save(gzip.compress(content[:half]) + gzip.compress(content[half:]), len(content)),
+                             content)
+            with self.assertRaises(PayloadTooLargeError):
+                self.save(content, len(content) - 1)
+            with self.assertRaises(PayloadTooLargeError):
+                self.save(gzip.compress(content), len(content) - 1)
+            self.assertFalse(os.path.exists(os.path.join(self.path, 'upload')))
+
+    def test_save_zstd(self):
+        content = ''.join('%d,路口,%d\n' % (i, i * 7) for i in range(0, 200000)).encode('utf-8')
+        compressor = zstandard.ZstdCompressor()
+        with tempfile.TemporaryDirectory() as self.path:
+            half = len(content) // 2
+            self.assertEqual(self.save(compressor.compress(content[:half]) + compressor.compress(content[half:]),
+                                       len(content)), content)
+            with self.assertRaises(BadRequestError):
+                self.save(compressor.compress(content)[:-5], len(content))
+            # 高压缩比的文件在解压过程中超过限制即中止
+            with self.assertRaises(PayloadTooLargeError):
+                self.save(compressor.compress(b'0' * (64 * 1024 * 1024)), len(content))
+            self.assertFalse(os.path.exists(os.path.join(self.path, 'upload')))
+
+
+if __name__ == '__main__':
+    unittest.main()
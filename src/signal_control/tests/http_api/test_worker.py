@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from starlette.testclient import TestClient
+
+from signal_control.http_api import run, worker
+from signal_control.http_api.exception import ServiceBusyError
+from signal_control.http_api.job import JobStore
+from signal_control.http_api.result_cache import request_key
+from signal_control.http_api.worker import WorkerPool
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    def test_queue_full(self):
+        async def submit():
+            pool = WorkerPool(1, 0)
+            task = asyncio.ensure_future(pool.run(time.sleep, 0.2))
+            await asyncio.sleep(0)
+            self.assertEqual(pool.depth(), {'running': 1, 'queued': 0, 'capacity': 1})
+            with self.assertRaises(ServiceBusyError):
+                await pool.run(time.sleep, 0)
+            await task
+            await asyncio.sleep(0)
+            self.assertEqual(pool.pending, 0)
+            pool.shutdown()
+
+        asyncio.run(submit())
+
+    def test_broken_pool(self):
+        async def submit():
+            pool = WorkerPool(1, 1)
+            # 子进程异常退出后返回ServiceBusyError，进程池重建后可以继续执行任务
+            with self.assertRaises(ServiceBusyError):
+                await pool.run(os._exit, 1)
+            await asyncio.sleep(0)
+            self.assertEqual(pool.pending, 0)
+            self.assertEqual(await pool.run(abs, -1), 1)
+            pool.shutdown()
+
+        asyncio.run(submit())
+
+    def test_busy_response(self):
+        client = TestClient(run.app)
+        pending, data_path = run.worker_pool.pending, run.DATA_PATH
+        run.worker_pool.pending = run.worker_pool.capacity()
+        try:
+            with tempfile.TemporaryDirectory() as run.DATA_PATH:
+                response = client.post('/api/recommendation', data={'cross_id': '1', 'config': '{}'},
+                                       files={'flow_file': ('flow.csv', b''), 'traffic_light_file': ('light.xml', b'')})
+                self.assertEqual(response.status_code, 503)
+                self.assertIn('Retry-After', response.headers)
+                self.assertEqual(os.listdir(run.DATA_PATH), [])
+            self.assertEqual(client.get('/api/queue').json()['queued'], run.worker_pool.queue_size)
+        finally:
+            run.worker_pool.pending, run.DATA_PATH = pending, data_path
+
+    def test_busy_cache_hit(self):
+        # 队列已满时，缓存命中的请求仍直接返回方案
+        client = TestClient(run.app)
+        pending, data_path = run.worker_pool.pending, run.DATA_PATH
+        run.worker_pool.pending = run.worker_pool.capacity()
+        empty = hashlib.sha256(b'').hexdigest()
+        key = request_key('1', {}, empty, empty)
+        run.result_cache.put(key, [{'plan': 1}])
+        try:
+            with tempfile.TemporaryDirectory() as run.DATA_PATH:
+                response = client.post('/api/recommendation', data={'cross_id': '1', 'config': '{}'},
+                                       files={'flow_file': ('flow.csv', b''), 'traffic_light_file': ('light.xml', b'')})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), [{'plan': 1}])
+                self.assertEqual(os.listdir(run.DATA_PATH), [])
+        finally:
+            run.result_cache.results.pop(key, None)
+            run.worker_pool.pending, run.DATA_PATH = pending, data_path
+
+
+class RunJobTestCase(unittest.TestCase):
+    def test_cancel_after_compute(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = JobStore(path, 60)
+            job_id = store.create()
+
+            def recommend(*args):
+                store.request_cancel(job_id)  # 计算期间收到取消请求
+                return [{'plan': 1}]
+
+            with mock.patch.object(worker, 'recommend', recommend):
+                worker.run_job(store, job_id, '1', {})
+            job = store.read(job_id)
+            self.assertEqual((job['status'], job['result']), ('cancelled', None))
+
+
+if __name__ == '__main__':
+    unittest.main()